@@ -1,19 +1,47 @@
 import os
-from flask import Flask, render_template, redirect, url_for, flash, Response, jsonify, request
+from flask import Flask, render_template, redirect, url_for, flash, Response, jsonify, request, send_file, g
 from flask_socketio import SocketIO
+from werkzeug.middleware.proxy_fix import ProxyFix
 from app.forms import NotificationForm
 from app.utils.config import Config
+from app.utils.event_store import EventStore
+from app.utils.analytics import DetectionRollups
+from app.utils.profiling import profiler, torch_trace
+from app.utils.metrics import (registry as metrics_registry, ServerTiming, REQUEST_LATENCY,
+                               FRAMES_PROCESSED, FRAMES_DROPPED, QUEUE_DEPTH, frame_rate)
+from app.utils.lazy_import import lazy_module
+from app.utils.executor import executor
+from app.utils.cpu_plan import cpu_plan
+from app.utils import response_format
+from app.utils.frame_decode import decode_frame, frame_pool, DECODE_TARGET_SIZE
+from app.utils.clip_recorder import ClipRecorder
+from app.utils.batch_jobs import BatchJobQueue, UploadTooLarge, read_zip_images
+from app.utils.fair_scheduler import fair_scheduler, Throttled
+from app.utils.model_cadence import ModelCadence
+from app.utils.remote_inference import (RemoteInferenceClient, RemoteInferenceError, InferenceWorker,
+                                         broker_from_url)
 from dotenv import load_dotenv
-import cv2
 import time
 import traceback
 import base64
-import numpy as np
-import requests
+import logging
+import hmac
+import json
+import queue
+import math
+from functools import wraps
+from contextlib import ExitStack
+
+# Heavy dependencies are imported on first use (see app/utils/lazy_import.py)
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
 
 # Load environment variables
 load_dotenv()
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 # Set Ultralytics config directory if not already set
 if 'YOLO_CONFIG_DIR' not in os.environ:
     os.environ['YOLO_CONFIG_DIR'] = '/tmp/yolo_config'
@@ -30,21 +58,41 @@ template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'app', 't
 static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'app', 'static'))
 app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key')
+# Reverse proxies in front of the app (Render has one); request.remote_addr is
+# then the client's address from X-Forwarded-For instead of the proxy's
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 1 if os.environ.get('RENDER') else 0))
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS, x_proto=TRUSTED_PROXY_HOPS)
 socketio = SocketIO(app)
 
 # Check if we're in production environment
 is_production = os.environ.get('RENDER', False)
 
-# Only import the ObjectDetector class after setting environment variables
+# Only import the model loader (and ObjectDetector) after setting environment variables
+from app.utils.model_loader import ModelLoader, COCO_CLASSES
 from app.utils.object_detector import ObjectDetector
+from app.utils.model_registry import ModelRegistry
+from app.utils.model_cache import ModelCache
+from app.utils.weights_cache import WeightsCache, google_drive_download_url
 import pathlib
+import re
 
 # Get absolute path to the models directory
 base_dir = os.path.abspath(os.path.dirname(__file__))
 models_dir = os.path.join(base_dir, "models")
 
+# Versioned model registry; its active pointer wins over the fixed file names
+model_registry = ModelRegistry(models_dir)
+custom_model_version = model_registry.active_version('custom')
+
 # Model paths (using absolute paths)
-custom_model_path = os.path.join(models_dir, "custom_yolo_100epochs_best.pt")
+if custom_model_version:
+    custom_model_path = model_registry.path_for(custom_model_version)
+elif os.path.exists(os.path.join(models_dir, "custom_yolo_model.pt")):
+    # Written by training/scripts/05_deploy_model.py
+    custom_model_path = os.path.join(models_dir, "custom_yolo_model.pt")
+else:
+    custom_model_path = os.path.join(models_dir, "custom_yolo_100epochs_best.pt")
 custom_model_drive_url = "https://drive.google.com/file/d/1a5URsD5oIkujCwpmUaGUd_6HTSswdcwZ/view?usp=sharing"
 coco_model_path = os.path.join(models_dir, "yolov8n.pt")
 
@@ -52,76 +100,108 @@ coco_model_path = os.path.join(models_dir, "yolov8n.pt")
 print(f"Custom model path: {custom_model_path}")
 print(f"COCO model path: {coco_model_path}")
 
-# Initialize detectors
-custom_detector = None
-coco_detector = None
-
-def download_file_from_google_drive(drive_url, destination):
-    # Extract file ID from Google Drive share link
-    import re
-    file_id_match = re.search(r'/d/([\w-]+)', drive_url)
-    if not file_id_match:
-        print('Invalid Google Drive link')
-        return False
-    file_id = file_id_match.group(1)
-    download_url = f'https://drive.google.com/uc?export=download&id={file_id}'
-    print(f"Downloading model from Google Drive: {download_url}")
-    response = requests.get(download_url, stream=True)
-    if response.status_code == 200:
-        with open(destination, 'wb') as f:
-            for chunk in response.iter_content(1024 * 1024):
-                f.write(chunk)
-        print(f"Downloaded model to {destination}")
-        return True
-    else:
-        print(f"Failed to download model. Status code: {response.status_code}")
-        return False
-
-def initialize_model(model_path, name="model", max_retries=2, retry_delay=2):
-    """Initialize a model with retry logic"""
-    for attempt in range(max_retries + 1):
-        try:
-            print(f"Attempting to load {name} (attempt {attempt+1}/{max_retries+1}): {model_path}")
-            detector = ObjectDetector(model_path=model_path, socketio=socketio)
-            if detector.model_loaded:
-                print(f"{name} loaded successfully")
-                return detector
-            else:
-                print(f"{name} initialization returned False for model_loaded")
-                if attempt < max_retries:
-                    print(f"Will retry in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-        except Exception as e:
-            print(f"Error loading {name}: {e}")
-            if attempt < max_retries:
-                print(f"Will retry in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-    
-    # If we get here, all attempts failed
-    print(f"All attempts to load {name} failed, using fallback")
-    return ObjectDetector(use_fallback=True)
-
-# Verify that model files exist before loading
-if not os.path.exists(custom_model_path):
-    print(f"WARNING: Custom model not found at {custom_model_path}. Will use fallback mode.")
-    custom_detector = ObjectDetector(use_fallback=True)
-else:
-    # Load custom model
-    custom_detector = initialize_model(custom_model_path, "custom model")
-
-if not os.path.exists(coco_model_path):
-    print(f"WARNING: COCO model not found at {coco_model_path}. Will use fallback mode.")
-    coco_detector = ObjectDetector(use_fallback=True)
-else:
-    # Load COCO model
-    coco_detector = initialize_model(coco_model_path, "COCO model")
+# Content-addressed weights cache (verified once, read-only, shared across workers).
+# A missing custom model is downloaded into it from Google Drive, resuming and
+# checking CUSTOM_MODEL_SHA256 when set.
+weights_cache = WeightsCache()
+model_urls = {'custom': {'url': google_drive_download_url(custom_model_drive_url),
+                         'sha256': os.environ.get('CUSTOM_MODEL_SHA256')}}
 
 # Config for detection settings
 config = Config()
 
+# Classes each model detects, so only models with monitored classes are loaded
+custom_model_classes = ((model_registry.get_version(custom_model_version) or {}).get('classes')
+                        if custom_model_version else None) or ["stone", "gas_cylinder"]
+
+# Load detectors in the background so the server can accept connections right away.
+# Under gunicorn --preload, gunicorn.conf.py defers loading to the forked worker.
+model_loader = ModelLoader({'custom': custom_model_path, 'coco': coco_model_path}, socketio=socketio,
+                           registry=model_registry, versions={'custom': custom_model_version},
+                           registry_poll_interval=float(os.environ.get('MODEL_REGISTRY_POLL_SECONDS', 5)),
+                           model_classes={'custom': custom_model_classes, 'coco': COCO_CLASSES},
+                           weights_cache=weights_cache, model_urls=model_urls)
+model_loader.apply_settings(config.monitored_objects)
+
+# With INFERENCE_BROKER_URL set, frames are sent to inference workers
+# (inference_worker.py) instead of running the models in this process
+INFERENCE_BROKER_URL = os.environ.get('INFERENCE_BROKER_URL')
+REMOTE_INFERENCE_TIMEOUT = float(os.environ.get('REMOTE_INFERENCE_TIMEOUT', 5))
+remote_inference = RemoteInferenceClient(broker_from_url(INFERENCE_BROKER_URL)) if INFERENCE_BROKER_URL else None
+remote_detectors = {}  # model name -> ObjectDetector without weights, for drawing and alerts
+# memory:// (development): one worker in this process serves its own models through the protocol
+local_worker = (InferenceWorker(remote_inference.broker, model_loader.snapshot, decode_target_size=DECODE_TARGET_SIZE)
+                if INFERENCE_BROKER_URL and INFERENCE_BROKER_URL.startswith('memory://') else None)
+
+def start_model_loading():
+    """Start loading the local models, unless inference runs on remote workers"""
+    if remote_inference is None or local_worker is not None:
+        model_loader.start()
+    if local_worker is not None and not local_worker.running:
+        local_worker.start()
+
+def detection_ready():
+    return remote_inference.ready if remote_inference is not None else model_loader.ready
+
+if os.environ.get('MODEL_LOAD_ON_IMPORT', '1') == '1':
+    start_model_loading()
+
+# Per-site custom models, requested by model_id and loaded on demand
+site_models_dir = os.path.join(models_dir, "sites")
+MODEL_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+def resolve_site_model(model_id):
+    """Map a model_id to weights: a registry model name or version, else models/sites/<model_id>.pt"""
+    active = model_registry.active_version(model_id)
+    if active:
+        return model_registry.path_for(active)
+    if model_registry.get_version(model_id):
+        return model_registry.path_for(model_id)
+    return os.path.join(site_models_dir, f"{model_id}.pt")
+
+model_cache = ModelCache(resolve_site_model, socketio=socketio,
+                         memory_budget_mb=float(os.environ.get('MODEL_CACHE_MB', 1024)),
+                         idle_ttl=float(os.environ.get('MODEL_CACHE_IDLE_SECONDS', 600)))
+
+# Bulk image/video detection, queued apart from the live camera path
+jobs_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'jobs')
+batch_jobs = BatchJobQueue(model_loader.snapshot, jobs_dir, socketio=socketio,
+                           batch_size=int(os.environ.get('BATCH_SIZE', 8)),
+                           max_queued=int(os.environ.get('BATCH_MAX_QUEUED', 4)),
+                           concurrency=int(os.environ.get('BATCH_CONCURRENCY', 1)))
+BATCH_MAX_IMAGES = int(os.environ.get('BATCH_MAX_IMAGES', 500))
+BATCH_MAX_MB = int(os.environ.get('BATCH_MAX_MB', 200))
+QUEUE_DEPTH.set_function(lambda: batch_jobs.stats()['queued'], queue='batch_jobs')
+
+# Upload width hinted to browser cameras (X-Capture-Width); the models run at 640
+CAPTURE_TARGET_WIDTH = int(os.environ.get('CAPTURE_TARGET_WIDTH', 640))
+
+# Persistent detection/alert history
+event_store = EventStore(retention_days=float(os.environ.get('EVENT_RETENTION_DAYS', 30)))
+
+# Pre/post-alert clips from each camera's recent uploads, linked from the alert events
+clip_recorder = ClipRecorder(event_store.clip_dir, socketio=socketio,
+                             pre_seconds=float(os.environ.get('CLIP_PRE_SECONDS', 5)),
+                             post_seconds=float(os.environ.get('CLIP_POST_SECONDS', 5)),
+                             fps=float(os.environ.get('CLIP_FPS', 5)),
+                             slot_kb=int(os.environ.get('CLIP_FRAME_KB', 128)),
+                             max_cameras=int(os.environ.get('CLIP_MAX_CAMERAS', 8)))
+
+# Per-camera reuse of each model's results between runs at its cadence (settings)
+model_cadence = ModelCadence(max_age=float(os.environ.get('MODEL_CADENCE_MAX_AGE', 5)))
+
+# Incrementally maintained trend statistics
+rollups = DetectionRollups(camera_ttl=float(os.environ.get('STATS_CAMERA_TTL_SECONDS', 3600)),
+                           max_cameras=int(os.environ.get('STATS_MAX_CAMERAS', 64)))
+
+QUEUE_DEPTH.set_function(lambda: event_store.stats()['queue_depth'], queue='event_store')
+QUEUE_DEPTH.set_function(lambda: fair_scheduler.waiting, queue='fair_scheduler')
+
 # Helper to get the active detector - now returns both if available
 def get_active_detectors():
     detectors = []
+    custom_detector = model_loader.get('custom')
+    coco_detector = model_loader.get('coco')
     
     # Always use both models if available
     if custom_detector and custom_detector.model_loaded:
@@ -146,9 +226,21 @@ def health_check():
     
     # Memory usage stats
     memory = psutil.virtual_memory()
+    custom_detector = model_loader.get('custom')
+    coco_detector = model_loader.get('coco')
     
     status = {
         "status": "healthy",
+        "ready": detection_ready(),
+        "models": model_loader.status(),
+        "remote_inference": remote_inference.stats() if remote_inference is not None else None,
+        "executor": executor.stats(),
+        "frame_pool": frame_pool.stats(),
+        "clips": clip_recorder.stats(),
+        "batch_jobs": batch_jobs.stats(),
+        "fair_scheduler": fair_scheduler.stats(),
+        "model_cadence": model_cadence.stats(),
+        "cpu_plan": cpu_plan.report(),
         "time": time.strftime("%Y-%m-%d %H:%M:%S"),
         "custom_model": {
             "loaded": custom_detector.model_loaded if custom_detector else False,
@@ -173,6 +265,135 @@ def health_check():
     }
     return jsonify(status)
 
+@app.route('/health/live')
+def health_live():
+    """Liveness probe: the process is up and serving requests"""
+    return jsonify({"status": "alive", "time": time.strftime("%Y-%m-%d %H:%M:%S")})
+
+@app.route('/health/ready')
+def health_ready():
+    """Readiness probe: models are loaded and warmed up"""
+    status = model_loader.status()
+    if remote_inference is not None:
+        status['remote_workers'] = len(remote_inference.workers())
+    return jsonify(status), (200 if detection_ready() else 503)
+
+@app.before_request
+def start_request_timing():
+    # Ensures loading has started in this process (e.g. after a fork)
+    start_model_loading()
+    g.server_timing = ServerTiming()
+    profiler.before_request()
+
+@app.teardown_request
+def stop_request_profiling(exc):
+    profiler.after_request()
+
+@app.after_request
+def add_server_timing(response):
+    """Attach per-stage timings to every response and record request latency"""
+    timing = getattr(g, 'server_timing', None)
+    if timing is not None:
+        response.headers['Server-Timing'] = timing.header()
+        REQUEST_LATENCY.observe(time.perf_counter() - timing.start,
+                                endpoint=request.endpoint or 'unknown', status=response.status_code)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+def admin_required(view):
+    """Allow a view only when the request carries the ADMIN_TOKEN"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        admin_token = os.environ.get('ADMIN_TOKEN')
+        if not admin_token:
+            return jsonify({'error': 'Admin endpoints are disabled (ADMIN_TOKEN not set)'}), 403
+        supplied = request.headers.get('X-Admin-Token') or request.args.get('token') or ''
+        if not hmac.compare_digest(supplied.encode(), admin_token.encode()):
+            return jsonify({'error': 'Invalid admin token'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/admin/profile', methods=['GET', 'POST', 'DELETE'])
+@admin_required
+def admin_profile():
+    """Start (POST), inspect (GET) or stop (DELETE) a sampling/cProfile session"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            started = profiler.start(
+                mode=data.get('mode', 'sample'),
+                seconds=data.get('seconds', 10),
+                requests=data.get('requests'),
+                interval=data.get('interval', 0.005)
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not started:
+            return jsonify({'error': 'A profiling session is already running', **profiler.status()}), 409
+        return jsonify(profiler.status()), 202
+    if request.method == 'DELETE':
+        profiler.stop()
+    return jsonify(profiler.status())
+
+@app.route('/admin/profile/result')
+@admin_required
+def admin_profile_result():
+    """Download the collapsed stacks or pstats dump of the last session"""
+    result = profiler.result()
+    if result is None:
+        return jsonify({'error': 'No finished profiling session', **profiler.status()}), 404
+    data, mimetype, filename = result
+    return Response(data, mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.route('/admin/profile/torch', methods=['GET', 'POST'])
+@admin_required
+def admin_torch_profile():
+    """Arm (POST) a torch profiler capture of the next N inference calls, or download it (GET)"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            frames = int(data.get('frames', 5))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'frames must be an integer'}), 400
+        torch_trace.arm(frames=max(1, frames))
+        return jsonify(torch_trace.status()), 202
+    archive = torch_trace.result()
+    if archive is None:
+        return jsonify({'error': 'No finished torch capture', **torch_trace.status()}), 404
+    return Response(archive, mimetype='application/zip',
+                    headers={'Content-Disposition': 'attachment; filename=torch_traces.zip'})
+
+@app.route('/admin/models', methods=['GET', 'POST'])
+@admin_required
+def admin_models():
+    """Show the model registry (GET) or activate/roll back a version (POST)
+
+    POST body: {"activate": "<version>"} or {"rollback": "<model name>"}.
+    The loader picks up the change on its next registry poll.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            if data.get('activate'):
+                model_registry.activate(data['activate'])
+            elif data.get('rollback'):
+                model_registry.rollback(data['rollback'], reason='manual rollback')
+            else:
+                return jsonify({'error': "Expected 'activate' or 'rollback'"}), 400
+        except KeyError as e:
+            return jsonify({'error': str(e)}), 404
+    return jsonify({'registry': model_registry.load(), 'loaded': model_loader.status()['versions']})
+
+@app.route('/api/models/cache')
+def model_cache_stats():
+    """API endpoint returning per-site model cache hit/miss/eviction stats"""
+    return jsonify(model_cache.stats())
+
 @app.errorhandler(500)
 def server_error(e):
     """Handle server errors gracefully"""
@@ -186,22 +407,15 @@ def index():
 
 @app.route('/settings', methods=['GET', 'POST'])
 def settings():
-    form = NotificationForm()
+    # A min_interval beyond max_age would never take effect: older results are always re-run
+    form = NotificationForm(max_interval=model_cadence.max_age)
     
-    # Create model class information for display
+    # Create model class information for display. The loader knows every model's
+    # classes, including models unloaded because none of their classes are monitored.
     available_classes = {}
-    
-    # Get classes from custom model
-    if custom_detector and hasattr(custom_detector, 'model_loaded') and custom_detector.model_loaded:
-        if hasattr(custom_detector, 'model') and hasattr(custom_detector.model, 'names'):
-            custom_classes = list(custom_detector.model.names.values())
-            available_classes['custom'] = sorted(custom_classes)
-    
-    # Get classes from COCO model
-    if coco_detector and hasattr(coco_detector, 'model_loaded') and coco_detector.model_loaded:
-        if hasattr(coco_detector, 'model') and hasattr(coco_detector.model, 'names'):
-            coco_classes = list(coco_detector.model.names.values())
-            available_classes['coco'] = sorted(coco_classes)
+    for model_name in ('custom', 'coco'):
+        if model_loader.model_classes.get(model_name):
+            available_classes[model_name] = sorted(model_loader.model_classes[model_name])
       # Add special classes
     special_classes = ["Movement", "stone", "gas_cylinder"]
     available_classes['special'] = special_classes
@@ -227,9 +441,18 @@ def settings():
             config.sms_objects = [c.strip() for c in form.sms_objects.data.split(',') if c.strip()]
         config.sms_cooldown = form.sms_cooldown.data
         
+        # Model cadence
+        for model_name in ('custom', 'coco'):
+            every_n = getattr(form, f'{model_name}_every_n').data
+            min_interval = getattr(form, f'{model_name}_min_interval').data
+            config.model_cadence[model_name] = {'every_n': every_n or 1, 'min_interval': min_interval or 0.0}
+        
         # Save the settings to make them persistent
         config.save_settings()
         
+        # Load/unload models to match the monitored objects
+        model_loader.apply_settings(config.monitored_objects)
+        
         flash('Settings saved successfully!', 'success')
         return redirect(url_for('index'))
     
@@ -244,116 +467,414 @@ def settings():
             form.sms_objects.data = ','.join(config.sms_objects)
         if hasattr(config, 'sms_cooldown'):
             form.sms_cooldown.data = config.sms_cooldown
+        for model_name, cadence in config.model_cadence.items():
+            getattr(form, f'{model_name}_every_n').data = cadence['every_n']
+            getattr(form, f'{model_name}_min_interval').data = cadence['min_interval']
     
     return render_template('settings.html', form=form, 
                           available_classes=all_classes, 
                           model_classes=available_classes)
 
-@app.route('/detect_frame', methods=['POST'])
-def detect_frame():
-    """Endpoint to receive a frame from the browser, run detection, and return results."""
-    data = request.get_json()
+def decode_image(image_bytes):
+    """Decode an uploaded JPEG/PNG into a BGR frame (None if invalid)
+
+    Large JPEGs are decoded at a reduced size (see app/utils/frame_decode.py).
+
+    Returns:
+        tuple: (frame, scale from frame to uploaded image coordinates)
+    """
+    return decode_frame(image_bytes, DECODE_TARGET_SIZE)
+
+def detections_to_results(frame_result, model_name, scale=1):
+    """Convert one frame's detections (a FrameResult) into JSON-ready result dicts
+
+    Boxes are multiplied by scale to map a reduced decode back to the uploaded image.
+    """
+    results = []
+    # Look for detection boxes in the processed frame or objects list
+    if frame_result.detections:
+        for det in frame_result.detections:
+            if isinstance(det, tuple) and len(det) >= 6:  # Full detection with coordinates
+                label, conf, x1, y1, x2, y2 = det
+                x1, y1, x2, y2 = x1 * scale, y1 * scale, x2 * scale, y2 * scale
+                results.append({
+                    'label': label,
+                    'confidence': float(conf),
+                    'x1': int(x1),
+                    'y1': int(y1),
+                    'x2': int(x2),
+                    'y2': int(y2),
+                    'width': int(x2 - x1),
+                    'height': int(y2 - y1),
+                    'model': model_name
+                })
+            elif isinstance(det, tuple) and len(det) == 2:  # Just label and confidence
+                label, conf = det
+                results.append({
+                    'label': label,
+                    'confidence': float(conf),
+                    'model': model_name
+                })
+    else:
+        # Fallback to just label and confidence pairs
+        for label, conf in frame_result.objects:
+            results.append({
+                'label': label,
+                'confidence': float(conf),
+                'model': model_name
+            })
+    return results
+
+def run_detection(data, timing, client_address=None):
+    """Run the detection pipeline for one /detect_frame payload
+
+    Shared by the Flask route and the ASGI entry point (asgi.py).
+
+    Args:
+        data (dict): Request JSON with 'image' and optional 'camera_id'/'camera_token'/'model_id'
+        timing (ServerTiming): Collects per-stage durations
+        client_address (str, optional): Client address (from X-Forwarded-For behind a proxy),
+                                        which with the camera id identifies the client
+
+    Returns:
+        tuple: (body dict, HTTP status, extra headers dict)
+    """
     if not data or 'image' not in data:
-        return jsonify({'error': 'No image data provided'}), 400
+        FRAMES_DROPPED.inc(reason='no_image')
+        return {'error': 'No image data provided'}, 400, {}
+    if not detection_ready():
+        # Answer immediately instead of queueing frames behind model loading
+        FRAMES_DROPPED.inc(reason='warming_up')
+        return ({'status': 'warming_up', 'detections': [], 'models': model_loader.status()['state']},
+                503, {'Retry-After': '2', 'X-Capture-Width': str(CAPTURE_TARGET_WIDTH)})
+    # Per-client rate limit and weighted fair queue for the inference slots
+    camera_id = str(data.get('camera_id') or 'default')
+    # A camera's priority weight is only granted with its CAMERA_TOKENS token
+    camera_token = data.get('camera_token')
+    # '<address>/<camera id>', with a cap on the camera ids one address can use
+    client = fair_scheduler.client(client_address or 'local', camera_id, camera_token)
+    scheduled = ExitStack()
+    try:
+        fair_scheduler.admit(client, camera_id, camera_token)
+        with timing.stage('queue'):
+            scheduled.enter_context(fair_scheduler.slot(client, camera_id, camera_token))
+    except Throttled as e:
+        # Refused before any decoding, so an over-budget client costs next to nothing
+        FRAMES_DROPPED.inc(reason='throttled')
+        return ({'status': 'throttled', 'reason': e.reason, 'retry_after': round(e.retry_after, 3)},
+                429, {'Retry-After': str(max(1, math.ceil(e.retry_after)))})
+    with scheduled:
+        if remote_inference is not None:
+            return run_remote_detection(data, timing, camera_id, client)
+        return run_local_detection(data, timing, camera_id, client)
+
+def run_local_detection(data, timing, camera_id, client):
+    """run_detection() with the models running in this process
+
+    The cadence cache is keyed on client (address and camera id), never on the
+    client-supplied camera id alone.
+    """
     try:
         # Decode base64 image
-        img_data = base64.b64decode(data['image'])
-        np_arr = np.frombuffer(img_data, np.uint8)
-        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        with timing.stage('decode'):
+            image_bytes = base64.b64decode(data['image'])
+            frame, scale = executor.run(decode_image, image_bytes)
         if frame is None:
-            return jsonify({'error': 'Invalid image data'}), 400
+            FRAMES_DROPPED.inc(reason='invalid_image')
+            return {'error': 'Invalid image data'}, 400, {}
+        model_id = data.get('model_id')
+        if model_id is not None and not MODEL_ID_PATTERN.match(str(model_id)):
+            FRAMES_DROPPED.inc(reason='invalid_model')
+            return {'error': 'Invalid model_id'}, 400, {}
+        frame_time = time.time()
+        # Keep the uploaded JPEG for alert clips
+        clip_recorder.add_frame(client, image_bytes, frame_time)
         
         # Run both detectors regardless of selected model in settings
         results = []
+        fresh = []  # results from models that ran on this frame
+        model_age = {}  # model -> age in seconds of its results (0 when it ran on this frame)
+        # One consistent set of detectors for the whole request, even during a hot-swap
+        detectors = dict(model_loader.snapshot())
+        with ExitStack() as borrowed:
+            if model_id:
+                # A site model replaces the default custom model for this request
+                try:
+                    with timing.stage('model_cache'):
+                        detectors['custom'] = borrowed.enter_context(model_cache.acquire(str(model_id)))
+                except KeyError:
+                    FRAMES_DROPPED.inc(reason='invalid_model')
+                    return {'error': f'Unknown model_id: {model_id}'}, 404, {}
+            for model_name in ('custom', 'coco'):
+                detector = detectors.get(model_name)
+                if not (detector and detector.model_loaded):
+                    continue
+                # Between runs at the model's cadence, serve its last results for this client
+                cached = model_cadence.reuse(client, model_name, detector,
+                                             config.model_cadence.get(model_name, {}), frame_time)
+                if cached is not None:
+                    reused, model_age[model_name] = cached
+                    results.extend(reused)
+                    continue
+                
+                # Get processed frame and detected objects; the detector draws on
+                # its own pooled copy of the frame
+                with timing.stage(model_name), frame_pool.copy(frame) as working:
+                    processed_frame, detected = detector._process_frame(working, config)
+                timing.add(f'{model_name}_inference', detected.timings['inference'])
+                timing.add(f'{model_name}_notify', detected.timings['notify'])
+                
+                # Add to combined results
+                with timing.stage('convert'):
+                    model_results = detections_to_results(detected, model_name, scale)
+                model_cadence.store(client, model_name, detector, model_results, frame_time)
+                results.extend(model_results)
+                fresh.extend(model_results)
+                model_age[model_name] = 0.0
+                for alert in detected.alerts:
+                    if scale != 1:
+                        alert['coordinates'] = {k: v * scale for k, v in alert['coordinates'].items()}
+                    alert['clip'] = clip_recorder.trigger(client, camera_id, alert['timestamp'], alert['object'])
+                    event_store.record_alert(camera_id, alert, model=detector.name or model_name)
+        
+        # Queue for persistence; never waits on the database. Reused results
+        # were recorded on the frame they came from.
+        with timing.stage('record'):
+            event_store.record_detections(camera_id, fresh, frame_time)
+            rollups.observe_frame(camera_id, [r['label'] for r in results], frame_time)
         
-        # Always use custom detector if available
-        if custom_detector and custom_detector.model_loaded:
-            # Get processed frame and detected objects
-            processed_frame, detected_custom = custom_detector._process_frame(frame.copy(), config)
-            
-            # Extract the full detection information
-            custom_results = []
-            # Look for detection boxes in the processed frame or objects list
-            if hasattr(custom_detector, 'last_detections') and custom_detector.last_detections:
-                for det in custom_detector.last_detections:
-                    if isinstance(det, tuple) and len(det) >= 6:  # Full detection with coordinates
-                        label, conf, x1, y1, x2, y2 = det
-                        custom_results.append({
-                            'label': label,
-                            'confidence': float(conf),
-                            'x1': int(x1),
-                            'y1': int(y1),
-                            'x2': int(x2),
-                            'y2': int(y2),
-                            'width': int(x2 - x1),
-                            'height': int(y2 - y1),
-                            'model': 'custom'
-                        })
-                    elif isinstance(det, tuple) and len(det) == 2:  # Just label and confidence
-                        label, conf = det
-                        custom_results.append({
-                            'label': label,
-                            'confidence': float(conf),
-                            'model': 'custom'
-                        })
+        FRAMES_PROCESSED.inc()
+        frame_rate.mark()
+        return ({'detections': results, 'model_age': round_ages(model_age)}, 200,
+                {'X-Capture-Width': str(CAPTURE_TARGET_WIDTH)})
+    except Exception as e:
+        FRAMES_DROPPED.inc(reason='error')
+        logger.exception(f"Error in detect_frame: {e}")
+        return {'error': str(e)}, 500, {}
+
+def get_remote_detector(model_name):
+    """ObjectDetector without weights that draws and alerts for a remote model's detections"""
+    detector = remote_detectors.get(model_name)
+    if detector is None:
+        detector = remote_detectors[model_name] = ObjectDetector(use_fallback=True, name=model_name,
+                                                                 socketio=model_loader.socketio)
+    return detector
+
+def run_remote_detection(data, timing, camera_id, client):
+    """run_detection() with the models running on an inference worker
+
+    The upload is forwarded as-is; this process only decodes it when an
+    alert needs a snapshot. Boxes come back in upload coordinates.
+    """
+    if data.get('model_id') is not None:
+        FRAMES_DROPPED.inc(reason='invalid_model')
+        return {'error': 'model_id is not supported with remote inference'}, 400, {}
+    try:
+        image_bytes = base64.b64decode(data['image'])
+        frame_time = time.time()
+        results = []
+        model_age = {}
+        models = []
+        for model_name in ('custom', 'coco'):
+            if model_name not in model_loader.enabled:
+                continue
+            # Models not due at their cadence are not sent to the worker at all
+            cached = model_cadence.reuse(client, model_name, get_remote_detector(model_name),
+                                         config.model_cadence.get(model_name, {}), frame_time)
+            if cached is not None:
+                reused, model_age[model_name] = cached
+                results.extend(reused)
             else:
-                # Fallback to just label and confidence pairs
-                for label, conf in detected_custom:
-                    custom_results.append({
-                        'label': label,
-                        'confidence': float(conf),
-                        'model': 'custom'
-                    })
-            
-            # Add to combined results
-            results.extend(custom_results)
-            
-        # Always use COCO detector if available
-        if coco_detector and coco_detector.model_loaded:
-            # Get processed frame and detected objects
-            processed_frame, detected_coco = coco_detector._process_frame(frame.copy(), config)
-            
-            # Extract the full detection information
-            coco_results = []
-            # Look for detection boxes in the processed frame or objects list
-            if hasattr(coco_detector, 'last_detections') and coco_detector.last_detections:
-                for det in coco_detector.last_detections:
-                    if isinstance(det, tuple) and len(det) >= 6:  # Full detection with coordinates
-                        label, conf, x1, y1, x2, y2 = det
-                        coco_results.append({
-                            'label': label,
-                            'confidence': float(conf),
-                            'x1': int(x1),
-                            'y1': int(y1),
-                            'x2': int(x2),
-                            'y2': int(y2),
-                            'width': int(x2 - x1),
-                            'height': int(y2 - y1),
-                            'model': 'coco'
-                        })
-                    elif isinstance(det, tuple) and len(det) == 2:  # Just label and confidence
-                        label, conf = det
-                        coco_results.append({
-                            'label': label,
-                            'confidence': float(conf),
-                            'model': 'coco'
-                        })
+                models.append(model_name)
+        try:
+            if models:
+                with timing.stage('remote'):
+                    # Waits cooperatively under eventlet; no executor slot is held for the round trip
+                    reply = remote_inference.detect(image_bytes, models, REMOTE_INFERENCE_TIMEOUT)
             else:
-                # Fallback to just label and confidence pairs
-                for label, conf in detected_coco:
-                    coco_results.append({
-                        'label': label,
-                        'confidence': float(conf),
-                        'model': 'coco'
-                    })
-            
-            # Add to combined results
-            results.extend(coco_results)
-        
-        return jsonify({'detections': results})
+                reply = {'detections': {}, 'timings': {}, 'worker': ''}
+        except RemoteInferenceError as e:
+            logger.warning(f"Remote inference failed: {e}")
+            FRAMES_DROPPED.inc(reason='remote_unavailable')
+            return {'error': str(e)}, 503, {'Retry-After': '1', 'X-Capture-Width': str(CAPTURE_TARGET_WIDTH)}
+        if reply.get('error'):
+            invalid = reply.get('invalid_image', False)
+            FRAMES_DROPPED.inc(reason='invalid_image' if invalid else 'error')
+            return {'error': reply['error']}, (400 if invalid else 500), {}
+        clip_recorder.add_frame(client, image_bytes, frame_time)
+
+        decoded = []
+        def get_frame():
+            # Decoded at full size, once, and only if some model raises an alert
+            if not decoded:
+                decoded.append(executor.run(decode_frame, image_bytes, 0)[0])
+            return decoded[0]
+
+        fresh = []
+        for model_name in models:
+            if model_name not in reply['detections']:
+                continue
+            detector = get_remote_detector(model_name)
+            seconds = reply['timings'].get(model_name, 0.0)
+            with timing.stage(model_name):
+                detected = detector.process_remote_detections(reply['detections'][model_name], config,
+                                                              get_frame, seconds)
+            timing.add(f'{model_name}_inference', seconds)
+            timing.add(f'{model_name}_notify', detected.timings['notify'])
+            model_results = detections_to_results(detected, model_name)
+            model_cadence.store(client, model_name, detector, model_results, frame_time)
+            results.extend(model_results)
+            fresh.extend(model_results)
+            model_age[model_name] = 0.0
+            for alert in detected.alerts:
+                alert['clip'] = clip_recorder.trigger(client, camera_id, alert['timestamp'], alert['object'])
+                event_store.record_alert(camera_id, alert, model=model_name)
+
+        with timing.stage('record'):
+            event_store.record_detections(camera_id, fresh, frame_time)
+            rollups.observe_frame(camera_id, [r['label'] for r in results], frame_time)
+
+        FRAMES_PROCESSED.inc()
+        frame_rate.mark()
+        headers = {'X-Capture-Width': str(CAPTURE_TARGET_WIDTH)}
+        if reply['worker']:
+            headers['X-Inference-Worker'] = reply['worker']
+        return {'detections': results, 'model_age': round_ages(model_age)}, 200, headers
     except Exception as e:
-        print(f"Error in detect_frame: {e}")
-        return jsonify({'error': str(e)}), 500
+        FRAMES_DROPPED.inc(reason='error')
+        logger.exception(f"Error in detect_frame: {e}")
+        return {'error': str(e)}, 500, {}
+
+def round_ages(model_age):
+    return {name: round(age, 3) for name, age in model_age.items()}
+
+def encode_detection_response(body, status, data, accept=None):
+    """Encode a run_detection() body in the format the client negotiated
+
+    Errors and warm-up answers are always JSON. Successful results honour
+    the payload's 'format', 'fields', 'class_table' and 'table_id' keys, or
+    the Accept header (see app/utils/response_format.py).
+
+    Returns:
+        tuple: (body bytes or str, mimetype)
+    """
+    if status != 200:
+        return json.dumps(body), 'application/json'
+    data = data or {}
+    fmt = response_format.negotiate(accept, data.get('format'))
+    return response_format.encode(body['detections'], fmt, fields=data.get('fields'),
+                                  known_classes=data.get('class_table', 0), table_id=data.get('table_id'),
+                                  extra={'model_age': body.get('model_age', {})})
+
+@app.route('/detect_frame', methods=['POST'])
+def detect_frame():
+    """Endpoint to receive a frame from the browser, run detection, and return results."""
+    timing = g.server_timing
+    data = request.get_json(silent=True)
+    body, status, headers = run_detection(data, timing, request.remote_addr)
+    with timing.stage('serialize'):
+        payload, mimetype = encode_detection_response(body, status, data, request.headers.get('Accept'))
+    response = Response(payload, status=status, mimetype=mimetype, headers=headers)
+    response.headers['Vary'] = 'Accept'
+    return response
+
+def batch_unavailable():
+    """Response for bulk requests while models load or the job queue is full"""
+    if not model_loader.ready:
+        return jsonify({'status': 'warming_up', 'models': model_loader.status()['state']}), 503, {'Retry-After': '5'}
+    return jsonify({'error': 'Too many batch jobs queued, try again later'}), 429, {'Retry-After': '30'}
+
+def check_upload_size(max_bytes):
+    """Response refusing a bulk upload before its body is read, or None to accept it
+
+    The body is only parsed (and spooled to disk by Werkzeug) after this
+    check, so the declared length must be present and within the limit.
+    """
+    if request.content_length is None:
+        return jsonify({'error': 'Content-Length is required for uploads'}), 411
+    if request.content_length > max_bytes + 1024 * 1024:  # room for the multipart framing
+        return jsonify({'error': f'Upload is larger than {BATCH_MAX_MB} MB'}), 413
+    return None
+
+@app.route('/api/detect/batch', methods=['POST'])
+def detect_batch():
+    """Run detection on many images (multipart files and/or zip archives), streaming NDJSON results"""
+    if not model_loader.ready:
+        return batch_unavailable()
+    max_bytes = BATCH_MAX_MB * 1024 * 1024
+    refused = check_upload_size(max_bytes)
+    if refused:
+        return refused
+    items = []
+    try:
+        if request.mimetype in ('application/zip', 'application/x-zip-compressed'):
+            items = read_zip_images(request.get_data(), BATCH_MAX_IMAGES, max_bytes)
+        for upload in request.files.getlist('files') + request.files.getlist('file'):
+            data = upload.read()
+            if upload.filename.lower().endswith('.zip') or upload.mimetype in ('application/zip',
+                                                                               'application/x-zip-compressed'):
+                items.extend(read_zip_images(data, BATCH_MAX_IMAGES, max_bytes))
+            else:
+                items.append((upload.filename, data))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not items:
+        return jsonify({'error': 'No images provided'}), 400
+    if len(items) > BATCH_MAX_IMAGES or sum(len(data) for _, data in items) > max_bytes:
+        return jsonify({'error': f'Too many images (limit {BATCH_MAX_IMAGES} images, {BATCH_MAX_MB} MB)'}), 413
+    try:
+        job = batch_jobs.submit_images(items)
+    except queue.Full:
+        return batch_unavailable()
+    return Response(batch_jobs.stream(job), mimetype='application/x-ndjson',
+                    headers={'X-Job-Id': job.id, 'Cache-Control': 'no-cache'})
+
+@app.route('/api/detect/video', methods=['POST'])
+def detect_video():
+    """Queue an uploaded video for detection; progress arrives as 'job_progress' Socket.IO events"""
+    if not model_loader.ready:
+        return batch_unavailable()
+    max_bytes = BATCH_MAX_MB * 1024 * 1024
+    refused = check_upload_size(max_bytes)
+    if refused:
+        return refused
+    upload = request.files.get('video') or request.files.get('file')
+    if upload is None:
+        return jsonify({'error': 'No video provided'}), 400
+    try:
+        sample_fps = float(request.form.get('sample_fps', 5.0))
+    except ValueError:
+        return jsonify({'error': 'sample_fps must be a number'}), 400
+    try:
+        job = batch_jobs.submit_video(upload.stream, upload.filename, sample_fps=sample_fps,
+                                      max_bytes=max_bytes)
+    except queue.Full:
+        return batch_unavailable()
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({**job.to_dict(),
+                    'status_url': url_for('batch_job_status', job_id=job.id),
+                    'results_url': url_for('batch_job_results', job_id=job.id)}), 202
+
+@app.route('/api/jobs/<job_id>')
+def batch_job_status(job_id):
+    """Status and progress of a batch job"""
+    job = batch_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/results')
+def batch_job_results(job_id):
+    """NDJSON results of a video job (one line per processed frame)"""
+    job = batch_jobs.get(job_id)
+    if job is None or not job.results_path:
+        return jsonify({'error': 'Job not found'}), 404
+    if not os.path.exists(job.results_path):
+        return jsonify({'error': 'No results yet', 'status': job.status}), 409
+    return send_file(job.results_path, mimetype='application/x-ndjson')
 
 @socketio.on('connect')
 def handle_connect():
@@ -389,7 +910,65 @@ def toggle_sms():
         'error': 'Invalid request'
     }), 400
 
+@app.route('/api/events')
+def list_events():
+    """API endpoint returning paginated detection/alert history, newest first"""
+    args = request.args
+    try:
+        page = event_store.query_events(
+            camera_id=args.get('camera_id'),
+            label=args.get('label'),
+            kind=args.get('kind'),
+            start=args.get('start', type=float),
+            end=args.get('end', type=float),
+            cursor=args.get('cursor'),
+            limit=args.get('limit', 100, type=int)
+        )
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    for event in page['events']:
+        if event['thumbnail']:
+            event['thumbnail_url'] = url_for('event_thumbnail', event_id=event['id'])
+        if event['clip']:
+            event['clip_url'] = url_for('alert_clip', clip_id=event['clip'])
+    page['store'] = event_store.stats()
+    return jsonify(page)
+
+@app.route('/api/events/<int:event_id>/thumbnail')
+def event_thumbnail(event_id):
+    """Serve the JPEG snapshot stored with an alert event"""
+    path = event_store.get_thumbnail_path(event_id)
+    if not path or not os.path.exists(path):
+        return jsonify({'error': 'Thumbnail not found'}), 404
+    return send_file(path, mimetype='image/jpeg')
+
+@app.route('/api/clips/<clip_id>')
+def alert_clip(clip_id):
+    """Serve a recorded alert clip (404 until the post-alert window has been written)"""
+    path = clip_recorder.path_for(clip_id)
+    if not path or not os.path.exists(path):
+        return jsonify({'error': 'Clip not found'}), 404
+    return send_file(path, mimetype='video/x-msvideo')
+
+@app.route('/api/stats')
+def detection_stats():
+    """API endpoint returning per-class trend rollups and dwell times"""
+    resolution = request.args.get('resolution', 'minute')
+    if resolution not in DetectionRollups.RESOLUTIONS:
+        return jsonify({'error': f'Invalid resolution: {resolution}'}), 400
+    camera_id = request.args.get('camera_id')
+    window = request.args.get('window', type=float)
+    since = time.time() - window if window else request.args.get('since', type=float)
+    return jsonify({
+        'resolution': resolution,
+        'cameras': rollups.cameras(),
+        'series': rollups.series(resolution, camera_id=camera_id,
+                                 label=request.args.get('label'), since=since),
+        'dwell': rollups.dwell_stats(camera_id=camera_id)
+    })
+
 if __name__ == '__main__':
+    start_model_loading()
     # Use this for local development
     socketio.run(app, debug=True)
     
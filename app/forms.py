@@ -1,6 +1,6 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, FloatField, SubmitField, BooleanField, IntegerField
-from wtforms.validators import DataRequired, NumberRange, Optional
+from wtforms.validators import DataRequired, NumberRange, Optional, ValidationError
 
 class NotificationForm(FlaskForm):
     monitored_objects = StringField('Objects to Monitor (comma-separated)', 
@@ -19,4 +19,40 @@ class NotificationForm(FlaskForm):
                                validators=[Optional(), NumberRange(min=10, max=3600)],
                                default=60)
     
-    submit = SubmitField('Save Settings')
\ No newline at end of file
+    # Model cadence: how often each model runs; its last results are reused in between
+    custom_every_n = IntegerField('Custom Model: Run Every Nth Frame',
+                                  validators=[Optional(), NumberRange(min=1, max=100)],
+                                  default=1)
+    custom_min_interval = FloatField('Custom Model: Minimum Seconds Between Runs',
+                                     validators=[Optional(), NumberRange(min=0)],
+                                     default=0)
+    coco_every_n = IntegerField('COCO Model: Run Every Nth Frame',
+                                validators=[Optional(), NumberRange(min=1, max=100)],
+                                default=3)
+    coco_min_interval = FloatField('COCO Model: Minimum Seconds Between Runs',
+                                   validators=[Optional(), NumberRange(min=0)],
+                                   default=0)
+    
+    submit = SubmitField('Save Settings')
+
+    def __init__(self, *args, max_interval=60, **kwargs):
+        """Create the form
+
+        Args:
+            max_interval (float): Largest minimum interval between model runs. app.py passes
+                the cadence max_age: results older than that are never reused, so a longer
+                interval would not be honoured.
+        """
+        super().__init__(*args, **kwargs)
+        self.max_interval = max_interval
+
+    def _check_min_interval(self, field):
+        if field.data is not None and field.data > self.max_interval:
+            raise ValidationError(f'Must be at most {self.max_interval:g} seconds '
+                                  f'(results older than that are never reused)')
+
+    def validate_custom_min_interval(self, field):
+        self._check_min_interval(field)
+
+    def validate_coco_min_interval(self, field):
+        self._check_min_interval(field)
\ No newline at end of file
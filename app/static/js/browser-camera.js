@@ -8,7 +8,15 @@
 
 // Configuration settings
 const config = {
-    captureInterval: 200, // milliseconds between frame captures
+    minCaptureInterval: 100, // fastest capture rate (ms between frames)
+    maxCaptureInterval: 2000, // slowest capture rate, also used as error backoff ceiling
+    rttHeadroom: 1.2, // capture interval as a multiple of the smoothed server round-trip time
+    jpegQuality: 0.7,
+    targetWidth: 640, // upload width until the server sends an X-Capture-Width hint
+    diffWidth: 32, // size of the thumbnail used for change detection
+    diffHeight: 24,
+    diffThreshold: 3, // mean absolute luminance change (0-255) below which a frame is skipped
+    maxSkipTime: 2000, // always upload at least this often, even without change
     detectionThreshold: 0.4, // minimum confidence score for displaying detections
     colors: { // colors for bounding boxes by class (with fallback)
         person: '#FF5733',
@@ -34,11 +42,36 @@ let elements = {
 // Track application state
 let state = {
     streaming: false,
-    captureInterval: null,
+    captureTimer: null,
+    inFlight: false,
+    rttEstimate: null, // smoothed /detect_frame round-trip time in ms
+    errorBackoff: 0,
+    lastSentAt: 0,
+    lastThumbnail: null,
+    framesSkipped: 0,
+    uploadScale: 1, // display size / uploaded size, to map boxes back
     socket: null,
-    lastDetections: []
+    lastDetections: [],
+    cameraId: getCameraId(),
+    // Per-site custom model, selected with ?model_id=<id> in the page URL
+    modelId: new URLSearchParams(window.location.search).get('model_id'),
+    // Class table for the packed response format: [label, model] per class index
+    classTable: [],
+    tableId: null
 };
 
+/**
+ * Get a stable identifier for this browser tab's camera
+ */
+function getCameraId() {
+    let cameraId = sessionStorage.getItem('cameraId');
+    if (!cameraId) {
+        cameraId = 'browser-' + Math.random().toString(36).slice(2, 10);
+        sessionStorage.setItem('cameraId', cameraId);
+    }
+    return cameraId;
+}
+
 // Initialize on DOM content loaded
 document.addEventListener('DOMContentLoaded', function() {
     setupElements();
@@ -198,10 +231,10 @@ function startCamera() {
 function stopCamera() {
     if (!state.streaming) return;
     
-    // Stop capture interval
-    if (state.captureInterval) {
-        clearInterval(state.captureInterval);
-        state.captureInterval = null;
+    // Stop capture loop
+    if (state.captureTimer) {
+        clearTimeout(state.captureTimer);
+        state.captureTimer = null;
     }
     
     // Stop video stream
@@ -245,22 +278,102 @@ function updateStatus(message) {
 }
 
 /**
- * Start capturing frames at the specified interval
+ * Start the capture loop
  */
 function startFrameCapture() {
-    state.captureInterval = setInterval(captureAndSendFrame, config.captureInterval);
+    scheduleNextCapture(0);
+}
+
+/**
+ * Schedule the next capture; at most one frame is ever in flight
+ */
+function scheduleNextCapture(delay) {
+    if (!state.streaming) return;
+    if (state.captureTimer) clearTimeout(state.captureTimer);
+    state.captureTimer = setTimeout(captureAndSendFrame, delay);
+}
+
+/**
+ * Delay before the next capture, adapted to the measured round-trip time
+ */
+function nextCaptureDelay(lastRtt) {
+    if (state.errorBackoff > 0) return state.errorBackoff;
+    const rtt = state.rttEstimate || 0;
+    const interval = Math.min(config.maxCaptureInterval,
+                              Math.max(config.minCaptureInterval, rtt * config.rttHeadroom));
+    // The round trip itself already took part of the interval
+    return Math.max(0, interval - lastRtt);
+}
+
+/**
+ * Record a round-trip time in the smoothed estimate
+ */
+function recordRoundTrip(rtt) {
+    state.rttEstimate = state.rttEstimate === null ? rtt : 0.7 * state.rttEstimate + 0.3 * rtt;
+}
+
+/**
+ * Grayscale thumbnail of the current video frame for change detection
+ */
+function captureThumbnail() {
+    if (!elements.diffCanvas) {
+        elements.diffCanvas = document.createElement('canvas');
+        elements.diffCanvas.width = config.diffWidth;
+        elements.diffCanvas.height = config.diffHeight;
+        elements.diffCtx = elements.diffCanvas.getContext('2d', { willReadFrequently: true });
+    }
+    elements.diffCtx.drawImage(elements.video, 0, 0, config.diffWidth, config.diffHeight);
+    const pixels = elements.diffCtx.getImageData(0, 0, config.diffWidth, config.diffHeight).data;
+    const gray = new Uint8Array(config.diffWidth * config.diffHeight);
+    for (let i = 0, j = 0; i < pixels.length; i += 4, j++) {
+        gray[j] = (pixels[i] * 77 + pixels[i + 1] * 150 + pixels[i + 2] * 29) >> 8;
+    }
+    return gray;
+}
+
+/**
+ * Mean absolute difference between two thumbnails
+ */
+function thumbnailDifference(a, b) {
+    if (!a || !b) return Infinity;
+    let total = 0;
+    for (let i = 0; i < a.length; i++) {
+        total += Math.abs(a[i] - b[i]);
+    }
+    return total / a.length;
+}
+
+/**
+ * Draw the current frame, downscaled to the target width, and encode it
+ */
+function encodeUploadFrame() {
+    const videoWidth = elements.video.videoWidth;
+    const videoHeight = elements.video.videoHeight;
+    const width = Math.min(videoWidth, config.targetWidth);
+    const height = Math.round(videoHeight * width / videoWidth);
+    if (!elements.uploadCanvas) {
+        elements.uploadCanvas = document.createElement('canvas');
+        elements.uploadCtx = elements.uploadCanvas.getContext('2d');
+    }
+    elements.uploadCanvas.width = width;
+    elements.uploadCanvas.height = height;
+    elements.uploadCtx.drawImage(elements.video, 0, 0, width, height);
+    state.uploadScale = videoWidth / width;
+    return elements.uploadCanvas.toDataURL('image/jpeg', config.jpegQuality).split(',')[1];
 }
 
 /**
  * Capture a frame from the video and send to server for processing
  */
 function captureAndSendFrame() {
-    if (!state.streaming || !elements.video || !elements.canvas || !elements.ctx) return;
+    state.captureTimer = null;
+    if (!state.streaming || !elements.video || !elements.canvas || !elements.ctx || state.inFlight) return;
     
     // Ensure video is playing and has valid dimensions
     if (elements.video.readyState !== elements.video.HAVE_ENOUGH_DATA || 
         elements.video.videoWidth === 0 || 
         elements.video.videoHeight === 0) {
+        scheduleNextCapture(config.minCaptureInterval);
         return;
     }
     
@@ -268,41 +381,92 @@ function captureAndSendFrame() {
     elements.canvas.width = elements.video.videoWidth;
     elements.canvas.height = elements.video.videoHeight;
     
+    // Skip the upload when the scene hasn't changed; keep showing the last boxes
+    const thumbnail = captureThumbnail();
+    const now = performance.now();
+    if (thumbnailDifference(thumbnail, state.lastThumbnail) < config.diffThreshold &&
+        now - state.lastSentAt < config.maxSkipTime) {
+        state.framesSkipped++;
+        drawBoxes(state.lastDetections);
+        scheduleNextCapture(config.minCaptureInterval);
+        return;
+    }
+    state.lastThumbnail = thumbnail;
+    state.lastSentAt = now;
+    
     // Draw video frame to canvas
     elements.ctx.drawImage(elements.video, 0, 0, elements.canvas.width, elements.canvas.height);
     
-    // Get base64 image data
-    const imageData = elements.canvas.toDataURL('image/jpeg', 0.8).split(',')[1];
+    // Get base64 image data at the upload size
+    const imageData = encodeUploadFrame();
+    const uploadScale = state.uploadScale;
     
     // Send to server for detection
+    state.inFlight = true;
+    const sentAt = performance.now();
     fetch('/detect_frame', {
         method: 'POST',
         headers: {
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            'Accept': 'application/x-pinaka-packed, application/json;q=0.5'
         },
         body: JSON.stringify({
-            image: imageData
+            image: imageData,
+            camera_id: state.cameraId,
+            model_id: state.modelId || undefined,
+            fields: ['class', 'box', 'conf'],
+            class_table: state.classTable.length,
+            table_id: state.tableId
         })
     })
-    .then(response => response.json())
+    .then(response => {
+        // The server hints the upload width it can use
+        const hintedWidth = parseInt(response.headers.get('X-Capture-Width'), 10);
+        if (hintedWidth > 0) config.targetWidth = hintedWidth;
+        if (response.status === 503 || response.status === 429) {
+            const retryAfter = parseFloat(response.headers.get('Retry-After')) || 2;
+            state.errorBackoff = retryAfter * 1000;
+        } else {
+            state.errorBackoff = 0;
+        }
+        const type = response.headers.get('Content-Type') || '';
+        if (type.startsWith('application/x-pinaka-packed')) {
+            return response.arrayBuffer().then(decodePackedDetections);
+        }
+        return response.json();
+    })
     .then(data => {
+        if (data.status === 'throttled') {
+            // Refused before inference: wait as long as the server asks, and keep
+            // the fast refusal out of the round-trip estimate
+            state.errorBackoff = Math.max(config.minCaptureInterval, data.retry_after * 1000);
+            return;
+        }
+        recordRoundTrip(performance.now() - sentAt);
+        if (data.status === 'warming_up') {
+            updateStatus('Models are loading - detection will start shortly');
+            return;
+        }
         if (data.error) {
             console.error('Detection error:', data.error);
             updateStatus('Detection error: ' + data.error);
             return;
         }
         
-        // Log the detection data for debugging (only first few to avoid console spam)
+        // Map boxes from the uploaded size back to the display size
+        if (uploadScale !== 1) {
+            data.detections.forEach(detection => {
+                ['x1', 'y1', 'x2', 'y2'].forEach(key => {
+                    if (detection[key] !== undefined) detection[key] = Math.round(detection[key] * uploadScale);
+                });
+            });
+        }
+        
+        // Update status
         if (data.detections && data.detections.length > 0) {
-            console.log(`Received ${data.detections.length} detections:`, 
-                       data.detections.slice(0, 3));
-            
-            // Update status
-            if (data.detections.length > 0) {
-                updateStatus(`Active detection: ${data.detections.length} objects found`);
-            } else {
-                updateStatus('Camera active - no objects detected');
-            }
+            updateStatus(`Active detection: ${data.detections.length} objects found`);
+        } else {
+            updateStatus('Camera active - no objects detected');
         }
         
         // Process and display detection results
@@ -311,9 +475,66 @@ function captureAndSendFrame() {
     .catch(error => {
         console.error('Error sending frame to server:', error);
         updateStatus('Connection error - check console');
+        state.errorBackoff = Math.min(config.maxCaptureInterval,
+                                      Math.max(config.minCaptureInterval, state.errorBackoff * 2));
+    })
+    .finally(() => {
+        state.inFlight = false;
+        scheduleNextCapture(nextCaptureDelay(performance.now() - sentAt));
     });
 }
 
+/**
+ * Decode a packed detection response (see app/utils/response_format.py)
+ * into the same shape as the JSON response
+ */
+function decodePackedDetections(buffer) {
+    const view = new DataView(buffer);
+    const metaLength = view.getUint32(4, true);
+    const meta = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, metaLength)));
+    
+    // Merge the class table entries we were missing
+    if (meta.table_id !== state.tableId) {
+        state.classTable = [];
+        state.tableId = meta.table_id;
+    }
+    state.classTable.length = meta.classes_start;
+    state.classTable.push(...meta.classes);
+    
+    let offset = 8 + metaLength;
+    const count = view.getUint32(offset, true);
+    offset += 4;
+    const read = (ArrayType, length) => {
+        const values = new ArrayType(buffer.slice(offset, offset + length * ArrayType.BYTES_PER_ELEMENT));
+        offset += length * ArrayType.BYTES_PER_ELEMENT;
+        return values;
+    };
+    const boxes = meta.fields.includes('box') ? read(Int16Array, count * 4) : null;
+    const confs = meta.fields.includes('conf') ? read(Uint16Array, count) : null;
+    const classes = meta.fields.includes('class') ? read(Uint16Array, count) : null;
+    
+    const detections = [];
+    for (let i = 0; i < count; i++) {
+        const detection = {};
+        if (classes) {
+            const [label, model] = state.classTable[classes[i]] || ['unknown', null];
+            detection.label = label;
+            detection.model = model;
+        }
+        if (confs) {
+            detection.confidence = confs[i] / meta.conf_scale;
+        }
+        if (boxes && boxes[i * 4] >= 0) {
+            detection.x1 = boxes[i * 4];
+            detection.y1 = boxes[i * 4 + 1];
+            detection.x2 = boxes[i * 4 + 2];
+            detection.y2 = boxes[i * 4 + 3];
+        }
+        detections.push(detection);
+    }
+    return {detections: detections};
+}
+
 /**
  * Process detection results and visualize on canvas
  */
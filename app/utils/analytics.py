@@ -0,0 +1,202 @@
+"""
+Analytics Module for Pinaka-AI
+
+This module maintains streaming aggregations over detections: counts and
+peak occupancy per class per minute/hour per camera, plus dwell time.
+Each frame updates the rollups in place, so trend queries never have to
+re-scan raw events.
+
+Camera ids come from clients (every browser tab picks its own), so only the
+most recently seen cameras are tracked: a camera idle for longer than the
+camera TTL, or the least recently seen one beyond max_cameras, is dropped
+from the dwell statistics and the camera list. Its counts age out of the
+buckets with the retention.
+"""
+
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# Pseudo-label used for the total number of objects in a frame
+ALL_OBJECTS = '*'
+
+
+class _Dwell:
+    """Running dwell-time statistics for one (camera, label) pair"""
+
+    __slots__ = ('first_seen', 'last_seen', 'sessions', 'total_seconds', 'max_seconds')
+
+    def __init__(self, ts):
+        self.first_seen = ts
+        self.last_seen = ts
+        self.sessions = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def close_session(self):
+        duration = self.last_seen - self.first_seen
+        self.sessions += 1
+        self.total_seconds += duration
+        self.max_seconds = max(self.max_seconds, duration)
+
+
+class DetectionRollups:
+    # Bucket width in seconds for each supported resolution
+    RESOLUTIONS = {'minute': 60, 'hour': 3600}
+
+    def __init__(self, minute_retention=24 * 60, hour_retention=7 * 24, dwell_gap=5.0,
+                 camera_ttl=3600.0, max_cameras=64):
+        """Initialize empty rollups
+
+        Args:
+            minute_retention (int): Number of minute buckets to keep
+            hour_retention (int): Number of hour buckets to keep
+            dwell_gap (float): Seconds an object may go unseen before its
+                               presence session is considered finished
+            camera_ttl (float): Seconds after which an unseen camera is dropped
+            max_cameras (int): Cameras tracked at once; the least recently seen is dropped
+        """
+        self.retention = {'minute': minute_retention, 'hour': hour_retention}
+        self.dwell_gap = dwell_gap
+        self.camera_ttl = camera_ttl
+        self.max_cameras = max_cameras
+        # resolution -> OrderedDict(bucket_start -> {(camera_id, label): [count, peak]})
+        self._buckets = {res: OrderedDict() for res in self.RESOLUTIONS}
+        # camera_id -> label -> _Dwell, least recently seen camera first
+        self._dwell = OrderedDict()
+        self._camera_seen = {}  # camera_id -> last frame time
+        self.cameras_dropped = 0
+        self._lock = threading.Lock()
+
+    def observe_frame(self, camera_id, labels, timestamp=None):
+        """Fold one frame's detections into the rollups
+
+        Work is proportional to the number of detections in the frame;
+        old buckets are evicted as new ones are opened.
+
+        Args:
+            camera_id (str): Camera that produced the frame
+            labels (list): Class label of every detection in the frame
+            timestamp (float, optional): Frame time, defaults to now
+        """
+        ts = timestamp or time.time()
+        counts = Counter(labels)
+        counts[ALL_OBJECTS] = len(labels)
+
+        with self._lock:
+            for resolution, width in self.RESOLUTIONS.items():
+                bucket = self._get_bucket(resolution, ts - (ts % width))
+                for label, n in counts.items():
+                    entry = bucket.get((camera_id, label))
+                    if entry is None:
+                        bucket[(camera_id, label)] = [n, n]
+                    else:
+                        entry[0] += n
+                        if n > entry[1]:
+                            entry[1] = n
+
+            camera = self._touch_camera(camera_id, ts)
+            for label in counts:
+                if label == ALL_OBJECTS:
+                    continue
+                dwell = camera.get(label)
+                if dwell is None:
+                    camera[label] = _Dwell(ts)
+                elif ts - dwell.last_seen > self.dwell_gap:
+                    # The object left and came back: close the old session
+                    dwell.close_session()
+                    dwell.first_seen = ts
+                    dwell.last_seen = ts
+                else:
+                    dwell.last_seen = ts
+
+    def _touch_camera(self, camera_id, ts):
+        """Mark a camera as seen and drop stale ones (called with the lock held)"""
+        camera = self._dwell.get(camera_id)
+        if camera is None:
+            camera = self._dwell[camera_id] = {}
+        else:
+            self._dwell.move_to_end(camera_id)
+        camera_seen = self._camera_seen
+        camera_seen[camera_id] = max(ts, camera_seen.get(camera_id, ts))
+        while len(self._dwell) > 1:
+            oldest = next(iter(self._dwell))
+            if len(self._dwell) <= self.max_cameras and ts - camera_seen[oldest] <= self.camera_ttl:
+                break
+            del self._dwell[oldest]
+            del camera_seen[oldest]
+            self.cameras_dropped += 1
+        return camera
+
+    def _get_bucket(self, resolution, start):
+        buckets = self._buckets[resolution]
+        bucket = buckets.get(start)
+        if bucket is None:
+            bucket = buckets[start] = {}
+            while len(buckets) > self.retention[resolution]:
+                buckets.popitem(last=False)
+        return bucket
+
+    def series(self, resolution='minute', camera_id=None, label=None, since=None):
+        """Return per-bucket counts and peak occupancy, oldest first
+
+        Args:
+            resolution (str): 'minute' or 'hour'
+            camera_id (str, optional): Only this camera
+            label (str, optional): Only this class ('*' for all objects)
+            since (float, optional): Only buckets starting at or after this time
+
+        Returns:
+            list: [{'bucket', 'camera_id', 'label', 'count', 'peak'}, ...]
+        """
+        if resolution not in self.RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        rows = []
+        with self._lock:
+            for start, bucket in self._buckets[resolution].items():
+                if since is not None and start < since:
+                    continue
+                for (cam, lbl), (count, peak) in bucket.items():
+                    if camera_id and cam != camera_id:
+                        continue
+                    if label and lbl != label:
+                        continue
+                    rows.append({'bucket': start, 'camera_id': cam, 'label': lbl,
+                                 'count': count, 'peak': peak})
+        return rows
+
+    def dwell_stats(self, camera_id=None, now=None):
+        """Return dwell-time statistics per (camera, label)
+
+        A session still in progress is included in the totals up to now.
+        """
+        now = now or time.time()
+        stats = []
+        with self._lock:
+            cameras = ([(camera_id, self._dwell.get(camera_id, {}))] if camera_id
+                       else self._dwell.items())
+            for cam, labels in cameras:
+                for lbl, dwell in labels.items():
+                    sessions = dwell.sessions
+                    total = dwell.total_seconds
+                    longest = dwell.max_seconds
+                    present = now - dwell.last_seen <= self.dwell_gap
+                    current = dwell.last_seen - dwell.first_seen
+                    sessions += 1
+                    total += current
+                    longest = max(longest, current)
+                    stats.append({
+                        'camera_id': cam,
+                        'label': lbl,
+                        'present': present,
+                        'sessions': sessions,
+                        'total_seconds': round(total, 2),
+                        'avg_seconds': round(total / sessions, 2),
+                        'max_seconds': round(longest, 2),
+                    })
+        return stats
+
+    def cameras(self):
+        """Return the camera ids currently tracked"""
+        with self._lock:
+            return sorted(self._dwell)
@@ -0,0 +1,77 @@
+"""
+Async Bridge Module for Pinaka-AI
+
+This module lets the synchronous detection code emit Socket.IO events when
+the app is served by the ASGI entry point (asgi.py). ObjectDetector calls
+emit() from worker threads; the bridge hands each event to the asyncio
+event loop, which sends it through python-socketio's AsyncServer and fans
+it out to streaming (Server-Sent Events) subscribers.
+"""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSocketIOBridge:
+    def __init__(self, sio, subscriber_queue_size=100):
+        """Initialize the bridge
+
+        Args:
+            sio (socketio.AsyncServer): Server that delivers the events
+            subscriber_queue_size (int): Events buffered per stream subscriber before dropping
+        """
+        self.sio = sio
+        self.subscriber_queue_size = subscriber_queue_size
+        self.loop = None
+        self._subscribers = set()
+        self.dropped = 0
+
+    def bind(self, loop):
+        """Attach the running event loop; call once at server start-up"""
+        self.loop = loop
+
+    def emit(self, event, data=None, **kwargs):
+        """Emit an event from any thread (same signature as SocketIO.emit)"""
+        if self.loop is None or self.loop.is_closed():
+            logger.warning(f"Dropping {event} event: event loop not running")
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.loop.create_task(self.sio.emit(event, data, **kwargs))
+            self._publish(event, data)
+        else:
+            asyncio.run_coroutine_threadsafe(self.sio.emit(event, data, **kwargs), self.loop)
+            self.loop.call_soon_threadsafe(self._publish, event, data)
+
+    def _publish(self, event, data):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                # A slow stream client loses events instead of holding memory
+                self.dropped += 1
+
+    async def subscribe(self, keepalive=15.0):
+        """Yield (event, data) tuples as they are emitted
+
+        Yields (None, None) after `keepalive` seconds without events so the
+        caller can keep the connection open.
+        """
+        queue = asyncio.Queue(maxsize=self.subscriber_queue_size)
+        self._subscribers.add(queue)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None, None
+        finally:
+            self._subscribers.discard(queue)
+
+    def stats(self):
+        return {'subscribers': len(self._subscribers), 'dropped': self.dropped}
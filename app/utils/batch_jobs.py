@@ -0,0 +1,380 @@
+"""
+Batch Jobs Module for Pinaka-AI
+
+This module runs bulk detection work (uploaded image sets and videos) as
+jobs, separate from the live camera path:
+
+- jobs wait in their own bounded queue and are run one at a time by a
+  dedicated worker thread; a full queue is reported to the client instead of
+  growing without limit,
+- inference goes through its own executor, so a long video never takes the
+  slots that /detect_frame uses (app/utils/executor.py),
+- frames are grouped into batches and each model runs one forward pass per
+  batch. Eager detection models use LeanPredictor.predict_batch, which shares
+  the live model's weights but none of the Ultralytics predictor state;
+  other models fall back to a batched predictor call, made under the
+  detector's inference lock so it never overlaps a live frame.
+
+Image jobs stream one NDJSON line per image as soon as its batch is done.
+Video jobs write NDJSON results to disk and report progress with
+'job_progress' Socket.IO events.
+"""
+
+import io
+import os
+import json
+import time
+import uuid
+import queue
+import shutil
+import logging
+import zipfile
+import math
+import threading
+import weakref
+
+from app.utils.lazy_import import lazy_module
+from app.utils.executor import BlockingExecutor
+from app.utils.cpu_plan import cpu_plan
+from app.utils.frame_decode import decode_frame
+from app.utils.lean_inference import LeanPredictor, supports_lean, standard_detections
+
+cv2 = lazy_module('cv2')
+
+
+class UploadTooLarge(Exception):
+    """An upload went over the size limit while it was being saved"""
+
+    def __init__(self, max_bytes):
+        super().__init__(f"Upload is larger than {max_bytes // (1024 * 1024)} MB")
+        self.max_bytes = max_bytes
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def read_zip_images(data, max_images=500, max_bytes=200 * 1024 * 1024):
+    """Extract the images from an uploaded zip archive
+
+    Args:
+        data (bytes): Zip archive
+        max_images (int): Maximum number of images accepted
+        max_bytes (int): Maximum total uncompressed size
+
+    Returns:
+        list: (name, image bytes) tuples in archive order
+
+    Raises:
+        ValueError: If the archive is invalid or over a limit
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        raise ValueError('Invalid zip archive')
+    members = [m for m in archive.infolist()
+               if not m.is_dir() and m.filename.lower().endswith(IMAGE_EXTENSIONS)
+               and not os.path.basename(m.filename).startswith('.')]
+    if len(members) > max_images:
+        raise ValueError(f'Too many images in archive (limit {max_images})')
+    # Sizes come from the archive's directory, so check them before inflating anything
+    if sum(m.file_size for m in members) > max_bytes:
+        raise ValueError(f'Archive too large when extracted (limit {max_bytes // (1024 * 1024)} MB)')
+    return [(m.filename, archive.read(m)) for m in members]
+
+
+class DetectionJob:
+    def __init__(self, kind, total=0, name=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.name = name
+        self.status = 'queued'
+        self.total = total
+        self.processed = 0
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancelled = False
+        self.items = None  # image job: (name, bytes) tuples
+        self.output = None  # image job: NDJSON lines for the streaming response
+        self.video_path = None
+        self.results_path = None
+        self.sample_fps = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'name': self.name,
+            'status': self.status,
+            'processed': self.processed,
+            'total': self.total,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class BatchJobQueue:
+    def __init__(self, get_detectors, jobs_dir, batch_size=8, max_queued=4, history=20,
+                 concurrency=1, socketio=None):
+        """Initialize the queue and start its worker
+
+        Args:
+            get_detectors (callable): Returns the current name -> ObjectDetector mapping
+            jobs_dir (str): Directory for uploaded videos and job results
+            batch_size (int): Frames per forward pass
+            max_queued (int): Jobs allowed to wait; further submissions are refused
+            history (int): Finished jobs kept (with their results) for status queries
+            concurrency (int): Batch forward passes allowed at once
+            socketio: Object with emit() used for 'job_progress' events
+        """
+        self.get_detectors = get_detectors
+        self.jobs_dir = jobs_dir
+        os.makedirs(jobs_dir, exist_ok=True)
+        self.batch_size = batch_size
+        self.history = history
+        self.socketio = socketio
+        self.executor = BlockingExecutor(max_workers=concurrency)
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._predictors = weakref.WeakKeyDictionary()  # YOLO model -> LeanPredictor
+        self._worker = threading.Thread(target=self._worker_loop, name="batch-jobs", daemon=True)
+        self._worker.start()
+
+    def _submit(self, job):
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise
+        return job
+
+    def submit_images(self, items):
+        """Queue an image job; its output queue yields NDJSON lines, then None
+
+        Raises:
+            queue.Full: If too many jobs are waiting
+        """
+        job = DetectionJob('images', total=len(items))
+        job.items = items
+        job.output = queue.Queue()
+        return self._submit(job)
+
+    def submit_video(self, stream, filename, sample_fps=5.0, max_bytes=None):
+        """Save an uploaded video and queue a job for it
+
+        Args:
+            stream: File-like object with the upload
+            filename (str): Original file name (for the extension and status)
+            sample_fps (float): Frames per second of video to run detection on (0 = every frame)
+            max_bytes (int, optional): Largest upload accepted
+
+        Raises:
+            queue.Full: If too many jobs are waiting
+            ValueError: If sample_fps is negative or not finite
+            UploadTooLarge: If the upload is larger than max_bytes (nothing is kept)
+        """
+        sample_fps = float(sample_fps)
+        if not math.isfinite(sample_fps) or sample_fps < 0:
+            raise ValueError("sample_fps must be a finite number of at least 0")
+        if self._queue.full():
+            raise queue.Full
+        job = DetectionJob('video', name=filename)
+        job.sample_fps = sample_fps
+        job_dir = os.path.join(self.jobs_dir, job.id)
+        os.makedirs(job_dir, exist_ok=True)
+        extension = ''.join(c for c in os.path.splitext(filename or '')[1].lower() if c.isalnum())[:8]
+        job.video_path = os.path.join(job_dir, f"input.{extension or 'mp4'}")
+        job.results_path = os.path.join(job_dir, 'results.ndjson')
+        try:
+            with open(job.video_path, 'wb') as f:
+                copied = 0
+                for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+                    copied += len(chunk)
+                    if max_bytes is not None and copied > max_bytes:
+                        raise UploadTooLarge(max_bytes)
+                    f.write(chunk)
+        except BaseException:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+        try:
+            return self._submit(job)
+        except queue.Full:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def stream(self, job):
+        """Yield a streaming image job's NDJSON lines; stops the job if the client goes away"""
+        try:
+            while True:
+                line = job.output.get()
+                if line is None:
+                    return
+                yield line
+        finally:
+            job.cancelled = True
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            job.status = 'running'
+            job.started = time.time()
+            try:
+                if job.kind == 'images':
+                    self._run_images(job)
+                else:
+                    self._run_video(job)
+                job.status = 'cancelled' if job.cancelled else 'done'
+            except Exception as e:
+                logger.exception(f"Batch job {job.id} failed: {e}")
+                job.status = 'failed'
+                job.error = str(e)
+            finally:
+                job.finished = time.time()
+                job.items = None
+                if job.output is not None:
+                    job.output.put(None)
+                if job.video_path and os.path.exists(job.video_path):
+                    os.remove(job.video_path)
+                self._progress(job)
+                self._prune()
+
+    def _progress(self, job):
+        if self.socketio is not None and job.kind == 'video':
+            self.socketio.emit('job_progress', job.to_dict())
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond the history limit"""
+        with self._lock:
+            finished = sorted((j for j in self._jobs.values() if j.finished), key=lambda j: j.finished)
+            for job in finished[:max(0, len(finished) - self.history)]:
+                del self._jobs[job.id]
+                shutil.rmtree(os.path.join(self.jobs_dir, job.id), ignore_errors=True)
+
+    def _run_images(self, job):
+        items = job.items
+        for start in range(0, len(items), self.batch_size):
+            if job.cancelled:
+                return
+            chunk = items[start:start + self.batch_size]
+            decoded = self.executor.run(self._decode_all, chunk)
+            valid = [i for i, (frame, _) in enumerate(decoded) if frame is not None]
+            results = self._detect([decoded[i][0] for i in valid], [decoded[i][1] for i in valid])
+            by_index = dict(zip(valid, results))
+            for offset, (name, _) in enumerate(chunk):
+                line = {'index': start + offset, 'name': name}
+                if offset in by_index:
+                    line['detections'] = by_index[offset]
+                else:
+                    line['error'] = 'Invalid image data'
+                job.output.put(json.dumps(line) + '\n')
+            job.processed += len(chunk)
+
+    @staticmethod
+    def _decode_all(chunk):
+        return [decode_frame(data) for _, data in chunk]
+
+    def _run_video(self, job):
+        capture = cv2.VideoCapture(job.video_path)
+        if not capture.isOpened():
+            raise ValueError('Could not open video')
+        try:
+            fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+            frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            step = max(1, int(round(fps / job.sample_fps))) if job.sample_fps else 1
+            job.total = (frame_count + step - 1) // step if frame_count else 0
+            position = 0
+            with open(job.results_path, 'w') as out:
+                while not job.cancelled:
+                    frames, position = self.executor.run(self._read_frames, capture, position, step)
+                    if not frames:
+                        break
+                    results = self._detect([frame for _, frame in frames], [1] * len(frames))
+                    for (index, _), detections in zip(frames, results):
+                        out.write(json.dumps({'frame': index, 'time': round(index / fps, 3),
+                                              'detections': detections}) + '\n')
+                    job.processed += len(frames)
+                    self._progress(job)
+        finally:
+            capture.release()
+
+    def _read_frames(self, capture, position, step):
+        """Read the next batch of sampled frames; skipped frames are grabbed, not decoded"""
+        frames = []
+        while len(frames) < self.batch_size:
+            if position % step == 0:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                frames.append((position, frame))
+            elif not capture.grab():
+                break
+            position += 1
+        return frames, position
+
+    def _detect(self, frames, scales):
+        """Run every loaded model on a batch of frames
+
+        Returns:
+            list: Per frame, a list of detection dicts as returned by /detect_frame
+        """
+        results = [[] for _ in frames]
+        if not frames:
+            return results
+        for model_name, detector in self.get_detectors().items():
+            if not (detector and detector.model_loaded):
+                continue
+            if supports_lean(detector.model):
+                detections = self.executor.run(self._infer_batch, detector, frames)
+            else:
+                # The fallback runs the live Ultralytics predictor, which /detect_frame also uses
+                with detector.inference_lock():
+                    detections = self.executor.run(self._infer_batch, detector, frames)
+            names = detector.model.names
+            for per_frame, rows, scale in zip(results, detections, scales):
+                for x1, y1, x2, y2, confidence, class_id in rows.tolist():
+                    x1, y1, x2, y2 = (int(v * scale) for v in (x1, y1, x2, y2))
+                    per_frame.append({
+                        'label': names[int(class_id)],
+                        'confidence': float(confidence),
+                        'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
+                        'width': x2 - x1, 'height': y2 - y1,
+                        'model': model_name,
+                    })
+        return results
+
+    def _predictor_for(self, detector):
+        model = detector.model
+        predictor = self._predictors.get(model)
+        if predictor is None and supports_lean(model):
+            channels_last = cpu_plan.models.get(detector.name, {}).get('channels_last', False)
+            predictor = self._predictors[model] = LeanPredictor(model, channels_last=channels_last)
+        return predictor
+
+    def _infer_batch(self, detector, frames):
+        """One batched forward pass; runs on an executor thread"""
+        with cpu_plan.inference_context():
+            predictor = self._predictor_for(detector)
+            if predictor is not None:
+                return predictor.predict_batch(frames)
+            return [standard_detections([r]) for r in detector.model(frames, verbose=False)]
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            'queued': self._queue.qsize(),
+            'running': sum(1 for j in jobs if j.status == 'running'),
+            'finished': sum(1 for j in jobs if j.finished),
+            'executor': self.executor.stats(),
+        }
@@ -0,0 +1,310 @@
+"""
+Clip Recorder Module for Pinaka-AI
+
+This module keeps the last few seconds of every camera's uploaded frames in
+memory and, when an alert fires, writes a clip covering the seconds before
+and after it to disk.
+
+Frames and clips are keyed by the fair scheduler's client string (remote
+address and camera id), never by the client-supplied camera id alone, so one
+uploader can't write into another's clips. The camera id only names the file.
+
+- Frames are stored as the JPEG bytes the camera uploaded; nothing is decoded
+  or re-encoded.
+- Each client gets a ring of fixed-size slots, carved out of one buffer that
+  is allocated when the recorder starts. Memory stays flat however long the
+  server runs. Frames larger than a slot are skipped, and frames arriving
+  faster than the clip frame rate are thinned.
+- Clips are written by a background thread once the post-alert window has
+  passed. The file I/O runs on an executor thread (app/utils/executor.py)
+  instead of the event loop. Clips are Motion-JPEG AVI files (the uploaded
+  JPEGs muxed as-is), and a 'clip_ready' Socket.IO event announces them.
+  Alerts from the same client that fall inside a pending clip share that clip.
+"""
+
+import os
+import re
+import time
+import struct
+import logging
+import threading
+from array import array
+
+from app.utils.frame_decode import jpeg_dimensions
+from app.utils.executor import BlockingExecutor
+
+logger = logging.getLogger(__name__)
+
+CLIP_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,128}$')
+
+
+class FrameRing:
+    """Fixed number of fixed-size slots holding the most recent encoded frames"""
+
+    def __init__(self, buffer, slots, slot_bytes):
+        """Initialize the ring
+
+        Args:
+            buffer (memoryview): Preallocated storage of slots * slot_bytes bytes
+            slots (int): Number of frames kept
+            slot_bytes (int): Largest frame that fits in a slot
+        """
+        self.buffer = buffer
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.timestamps = array('d', [0.0] * slots)
+        self.lengths = array('I', [0] * slots)
+        self.next = 0
+        self.client = None
+        self.last_push = 0.0
+        self.lock = threading.Lock()
+
+    def reset(self, client):
+        with self.lock:
+            self.client = client
+            self.next = 0
+            self.last_push = 0.0
+            for i in range(self.slots):
+                self.lengths[i] = 0
+
+    def push(self, jpeg, timestamp):
+        """Store a frame, overwriting the oldest; False if it doesn't fit a slot"""
+        size = len(jpeg)
+        if size > self.slot_bytes:
+            return False
+        with self.lock:
+            offset = self.next * self.slot_bytes
+            self.buffer[offset:offset + size] = jpeg
+            self.lengths[self.next] = size
+            self.timestamps[self.next] = timestamp
+            self.next = (self.next + 1) % self.slots
+            self.last_push = timestamp
+        return True
+
+    def frames_between(self, start, end):
+        """Copies of the stored frames with start <= timestamp <= end, oldest first"""
+        frames = []
+        with self.lock:
+            for i in range(self.slots):
+                slot = (self.next + i) % self.slots
+                size = self.lengths[slot]
+                if size and start <= self.timestamps[slot] <= end:
+                    offset = slot * self.slot_bytes
+                    frames.append((self.timestamps[slot], bytes(self.buffer[offset:offset + size])))
+        return frames
+
+
+def write_mjpeg_avi(path, frames, fps):
+    """Mux JPEG frames into a Motion-JPEG AVI file without re-encoding them
+
+    Args:
+        path (str): Output file
+        frames (list): JPEG bytes, in order
+        fps (float): Playback frame rate
+    """
+    width, height = jpeg_dimensions(frames[0]) or (0, 0)
+    largest = max(len(f) for f in frames)
+    rate = max(1, int(round(fps)))
+
+    def chunk(fourcc, data):
+        return fourcc + struct.pack('<I', len(data)) + data + (b'\0' if len(data) % 2 else b'')
+
+    def listing(kind, data):
+        return b'LIST' + struct.pack('<I', len(data) + 4) + kind + data
+
+    avih = struct.pack('<14I', 1000000 // rate, largest * rate, 0, 0x10, len(frames), 0, 1, largest,
+                       width, height, 0, 0, 0, 0)
+    strh = b'vidsMJPG' + struct.pack('<IHH6IiI4h', 0, 0, 0, 0, 1, rate, 0, len(frames), largest, -1, 0,
+                                     0, 0, width, height)
+    strf = struct.pack('<IiiHH4sIiiII', 40, width, height, 1, 24, b'MJPG', width * height * 3, 0, 0, 0, 0)
+    header = listing(b'hdrl', chunk(b'avih', avih) + listing(b'strl', chunk(b'strh', strh) + chunk(b'strf', strf)))
+
+    movi = []
+    index = []
+    offset = 4  # idx1 offsets are relative to the 'movi' fourcc
+    for frame in frames:
+        data = chunk(b'00dc', frame)
+        index.append(b'00dc' + struct.pack('<III', 0x10, offset, len(frame)))
+        movi.append(data)
+        offset += len(data)
+    body = header + listing(b'movi', b''.join(movi)) + chunk(b'idx1', b''.join(index))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<I', len(body) + 4) + b'AVI ' + body)
+    os.replace(tmp_path, path)
+
+
+class ClipRecorder:
+    def __init__(self, clip_dir, pre_seconds=5.0, post_seconds=5.0, fps=5.0, slot_kb=128,
+                 max_cameras=8, socketio=None):
+        """Allocate the frame rings and start the clip writer
+
+        Args:
+            clip_dir (str): Directory the clips are written to
+            pre_seconds (float): Seconds of video kept before an alert
+            post_seconds (float): Seconds of video recorded after an alert
+            fps (float): Frames kept per second per camera; faster uploads are thinned
+            slot_kb (int): Largest JPEG frame stored, in KiB
+            max_cameras (int): Cameras (clients) recorded at once; the least recently
+                               seen one gives up its ring to a new one
+            socketio: Object with emit() used for 'clip_ready' events
+        """
+        self.clip_dir = clip_dir
+        os.makedirs(clip_dir, exist_ok=True)
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.fps = fps
+        self.min_gap = 1.0 / fps
+        self.socketio = socketio
+
+        slots = max(1, int((pre_seconds + post_seconds) * fps) + 1)
+        slot_bytes = slot_kb * 1024
+        self._storage = bytearray(max_cameras * slots * slot_bytes)
+        view = memoryview(self._storage)
+        size = slots * slot_bytes
+        self._rings = [FrameRing(view[i * size:(i + 1) * size], slots, slot_bytes) for i in range(max_cameras)]
+        self._by_client = {}
+        self._lock = threading.Lock()
+        self._pending = {}  # client -> clip awaiting its post-alert window
+        self._writing = set()  # clients whose clip is being written
+        self._wakeup = threading.Condition(self._lock)
+        self._executor = BlockingExecutor(max_workers=1)
+        self.frames_stored = 0
+        self.frames_skipped = 0
+        self.clips_written = 0
+        self.write_errors = 0
+
+        self._writer = threading.Thread(target=self._writer_loop, name="clip-writer", daemon=True)
+        self._writer.start()
+        logger.info(f"Clip recorder ready: {pre_seconds}s before / {post_seconds}s after alerts at {fps} fps, "
+                    f"{len(self._storage) // (1024 * 1024)} MB for {max_cameras} cameras")
+
+    def _ring_for(self, client):
+        ring = self._by_client.get(client)
+        if ring is not None:
+            return ring
+        with self._lock:
+            ring = self._by_client.get(client)
+            if ring is None:
+                free = [r for r in self._rings if r.client is None]
+                ring = free[0] if free else min(self._rings, key=lambda r: r.last_push)
+                if ring.client is not None:
+                    if ring.client in self._pending or ring.client in self._writing:
+                        # Still recording a clip for that client; don't take its frames
+                        return None
+                    del self._by_client[ring.client]
+                ring.reset(client)
+                self._by_client[client] = ring
+        return ring
+
+    def add_frame(self, client, jpeg, timestamp=None):
+        """Keep an uploaded frame for later clips
+
+        Args:
+            client (str): Fair scheduler client (address and camera id) that uploaded the frame
+            jpeg (bytes): The uploaded JPEG
+            timestamp (float, optional): Capture time; defaults to now
+        """
+        timestamp = timestamp or time.time()
+        ring = self._ring_for(client)
+        if ring is None or timestamp - ring.last_push < self.min_gap:
+            self.frames_skipped += 1
+            return
+        if ring.push(jpeg, timestamp):
+            self.frames_stored += 1
+        else:
+            self.frames_skipped += 1
+
+    def trigger(self, client, camera_id, timestamp, label=None):
+        """Schedule a clip around an alert
+
+        Args:
+            client (str): Fair scheduler client whose frames make up the clip
+            camera_id (str): Camera id used in the clip's file name
+            timestamp (float): Time of the alert
+            label (str, optional): Object that raised the alert
+
+        Returns:
+            str: Id of the clip the alert belongs to (the file exists once 'clip_ready' is emitted)
+        """
+        with self._lock:
+            clip = self._pending.get(client)
+            if clip is None:
+                safe_camera = "".join(c if c.isalnum() or c in "-_" else "_" for c in camera_id)[:64]
+                clip = {
+                    'clip_id': f"{int(timestamp * 1000)}_{safe_camera}",
+                    'client': client,
+                    'camera_id': camera_id,
+                    'start': timestamp - self.pre_seconds,
+                    'end': timestamp + self.post_seconds,
+                    'alerts': [],
+                }
+                self._pending[client] = clip
+            else:
+                # Extend the pending clip, but never past what the ring can hold
+                clip['end'] = min(max(clip['end'], timestamp + self.post_seconds),
+                                  clip['start'] + self.pre_seconds + self.post_seconds)
+            clip['alerts'].append({'object': label, 'timestamp': timestamp})
+            self._wakeup.notify()
+            return clip['clip_id']
+
+    def _writer_loop(self):
+        while True:
+            with self._lock:
+                now = time.time()
+                due = [c for c in self._pending.values() if c['end'] <= now]
+                for clip in due:
+                    del self._pending[clip['client']]
+                    self._writing.add(clip['client'])
+                if not due:
+                    next_end = min((c['end'] for c in self._pending.values()), default=None)
+                    self._wakeup.wait(None if next_end is None else max(0.05, next_end - now))
+                    continue
+            for clip in due:
+                try:
+                    self._write_clip(clip)
+                except Exception as e:
+                    self.write_errors += 1
+                    logger.error(f"Error writing clip {clip['clip_id']}: {e}")
+                finally:
+                    with self._lock:
+                        self._writing.discard(clip['client'])
+
+    def _write_clip(self, clip):
+        ring = self._by_client.get(clip['client'])
+        frames = ring.frames_between(clip['start'], clip['end']) if ring else []
+        if not frames:
+            logger.warning(f"No frames recorded for clip {clip['clip_id']}")
+            return
+        duration = frames[-1][0] - frames[0][0]
+        fps = (len(frames) - 1) / duration if duration > 0 else self.fps
+        # Only the muxing and file write leave the event loop; ring locks and emit stay here
+        self._executor.run(write_mjpeg_avi, self.path_for(clip['clip_id']), [jpeg for _, jpeg in frames], fps)
+        self.clips_written += 1
+        if self.socketio is not None:
+            self.socketio.emit('clip_ready', {
+                'clip_id': clip['clip_id'],
+                'camera_id': clip['camera_id'],
+                'start': frames[0][0],
+                'end': frames[-1][0],
+                'frames': len(frames),
+                'alerts': clip['alerts'],
+            })
+
+    def path_for(self, clip_id):
+        """Absolute path of a clip (None for a malformed id)"""
+        if not CLIP_ID_PATTERN.match(clip_id or ''):
+            return None
+        return os.path.join(self.clip_dir, f"{clip_id}.avi")
+
+    def stats(self):
+        return {
+            'cameras': len(self._by_client),
+            'pending_clips': len(self._pending),
+            'clips_written': self.clips_written,
+            'frames_stored': self.frames_stored,
+            'frames_skipped': self.frames_skipped,
+            'write_errors': self.write_errors,
+            'buffer_mb': round(len(self._storage) / (1024 * 1024), 1),
+        }
@@ -1,8 +1,7 @@
 from app.utils.settings_storage import SettingsStorage
+from app.utils.model_cadence import DEFAULT_CADENCE
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class Config:
@@ -25,7 +24,10 @@ class Config:
             # SMS notification settings
             "sms_enabled": False,  # Whether SMS notifications are enabled
             "sms_cooldown": 60,  # Seconds between SMS notifications (longer than regular notifications)
-            "sms_objects": ["person", "car", "stone", "gas_cylinder"]  # Objects that trigger SMS
+            "sms_objects": ["person", "car", "stone", "gas_cylinder"],  # Objects that trigger SMS
+            
+            # How often each model runs; results are reused in between
+            "model_cadence": DEFAULT_CADENCE
         }
         
         # Load saved settings or use defaults
@@ -48,6 +50,11 @@ class Config:
         self.sms_cooldown = saved_settings.get("sms_cooldown", self.default_config["sms_cooldown"])
         self.sms_objects = saved_settings.get("sms_objects", self.default_config["sms_objects"])
         
+        # Model cadence, filled in per model from the defaults
+        saved_cadence = saved_settings.get("model_cadence") or {}
+        self.model_cadence = {name: {**defaults, **saved_cadence.get(name, {})}
+                              for name, defaults in self.default_config["model_cadence"].items()}
+        
         logger.info(f"Loaded settings: SMS enabled = {self.sms_enabled}")
     
     def save_settings(self):
@@ -60,7 +67,9 @@ class Config:
             # SMS settings
             "sms_enabled": self.sms_enabled,
             "sms_cooldown": self.sms_cooldown,
-            "sms_objects": self.sms_objects
+            "sms_objects": self.sms_objects,
+            
+            "model_cadence": self.model_cadence
         }
         
         success = self.settings_storage.save_settings(settings_dict)
@@ -0,0 +1,174 @@
+"""
+CPU Execution Plan Module for Pinaka-AI
+
+This module decides how torch should use the CPU in a serving process and
+applies that plan to every loaded model:
+
+- intra-op threads are sized from the usable cores (CPU affinity and the
+  cgroup quota) divided by the web workers and the concurrent forward
+  passes per worker, so the processes don't oversubscribe the cores,
+- inter-op threads are set to 1 (the models run single-branch graphs),
+- Conv+BatchNorm layers are fused and weights use channels_last,
+- forward passes run under torch.inference_mode,
+- optionally the model is compiled at load with torch.compile, or replaced
+  by a TorchScript export.
+
+Every setting can be overridden with environment variables (see README).
+"""
+
+import os
+import time
+import logging
+from contextlib import nullcontext
+
+from app.utils.executor import os_module
+
+logger = logging.getLogger(__name__)
+
+COMPILE_MODES = ('none', 'torchscript', 'compile')
+
+
+def _env_flag(name, default):
+    return os.environ.get(name, '1' if default else '0').lower() in ('1', 'true', 'yes')
+
+
+def usable_cores():
+    """Cores this process may use: CPU affinity, capped by the cgroup CPU quota"""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cores = min(cores, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cores
+
+
+class CPUExecutionPlan:
+    def __init__(self, workers=None, concurrency=None):
+        """Compute the plan from the environment
+
+        Args:
+            workers (int, optional): Serving processes on this host (default WEB_CONCURRENCY or 1)
+            concurrency (int, optional): Concurrent forward passes per process
+                (default INFERENCE_CONCURRENCY or 2, matching app/utils/executor.py)
+        """
+        self.cores = usable_cores()
+        self.workers = workers or int(os.environ.get('WEB_CONCURRENCY', 1))
+        self.concurrency = concurrency or int(os.environ.get('INFERENCE_CONCURRENCY', 2))
+        planned = max(1, self.cores // max(1, self.workers * self.concurrency))
+        self.intra_op_threads = int(os.environ.get('TORCH_NUM_THREADS', planned))
+        self.inter_op_threads = int(os.environ.get('TORCH_INTEROP_THREADS', 1))
+        self.fuse = _env_flag('TORCH_FUSE', True)
+        self.channels_last = _env_flag('TORCH_CHANNELS_LAST', True)
+        self.inference_mode = _env_flag('TORCH_INFERENCE_MODE', True)
+        self.compile = os.environ.get('TORCH_COMPILE', 'none').lower()
+        if self.compile not in COMPILE_MODES:
+            logger.warning(f"Unknown TORCH_COMPILE={self.compile}; using 'none'")
+            self.compile = 'none'
+        self.applied = False
+        self.apply_errors = []
+        self.models = {}
+        # A real lock: models are loaded on executor threads, and it is never held across a yield
+        self._lock = os_module('threading').Lock()
+
+    def apply_threads(self):
+        """Set torch's thread pools once per process, before the first forward pass"""
+        with self._lock:
+            if self.applied:
+                return
+            import torch
+            torch.set_num_threads(self.intra_op_threads)
+            try:
+                torch.set_num_interop_threads(self.inter_op_threads)
+            except RuntimeError as e:
+                # Only allowed before any inter-op work has started
+                self.apply_errors.append(f"interop threads: {e}")
+            self.applied = True
+            logger.info(f"Torch CPU plan: {self.intra_op_threads} intra-op / {self.inter_op_threads} "
+                        f"inter-op threads for {self.cores} cores, {self.workers} worker(s), "
+                        f"{self.concurrency} concurrent forward pass(es)")
+
+    def weights_for(self, model_path, imgsz=640):
+        """Path to load: a cached TorchScript export when TORCH_COMPILE=torchscript"""
+        if self.compile != 'torchscript' or not model_path.endswith('.pt'):
+            return model_path
+        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        stem = os.path.splitext(os.path.basename(model_path))[0]
+        target = os.path.join(base_dir, 'models', 'exports', f"{stem}_torchscript_{imgsz}.torchscript")
+        if os.path.exists(target):
+            return target
+        try:
+            from ultralytics import YOLO
+            exported = YOLO(model_path).export(format='torchscript', imgsz=imgsz, verbose=False)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(exported, target)
+            return target
+        except Exception as e:
+            logger.error(f"TorchScript export of {model_path} failed, using eager model: {e}")
+            return model_path
+
+    def optimize(self, yolo, name):
+        """Apply the load-time optimizations to a loaded Ultralytics YOLO model"""
+        self.apply_threads()
+        report = {'fused': False, 'channels_last': False, 'compiled': None, 'errors': []}
+        start = time.perf_counter()
+        module = getattr(yolo, 'model', None)
+        import torch
+        if isinstance(module, torch.nn.Module):
+            module.eval()
+            if self.fuse and hasattr(module, 'fuse'):
+                try:
+                    module.fuse(verbose=False)
+                    report['fused'] = True
+                except Exception as e:
+                    report['errors'].append(f"fuse: {e}")
+            if self.channels_last:
+                try:
+                    module.to(memory_format=torch.channels_last)
+                    report['channels_last'] = True
+                except Exception as e:
+                    report['errors'].append(f"channels_last: {e}")
+            if self.compile == 'compile':
+                try:
+                    module.forward = torch.compile(module.forward, dynamic=False)
+                    report['compiled'] = 'torch.compile'
+                except Exception as e:
+                    report['errors'].append(f"compile: {e}")
+        elif self.compile == 'torchscript':
+            report['compiled'] = 'torchscript'
+        report['optimize_seconds'] = round(time.perf_counter() - start, 3)
+        self.models[name] = report
+        return yolo
+
+    def inference_context(self):
+        """Context for one forward pass; enter it on the thread that runs the model"""
+        if not self.inference_mode:
+            return nullcontext()
+        import torch
+        return torch.inference_mode()
+
+    def report(self):
+        return {
+            'cores': self.cores,
+            'workers': self.workers,
+            'concurrency': self.concurrency,
+            'intra_op_threads': self.intra_op_threads,
+            'inter_op_threads': self.inter_op_threads,
+            'fuse': self.fuse,
+            'channels_last': self.channels_last,
+            'inference_mode': self.inference_mode,
+            'compile': self.compile,
+            'applied': self.applied,
+            'errors': self.apply_errors,
+            'models': dict(self.models),
+        }
+
+
+# Shared plan for this process
+cpu_plan = CPUExecutionPlan()
@@ -0,0 +1,341 @@
+"""
+Event Store Module for Pinaka-AI
+
+This module persists detections and alerts in an append-only SQLite
+database so that detection history survives restarts and can be queried.
+Writes are queued and flushed in batches by a background writer thread,
+so recording an event never blocks the request that produced it.
+
+Under the eventlet worker that writer thread is a greenlet, so the SQLite
+writes, thumbnail files and retention deletes it does run on an executor
+thread (app/utils/executor.py) instead of the event loop. Queries still run
+in the request; they are index range scans.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from pathlib import Path
+
+from app.utils.executor import BlockingExecutor
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    camera_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    label TEXT NOT NULL,
+    confidence REAL,
+    model TEXT,
+    x1 INTEGER,
+    y1 INTEGER,
+    x2 INTEGER,
+    y2 INTEGER,
+    thumbnail TEXT,
+    clip TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS idx_events_camera_ts ON events (camera_id, ts);
+CREATE INDEX IF NOT EXISTS idx_events_label_ts ON events (label, ts);
+CREATE INDEX IF NOT EXISTS idx_events_kind_ts ON events (kind, ts);
+"""
+
+EVENT_COLUMNS = ("id", "ts", "camera_id", "kind", "label", "confidence",
+                 "model", "x1", "y1", "x2", "y2", "thumbnail", "clip")
+
+
+class EventStore:
+    def __init__(self, storage_dir=None, retention_days=30, batch_size=500,
+                 flush_interval=1.0, max_queue=20000):
+        """Initialize the event store and start the background writer
+
+        Args:
+            storage_dir (str, optional): Directory for the database and thumbnails.
+                                       If None, uses the app 'data' directory.
+            retention_days (float): Events older than this are deleted.
+            batch_size (int): Maximum number of rows written per transaction.
+            flush_interval (float): Seconds to wait for a batch to fill up.
+            max_queue (int): Pending writes above this limit are dropped.
+        """
+        if storage_dir is None:
+            base_dir = Path(os.path.dirname(os.path.abspath(__file__)))
+            storage_dir = os.path.join(base_dir.parent.parent, 'data')
+
+        self.storage_dir = storage_dir
+        self.db_path = os.path.join(storage_dir, 'events.db')
+        self.thumbnail_dir = os.path.join(storage_dir, 'thumbnails')
+        self.clip_dir = os.path.join(storage_dir, 'clips')
+        os.makedirs(self.thumbnail_dir, exist_ok=True)
+
+        self.retention_seconds = retention_days * 24 * 3600
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_check_interval = 3600
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._local = threading.local()
+        self._stop = threading.Event()
+        # One writer at a time, off the event loop under eventlet
+        self._executor = BlockingExecutor(max_workers=1)
+        self.dropped_events = 0
+        self.written_events = 0
+
+        # Create the schema up front so queries work before the first flush
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        # Databases created before alert clips were recorded lack the column
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(events)")}
+        if 'clip' not in columns:
+            conn.execute("ALTER TABLE events ADD COLUMN clip TEXT")
+        conn.commit()
+
+        self._writer = threading.Thread(target=self._writer_loop, name="event-store-writer", daemon=True)
+        self._writer.start()
+        logger.info(f"Event store ready at {self.db_path} (retention {retention_days} days)")
+
+    def _connect(self):
+        """Return a connection for the calling thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _enqueue(self, item):
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped_events += 1
+            return False
+
+    def record_detections(self, camera_id, detections, timestamp=None):
+        """Queue a frame's detections for storage
+
+        Args:
+            camera_id (str): Camera that produced the frame
+            detections (list): Detection dicts as returned by /detect_frame
+            timestamp (float, optional): Frame time, defaults to now
+
+        Returns:
+            bool: False if the write queue was full and the events were dropped
+        """
+        if not detections:
+            return True
+        ts = timestamp or time.time()
+        rows = [
+            (ts, camera_id, 'detection', det['label'], det.get('confidence'), det.get('model'),
+             det.get('x1'), det.get('y1'), det.get('x2'), det.get('y2'), None, None)
+            for det in detections
+        ]
+        return self._enqueue(('rows', rows))
+
+    def record_alert(self, camera_id, alert, model=None):
+        """Queue an alert, with its JPEG snapshot, for storage
+
+        Args:
+            camera_id (str): Camera that produced the alert
+            alert (dict): Alert payload from FrameResult.alerts, with
+                          'clip' set to the id of its recorded clip (if any)
+            model (str, optional): Name of the model that raised the alert
+
+        Returns:
+            bool: False if the write queue was full and the alert was dropped
+        """
+        coords = alert.get('coordinates') or {}
+        row = (alert['timestamp'], camera_id, 'alert', alert['object'], alert.get('confidence'), model,
+               coords.get('x1'), coords.get('y1'), coords.get('x2'), coords.get('y2'), None, alert.get('clip'))
+        return self._enqueue(('alert', row, alert.get('jpeg')))
+
+    def _writer_loop(self):
+        """Drain the queue in batches until the store is closed"""
+        last_retention_check = 0
+
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            if batch:
+                try:
+                    self._executor.run(self._flush, batch)
+                except Exception as e:
+                    logger.error(f"Error writing events: {str(e)}")
+
+            now = time.time()
+            if now - last_retention_check >= self.retention_check_interval:
+                last_retention_check = now
+                try:
+                    self._executor.run(self.enforce_retention, now)
+                except Exception as e:
+                    logger.error(f"Error enforcing event retention: {str(e)}")
+
+    def _flush(self, batch):
+        """Write one batch with the calling thread's connection (runs on the executor)"""
+        conn = self._connect()
+        try:
+            self._write_batch(conn, batch)
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _write_batch(self, conn, batch):
+        rows = []
+        for item in batch:
+            if item[0] == 'rows':
+                rows.extend(item[1])
+            else:
+                _, row, jpeg = item
+                rows.append(row[:-2] + (self._save_thumbnail(row, jpeg), row[-1]))
+
+        with conn:
+            conn.executemany(
+                "INSERT INTO events (ts, camera_id, kind, label, confidence, model, x1, y1, x2, y2, thumbnail, clip) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        self.written_events += len(rows)
+
+    def _save_thumbnail(self, row, jpeg):
+        """Write an alert snapshot to disk and return its path relative to the thumbnail dir"""
+        if not jpeg:
+            return None
+        ts, camera_id, label = row[0], row[1], row[3]
+        day = time.strftime("%Y%m%d", time.localtime(ts))
+        safe_camera = "".join(c if c.isalnum() or c in "-_" else "_" for c in camera_id)
+        safe_label = "".join(c if c.isalnum() or c in "-_" else "_" for c in label)
+        relative_path = os.path.join(day, f"{int(ts * 1000)}_{safe_camera}_{safe_label}.jpg")
+        full_path = os.path.join(self.thumbnail_dir, relative_path)
+        try:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'wb') as f:
+                f.write(jpeg)
+            return relative_path
+        except Exception as e:
+            logger.error(f"Error saving thumbnail: {str(e)}")
+            return None
+
+    def enforce_retention(self, now=None, chunk_size=5000):
+        """Delete events (and their thumbnails and clips) older than the retention period
+
+        Returns:
+            int: Number of events deleted
+        """
+        cutoff = (now or time.time()) - self.retention_seconds
+        conn = self._connect()
+        deleted = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, thumbnail, clip FROM events WHERE ts < ? ORDER BY ts LIMIT ?",
+                (cutoff, chunk_size)
+            ).fetchall()
+            if not rows:
+                break
+            for _, thumbnail, clip in rows:
+                files = []
+                if thumbnail:
+                    files.append(os.path.join(self.thumbnail_dir, thumbnail))
+                if clip:
+                    # Several alerts can share a clip; the first one deleted removes it
+                    files.append(os.path.join(self.clip_dir, f"{clip}.avi"))
+                for path in files:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            with conn:
+                conn.executemany("DELETE FROM events WHERE id = ?", [(row[0],) for row in rows])
+            deleted += len(rows)
+        if deleted:
+            logger.info(f"Deleted {deleted} events older than retention period")
+        return deleted
+
+    def query_events(self, camera_id=None, label=None, kind=None, start=None, end=None,
+                     cursor=None, limit=100):
+        """Return one page of events, newest first
+
+        Pagination uses a (ts, id) keyset cursor rather than OFFSET, so each
+        page is an index range scan regardless of how deep into history it is.
+
+        Args:
+            camera_id (str, optional): Only events from this camera
+            label (str, optional): Only events with this class label
+            kind (str, optional): 'detection' or 'alert'
+            start (float, optional): Only events at or after this timestamp
+            end (float, optional): Only events before this timestamp
+            cursor (str, optional): 'next_cursor' from the previous page
+            limit (int): Page size (capped at 1000)
+
+        Returns:
+            dict: {'events': [...], 'next_cursor': str or None}
+        """
+        limit = max(1, min(int(limit), 1000))
+        clauses = []
+        params = []
+        if camera_id:
+            clauses.append("camera_id = ?")
+            params.append(camera_id)
+        if label:
+            clauses.append("label = ?")
+            params.append(label)
+        if kind:
+            clauses.append("kind = ?")
+            params.append(kind)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(float(start))
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(float(end))
+        if cursor:
+            cursor_ts, cursor_id = cursor.split(':', 1)
+            clauses.append("(ts, id) < (?, ?)")
+            params.extend([float(cursor_ts), int(cursor_id)])
+
+        sql = f"SELECT {', '.join(EVENT_COLUMNS)} FROM events"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._connect().execute(sql, params).fetchall()
+        events = [dict(zip(EVENT_COLUMNS, row)) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = events[-1]
+            next_cursor = f"{last['ts']!r}:{last['id']}"
+        return {'events': events, 'next_cursor': next_cursor}
+
+    def get_thumbnail_path(self, event_id):
+        """Return the absolute thumbnail path for an event, or None"""
+        row = self._connect().execute(
+            "SELECT thumbnail FROM events WHERE id = ?", (int(event_id),)
+        ).fetchone()
+        if not row or not row[0]:
+            return None
+        return os.path.join(self.thumbnail_dir, row[0])
+
+    def stats(self):
+        """Return writer queue statistics"""
+        return {
+            'queue_depth': self._queue.qsize(),
+            'written_events': self.written_events,
+            'dropped_events': self.dropped_events,
+        }
+
+    def close(self, timeout=5.0):
+        """Flush pending events and stop the writer thread"""
+        self._stop.set()
+        self._writer.join(timeout)
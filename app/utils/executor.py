@@ -0,0 +1,123 @@
+"""
+Executor Module for Pinaka-AI
+
+This module runs CPU-bound work (model inference, image decoding and JPEG
+encoding) outside the event loop. Under the gunicorn eventlet worker the
+work goes to eventlet's tpool of real OS threads, so Socket.IO heartbeats
+and other requests keep being served during a forward pass; elsewhere it
+runs in the calling thread. Either way a semaphore bounds how many calls
+run at once, and callers beyond the limit wait their turn.
+
+Network calls that must not hold up a request (Twilio SMS) are started in
+the background with spawn(); they are I/O, so under eventlet they stay on
+green threads.
+"""
+
+import os
+import importlib
+import threading
+import logging
+
+from app.utils.metrics import QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+
+def _eventlet_patched():
+    """True when running under eventlet with the thread module monkey-patched"""
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return False
+    return patcher.is_monkey_patched('thread')
+
+
+def os_module(name):
+    """The stdlib module ('threading', 'time') as it was before eventlet patched it
+
+    For code on real OS threads (executor calls, the stack sampler), where
+    green locks and sleeps would need a hub of their own.
+    """
+    module = importlib.import_module(name)
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return module
+    if patcher.is_monkey_patched('thread' if name == 'threading' else name):
+        return patcher.original(name)
+    return module
+
+
+class BlockingExecutor:
+    def __init__(self, max_workers=2):
+        """Initialize the executor
+
+        Args:
+            max_workers (int): Maximum number of blocking calls running at once
+        """
+        self.max_workers = max_workers
+        # Created on first use so it is the green semaphore once eventlet has patched threading
+        self._semaphore = None
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+
+    def _get_semaphore(self):
+        if self._semaphore is None:
+            with self._lock:
+                if self._semaphore is None:
+                    self._semaphore = threading.BoundedSemaphore(self.max_workers)
+        return self._semaphore
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) off the event loop and return its result
+
+        Exceptions raised by fn propagate to the caller.
+        """
+        semaphore = self._get_semaphore()
+        self._count(waiting=1)
+        semaphore.acquire()
+        self._count(waiting=-1, running=1)
+        try:
+            if _eventlet_patched():
+                from eventlet import tpool
+                return tpool.execute(fn, *args, **kwargs)
+            return fn(*args, **kwargs)
+        finally:
+            self._count(running=-1, completed=1)
+            semaphore.release()
+
+    def _count(self, waiting=0, running=0, completed=0):
+        with self._lock:
+            self.waiting += waiting
+            self.running += running
+            self.completed += completed
+
+    def spawn(self, fn, *args, **kwargs):
+        """Start fn(*args, **kwargs) in the background without waiting for it"""
+        def target():
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Background task {getattr(fn, '__name__', fn)} failed: {e}")
+
+        if _eventlet_patched():
+            import eventlet
+            eventlet.spawn_n(target)
+        else:
+            threading.Thread(target=target, daemon=True).start()
+
+    def stats(self):
+        return {
+            'max_workers': self.max_workers,
+            'mode': 'tpool' if _eventlet_patched() else 'inline',
+            'waiting': self.waiting,
+            'running': self.running,
+            'completed': self.completed,
+        }
+
+
+# Shared instance used by the app and ObjectDetector
+executor = BlockingExecutor(max_workers=int(os.environ.get('INFERENCE_CONCURRENCY', 2)))
+QUEUE_DEPTH.set_function(lambda: executor.waiting, queue='executor')
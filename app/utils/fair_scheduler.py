@@ -0,0 +1,328 @@
+"""
+Fair Scheduler Module for Pinaka-AI
+
+This module decides which /detect_frame requests get to run inference and in
+what order, so one fast camera or misbehaving tab cannot starve the rest:
+
+- Each client (remote address + camera id) has a token bucket refilled at
+  FRAME_RATE_LIMIT frames per second, up to FRAME_RATE_BURST. A frame without
+  a token is refused at once with the time until the next token, before it
+  is decoded.
+- Admitted frames wait for one of the inference slots in a weighted fair
+  queue. A frame's finish tag is the later of the queue's virtual time and
+  the client's previous tag, plus 1 / weight; the smallest tag runs next. A
+  camera with weight 2 therefore gets twice the share of a weight 1 camera
+  under contention, and a client that sends a burst queues behind everyone
+  else's next frame rather than in front of it.
+- A client may have only a few frames waiting, and a frame that waits
+  longer than the maximum wait is refused; the camera sends a fresher frame
+  instead.
+- Camera ids are chosen by the client, so one address gets its own client
+  for at most max_cameras_per_address ids at a time (client()). Frames with
+  further ids share a single '<address>/*' client, so cycling ids never
+  yields fresh buckets or queue places.
+
+Camera weights come from CAMERA_PRIORITIES (e.g. "gate=4,lobby=2"); a
+camera's bucket rate and burst are scaled by its weight too. The camera id
+is supplied by the client, so a weight is only granted to a frame carrying
+that camera's token from CAMERA_TOKENS (e.g. "gate=s3cret"); any other frame
+has weight 1. Behind a reverse proxy the remote address is the proxy's, so
+callers pass the client address from X-Forwarded-For (forwarded_address).
+"""
+
+import os
+import time
+import hmac
+import heapq
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class Throttled(Exception):
+    """A frame refused by the scheduler; retry_after is in seconds"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Frame throttled ({reason}); retry after {retry_after:.2f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def forwarded_address(remote_addr, forwarded_for, trusted_hops):
+    """The client address as seen by the outermost of trusted_hops proxies
+
+    Matches werkzeug's ProxyFix(x_for=trusted_hops): the entry that many
+    places from the right of X-Forwarded-For, or remote_addr when the header
+    is missing or shorter (entries further left are client-controlled).
+    """
+    if not trusted_hops or not forwarded_for:
+        return remote_addr
+    hops = [hop.strip() for hop in forwarded_for.split(',')]
+    if len(hops) < trusted_hops:
+        return remote_addr
+    return hops[-trusted_hops] or remote_addr
+
+
+def parse_camera_tokens(value):
+    """'gate=s3cret,lobby=t0ken' -> {'gate': 's3cret', 'lobby': 't0ken'}"""
+    tokens = {}
+    for item in (value or '').split(','):
+        camera, _, token = item.partition('=')
+        if camera.strip() and token.strip():
+            tokens[camera.strip()] = token.strip()
+    return tokens
+
+
+def parse_priorities(value):
+    """'gate=4,lobby=2' -> {'gate': 4.0, 'lobby': 2.0}; malformed entries are skipped"""
+    weights = {}
+    for item in (value or '').split(','):
+        camera, _, weight = item.partition('=')
+        try:
+            if camera.strip() and float(weight) > 0:
+                weights[camera.strip()] = float(weight)
+        except ValueError:
+            logger.warning(f"Ignoring camera priority {item!r}")
+    return weights
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now):
+        """Take a token; returns 0, or the seconds until one is available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+class FairScheduler:
+    def __init__(self, slots=2, rate=10.0, burst=20.0, max_waiting_per_client=2, max_wait=2.0,
+                 weights=None, tokens=None, idle_ttl=300.0, max_cameras_per_address=8):
+        """Initialize the scheduler
+
+        Args:
+            slots (int): Frames allowed in inference at once
+            rate (float): Frames per second per client (0 disables rate limiting)
+            burst (float): Frames a client may send at once after being idle
+            max_waiting_per_client (int): Frames a client may have queued
+            max_wait (float): Seconds a frame may wait for a slot
+            weights (dict, optional): Camera id -> priority weight (default 1)
+            tokens (dict, optional): Camera id -> token a frame must carry to get its weight
+            idle_ttl (float): Seconds after which an idle client's state is dropped
+            max_cameras_per_address (int): Camera ids an address may use as separate clients
+        """
+        self.slots = slots
+        self.rate = rate
+        self.burst = burst
+        self.max_waiting_per_client = max_waiting_per_client
+        self.max_wait = max_wait
+        self.weights = dict(weights or {})
+        self.tokens = dict(tokens or {})
+        for camera_id in self.weights:
+            if camera_id not in self.tokens:
+                logger.warning(f"Camera priority for {camera_id!r} has no token in CAMERA_TOKENS; "
+                               f"its frames get weight 1")
+        self.idle_ttl = idle_ttl
+        self.max_cameras_per_address = max_cameras_per_address
+        # Created on first use so it is the green lock once eventlet has patched threading
+        self._condition = None
+        self._create_lock = threading.Lock()
+        self._buckets = {}
+        self._cameras = {}  # address -> {camera id: last seen}, oldest first
+        self._finish = {}  # client -> finish tag of its last queued frame
+        self._waiting_by_client = {}
+        self._heap = []  # [finish tag, sequence, client, state, start tag]; state: waiting/granted/abandoned
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._last_prune = time.monotonic()
+        self.running = 0
+        self.waiting = 0
+        self.throttled = {}
+
+    def _get_condition(self):
+        if self._condition is None:
+            with self._create_lock:
+                if self._condition is None:
+                    self._condition = threading.Condition(threading.Lock())
+        return self._condition
+
+    def authenticated(self, camera_id, token):
+        """True if token is the camera's token from CAMERA_TOKENS"""
+        expected = self.tokens.get(camera_id)
+        if not (expected and token):
+            return False
+        return hmac.compare_digest(str(token).encode(), expected.encode())
+
+    def weight(self, camera_id, token=None):
+        """The camera's priority weight, or 1 unless the frame carries the camera's token"""
+        if camera_id not in self.weights or not self.authenticated(camera_id, token):
+            return 1.0
+        return self.weights[camera_id]
+
+    def client(self, address, camera_id, token=None):
+        """The scheduling identity of a frame: '<address>/<camera id>'
+
+        An address has separate clients for at most max_cameras_per_address
+        recently seen camera ids; frames with any further id share
+        '<address>/*' until one of its ids has been idle for idle_ttl.
+        Authenticated cameras always have their own client.
+        """
+        now = time.monotonic()
+        with self._get_condition():
+            cameras = self._cameras.setdefault(address, {})
+            if camera_id in cameras:
+                del cameras[camera_id]  # re-inserted as the most recent
+            else:
+                for stale in [c for c, seen in cameras.items() if now - seen > self.idle_ttl]:
+                    del cameras[stale]
+                if len(cameras) >= self.max_cameras_per_address and \
+                        not self.authenticated(camera_id, token):
+                    return f"{address}/*"
+            cameras[camera_id] = now
+        return f"{address}/{camera_id}"
+
+    def admit(self, client, camera_id, token=None):
+        """Take a token from the client's bucket
+
+        Raises:
+            Throttled: If the client is over its rate
+        """
+        if not self.rate:
+            return
+        now = time.monotonic()
+        with self._get_condition():
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                weight = self.weight(camera_id, token)
+                bucket = self._buckets[client] = TokenBucket(self.rate * weight, self.burst * weight, now)
+            retry_after = bucket.take(now)
+        if retry_after:
+            self._refuse('rate_limit', retry_after)
+
+    @contextmanager
+    def slot(self, client, camera_id, token=None):
+        """Hold an inference slot, waiting in the fair queue for it
+
+        Raises:
+            Throttled: If the client has too many frames queued or the wait is too long
+        """
+        self._acquire(client, self.weight(camera_id, token))
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _acquire(self, client, weight):
+        condition = self._get_condition()
+        with condition:
+            now = time.monotonic()
+            if now - self._last_prune > self.idle_ttl:
+                self._prune(now)
+            start = max(self._virtual_time, self._finish.get(client, 0.0))
+            finish = start + 1.0 / weight
+            if self.running < self.slots and not self.waiting:
+                self.running += 1
+                self._virtual_time = start
+                self._finish[client] = finish
+                return
+            if self._waiting_by_client.get(client, 0) >= self.max_waiting_per_client:
+                # Its earlier frames are still queued; one of those is answered first
+                reason, retry_after = 'queue_full', self.max_wait / 2
+            else:
+                entry = [finish, next(self._sequence), client, 'waiting', start]
+                self._finish[client] = finish
+                heapq.heappush(self._heap, entry)
+                self.waiting += 1
+                self._waiting_by_client[client] = self._waiting_by_client.get(client, 0) + 1
+                deadline = now + self.max_wait
+                while entry[3] == 'waiting':
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    condition.wait(remaining)
+                self._waiting_by_client[client] -= 1
+                if entry[3] == 'granted':
+                    return
+                # Left in the heap for _release to skip
+                entry[3] = 'abandoned'
+                self.waiting -= 1
+                reason, retry_after = 'queue_timeout', self.max_wait / 2
+        self._refuse(reason, retry_after)
+
+    def _release(self):
+        condition = self._get_condition()
+        with condition:
+            self.running -= 1
+            granted = False
+            while self._heap and self.running < self.slots:
+                entry = heapq.heappop(self._heap)
+                if entry[3] != 'waiting':
+                    continue
+                entry[3] = 'granted'
+                self.waiting -= 1
+                self.running += 1
+                self._virtual_time = max(self._virtual_time, entry[4])
+                granted = True
+            if granted:
+                condition.notify_all()
+
+    def _refuse(self, reason, retry_after):
+        self.throttled[reason] = self.throttled.get(reason, 0) + 1
+        raise Throttled(reason, retry_after)
+
+    def _prune(self, now):
+        """Forget idle clients (called with the lock held)"""
+        self._last_prune = now
+        for client in [c for c, bucket in self._buckets.items() if now - bucket.updated > self.idle_ttl]:
+            del self._buckets[client]
+        for address, cameras in list(self._cameras.items()):
+            for camera_id in [c for c, seen in cameras.items() if now - seen > self.idle_ttl]:
+                del cameras[camera_id]
+            if not cameras:
+                del self._cameras[address]
+        # A finish tag behind the virtual time no longer affects the order
+        for client in [c for c, tag in self._finish.items() if tag <= self._virtual_time]:
+            if not self._waiting_by_client.get(client):
+                del self._finish[client]
+                self._waiting_by_client.pop(client, None)
+
+    def stats(self):
+        return {
+            'slots': self.slots,
+            'running': self.running,
+            'waiting': self.waiting,
+            'clients': len(self._buckets),
+            'addresses': len(self._cameras),
+            'max_cameras_per_address': self.max_cameras_per_address,
+            'rate': self.rate,
+            'burst': self.burst,
+            'weights': self.weights,
+            'authenticated_cameras': sorted(self.tokens),
+            'throttled': dict(self.throttled),
+        }
+
+
+# Shared instance in front of /detect_frame inference; by default one slot per inference thread
+fair_scheduler = FairScheduler(
+    slots=int(os.environ.get('FAIR_QUEUE_SLOTS', os.environ.get('INFERENCE_CONCURRENCY', 2))),
+    rate=float(os.environ.get('FRAME_RATE_LIMIT', 10)),
+    burst=float(os.environ.get('FRAME_RATE_BURST', 20)),
+    max_waiting_per_client=int(os.environ.get('FRAME_QUEUE_PER_CLIENT', 2)),
+    max_wait=float(os.environ.get('FRAME_QUEUE_MAX_WAIT', 2)),
+    weights=parse_priorities(os.environ.get('CAMERA_PRIORITIES')),
+    tokens=parse_camera_tokens(os.environ.get('CAMERA_TOKENS')),
+    max_cameras_per_address=int(os.environ.get('FRAME_CAMERAS_PER_ADDRESS', 8)),
+)
@@ -0,0 +1,174 @@
+"""
+Frame Decode Module for Pinaka-AI
+
+This module decodes uploaded frames for detection without wasting work on
+pixels the models throw away:
+
+- the JPEG header is read first, and large images are decoded with
+  IMREAD_REDUCED_COLOR_2/4/8, which makes libjpeg scale in the DCT instead of
+  decoding full resolution and resizing afterwards. The reduction keeps the
+  longer side at or above the model input size (640), so the result is the
+  same as letting the model downscale,
+- the per-model working copies of a frame are taken from a pool of
+  preallocated buffers instead of being allocated for every request.
+
+Boxes found on a reduced frame are scaled back by the returned factor.
+"""
+
+import os
+import base64
+import struct
+import logging
+import threading
+from contextlib import contextmanager
+
+from app.utils.lazy_import import lazy_module
+from app.utils.metrics import FRAMES_DECODED
+
+# Imported on first decode, off the cold-start path
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+
+logger = logging.getLogger(__name__)
+
+# Reduction factor -> OpenCV flag name; libjpeg can scale by 1/2, 1/4 and 1/8 while decoding
+REDUCED_FLAGS = {
+    1: 'IMREAD_COLOR',
+    2: 'IMREAD_REDUCED_COLOR_2',
+    4: 'IMREAD_REDUCED_COLOR_4',
+    8: 'IMREAD_REDUCED_COLOR_8',
+}
+# JPEG start-of-frame markers (SOF0-SOF15 except DHT, JPG and DAC)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_dimensions(data):
+    """Read (width, height) from a JPEG header without decoding it
+
+    Returns:
+        tuple: (width, height), or None if data is not a parseable JPEG
+    """
+    if data[:2] != b'\xff\xd8':
+        return None
+    pos = 2
+    length = len(data)
+    while pos + 4 <= length:
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Fill byte
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            # Standalone markers have no length
+            pos += 2
+            continue
+        segment_length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        if marker in SOF_MARKERS:
+            if pos + 9 > length:
+                return None
+            height, width = struct.unpack('>HH', data[pos + 5:pos + 9])
+            return width, height
+        if marker == 0xDA:
+            # Start of scan before any frame header
+            return None
+        pos += 2 + segment_length
+    return None
+
+
+def reduction_factor(width, height, target_size=640):
+    """Largest DCT reduction that keeps the longer side at or above target_size"""
+    longest = max(width, height)
+    for factor in (8, 4, 2):
+        if longest // factor >= target_size:
+            return factor
+    return 1
+
+
+def decode_frame(data, target_size=640):
+    """Decode JPEG/PNG bytes into a BGR frame, reducing large JPEGs while decoding
+
+    Args:
+        data (bytes): Encoded image
+        target_size (int): Model input size; 0 disables reduced decoding
+
+    Returns:
+        tuple: (frame or None if invalid, scale from frame to source coordinates)
+    """
+    factor = 1
+    if target_size:
+        dimensions = jpeg_dimensions(data)
+        if dimensions:
+            factor = reduction_factor(*dimensions, target_size=target_size)
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), getattr(cv2, REDUCED_FLAGS[factor]))
+    if frame is None:
+        return None, 1
+    FRAMES_DECODED.inc(reduction=str(factor))
+    return frame, factor
+
+
+def decode_base64_frame(image_b64, target_size=640):
+    """decode_frame for a base64 payload"""
+    return decode_frame(base64.b64decode(image_b64), target_size)
+
+
+class FramePool:
+    def __init__(self, max_per_shape=4, max_shapes=4):
+        """Initialize the pool
+
+        Args:
+            max_per_shape (int): Idle buffers kept for each frame shape
+            max_shapes (int): Distinct frame shapes kept; the least recently used is dropped
+        """
+        self.max_per_shape = max_per_shape
+        self.max_shapes = max_shapes
+        self._free = {}  # (shape, dtype) -> idle buffers, in least recently used order
+        self._lock = threading.Lock()
+        self.allocated = 0
+        self.reused = 0
+
+    def _take(self, key):
+        with self._lock:
+            buffers = self._free.pop(key, None)
+            if buffers:
+                buffer = buffers.pop()
+                self._free[key] = buffers
+                self.reused += 1
+                return buffer
+            if buffers is not None:
+                self._free[key] = buffers
+            self.allocated += 1
+        return np.empty(key[0], dtype=key[1])
+
+    def _give(self, key, buffer):
+        with self._lock:
+            buffers = self._free.pop(key, [])
+            if len(buffers) < self.max_per_shape:
+                buffers.append(buffer)
+            self._free[key] = buffers
+            while len(self._free) > self.max_shapes:
+                del self._free[next(iter(self._free))]
+
+    @contextmanager
+    def copy(self, frame):
+        """Yield a pooled buffer holding a copy of frame; it is reused after the block"""
+        key = (frame.shape, frame.dtype.str)
+        buffer = self._take(key)
+        np.copyto(buffer, frame)
+        try:
+            yield buffer
+        finally:
+            self._give(key, buffer)
+
+    def stats(self):
+        with self._lock:
+            idle = sum(len(buffers) for buffers in self._free.values())
+        return {'allocated': self.allocated, 'reused': self.reused, 'idle': idle}
+
+
+# Model input size used to pick the decode reduction (DECODE_TARGET_SIZE=0 disables it)
+DECODE_TARGET_SIZE = int(os.environ.get('DECODE_TARGET_SIZE', 640))
+
+# Shared pool for per-model working copies of decoded frames
+frame_pool = FramePool()
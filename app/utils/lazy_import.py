@@ -0,0 +1,45 @@
+"""
+Lazy Import Module for Pinaka-AI
+
+Heavy dependencies (OpenCV, NumPy, Twilio, torch) are only needed once the
+app actually processes a frame or sends an SMS. lazy_module() returns a
+stand-in that imports the real module on first attribute access, which
+keeps them off the web process's cold-start path.
+"""
+
+import importlib
+import threading
+
+
+class LazyModule:
+    """Proxy that imports a module the first time one of its attributes is used"""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with self.__dict__['_lock']:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = importlib.import_module(self.__dict__['_name'])
+                    self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_module(name):
+    """Return a proxy for `name` that defers the import until first use"""
+    return LazyModule(name)
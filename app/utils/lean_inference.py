@@ -0,0 +1,254 @@
+"""
+Lean Inference Module for Pinaka-AI
+
+This module runs a YOLO detection model without the Ultralytics predictor.
+The predictor parses arguments, dispatches callbacks and builds Results and
+Boxes objects on every call; for a nano model on CPU that is a measurable
+share of each frame. LeanPredictor does the same work directly:
+
+- letterbox: resize and pad into a reused uint8 buffer, with the
+  predictor's minimal stride-aligned padding,
+- convert into a reused float tensor (BGR->RGB, HWC->CHW, /255),
+- call the underlying torch module (yolo.model) directly,
+- confidence filter and class-aware NMS with torchvision.ops.batched_nms,
+- return an (N, 6) NumPy array of x1, y1, x2, y2, confidence, class in the
+  input frame's coordinates.
+
+Only eager PyTorch detection models are supported; anything else (TorchScript
+exports, other tasks) keeps the standard path. ObjectDetector compares the
+two paths on the first frames before trusting this one (see
+match_detections).
+"""
+
+import logging
+from collections import deque
+
+from app.utils.lazy_import import lazy_module
+
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
+
+logger = logging.getLogger(__name__)
+
+# Ultralytics predict() defaults, so both paths keep the same detections
+DEFAULT_CONF = 0.25
+DEFAULT_IOU = 0.7
+DEFAULT_MAX_DET = 300
+PAD_VALUE = 114
+
+
+def supports_lean(yolo):
+    """True if the model can run on the lean path"""
+    import torch
+    return getattr(yolo, 'task', None) == 'detect' and isinstance(getattr(yolo, 'model', None), torch.nn.Module)
+
+
+def letterbox_geometry(height, width, imgsz=640, stride=32, auto=True):
+    """Resize and padding for a frame, matching Ultralytics' LetterBox
+
+    With auto=True the padding is the minimum that reaches a stride multiple
+    (single frames); with auto=False every frame is padded to imgsz x imgsz,
+    so frames of different sizes can share a batch.
+
+    Returns:
+        tuple: (gain, (resized_w, resized_h), (left, top), (padded_h, padded_w))
+    """
+    gain = min(imgsz / height, imgsz / width)
+    resized_w, resized_h = int(round(width * gain)), int(round(height * gain))
+    pad_w, pad_h = imgsz - resized_w, imgsz - resized_h
+    if auto:
+        pad_w, pad_h = pad_w % stride, pad_h % stride
+    pad_w, pad_h = pad_w / 2, pad_h / 2
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    return gain, (resized_w, resized_h), (left, top), (resized_h + top + bottom, resized_w + left + right)
+
+
+class LeanPredictor:
+    def __init__(self, yolo, imgsz=640, conf=DEFAULT_CONF, iou=DEFAULT_IOU, max_det=DEFAULT_MAX_DET,
+                 channels_last=False):
+        """Wrap a loaded Ultralytics YOLO detection model
+
+        Args:
+            yolo (ultralytics.YOLO): Loaded model; must pass supports_lean()
+            imgsz (int): Inference size
+            conf (float): Minimum confidence
+            iou (float): NMS IoU threshold
+            max_det (int): Maximum detections per frame
+            channels_last (bool): Feed channels_last tensors (when the weights use that layout)
+        """
+        import torch
+        self.module = yolo.model
+        self.names = yolo.names
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self.stride = max(int(self.module.stride.max()), 32) if hasattr(self.module, 'stride') else 32
+        self.memory_format = torch.channels_last if channels_last else torch.contiguous_format
+        self.dtype = next(self.module.parameters()).dtype
+        # Idle (image buffer, tensor) pairs per padded shape. Inference runs on
+        # several executor threads at once, so buffers are taken and returned
+        # with deque pop/append (atomic) rather than a lock.
+        self._buffers = {}
+
+    def _take_buffers(self, shape):
+        import torch
+        idle = self._buffers.setdefault(shape, deque())
+        try:
+            return idle.pop()
+        except IndexError:
+            image = np.full((shape[0], shape[1], 3), PAD_VALUE, dtype=np.uint8)
+            tensor = torch.empty((1, 3, shape[0], shape[1]), dtype=self.dtype).contiguous(
+                memory_format=self.memory_format)
+            return image, tensor
+
+    def preprocess(self, frame, image, tensor, geometry):
+        """Letterbox frame into image, then convert it into tensor (shape (1, 3, h, w))"""
+        import torch
+        gain, (resized_w, resized_h), (left, top), _ = geometry
+        image[:] = PAD_VALUE
+        target = image[top:top + resized_h, left:left + resized_w]
+        if (resized_h, resized_w) == frame.shape[:2]:
+            target[:] = frame
+        else:
+            target[:] = cv2.resize(frame, (resized_w, resized_h), interpolation=cv2.INTER_LINEAR)
+        # BGR HWC uint8 -> RGB CHW float in [0, 1]
+        tensor[0].copy_(torch.from_numpy(image).permute(2, 0, 1).flip(0))
+        tensor.div_(255.0)
+        return tensor
+
+    def postprocess(self, prediction, geometry, frame_shape):
+        """Confidence filter, class-aware NMS and scaling back to frame coordinates"""
+        import torch
+        from torchvision.ops import batched_nms
+        gain, _, (left, top), _ = geometry
+        # (4 + classes, anchors) -> (anchors, 4 + classes)
+        prediction = prediction[0].transpose(0, 1)  # first (only) image of the batch
+        scores, classes = prediction[:, 4:].max(dim=1)
+        keep = scores > self.conf
+        boxes, scores, classes = prediction[keep, :4], scores[keep], classes[keep]
+        if boxes.shape[0] == 0:
+            return np.zeros((0, 6), dtype=np.float32)
+        # xywh -> xyxy
+        xy, wh = boxes[:, :2], boxes[:, 2:4] / 2
+        boxes = torch.cat((xy - wh, xy + wh), dim=1)
+        keep = batched_nms(boxes.float(), scores.float(), classes, self.iou)[:self.max_det]
+        boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+        # Undo the letterbox
+        boxes[:, [0, 2]] -= left
+        boxes[:, [1, 3]] -= top
+        boxes /= gain
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clamp(0, frame_shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clamp(0, frame_shape[0])
+        return torch.cat((boxes, scores[:, None], classes[:, None].to(boxes.dtype)), dim=1).float().numpy()
+
+    def __call__(self, frame):
+        """Detect objects in a BGR frame
+
+        Returns:
+            numpy.ndarray: (N, 6) rows of x1, y1, x2, y2, confidence, class id
+        """
+        import torch
+        geometry = letterbox_geometry(frame.shape[0], frame.shape[1], self.imgsz, self.stride)
+        shape = geometry[3]
+        image, tensor = self._take_buffers(shape)
+        try:
+            with torch.no_grad():
+                prediction = self.module(self.preprocess(frame, image, tensor, geometry))
+            if isinstance(prediction, (list, tuple)):
+                prediction = prediction[0]
+            return self.postprocess(prediction, geometry, frame.shape)
+        finally:
+            self._buffers[shape].append((image, tensor))
+
+    def predict_batch(self, frames):
+        """Detect objects in several BGR frames with one forward pass
+
+        Returns:
+            list: One (N, 6) array per frame, as returned by __call__
+        """
+        import torch
+        geometries = [letterbox_geometry(f.shape[0], f.shape[1], self.imgsz, self.stride, auto=False)
+                      for f in frames]
+        shape = (self.imgsz, self.imgsz)
+        batch = torch.empty((len(frames), 3, self.imgsz, self.imgsz), dtype=self.dtype).contiguous(
+            memory_format=self.memory_format)
+        image, tensor = self._take_buffers(shape)
+        try:
+            for i, (frame, geometry) in enumerate(zip(frames, geometries)):
+                batch[i].copy_(self.preprocess(frame, image, tensor, geometry)[0])
+        finally:
+            self._buffers[shape].append((image, tensor))
+        with torch.no_grad():
+            prediction = self.module(batch)
+        if isinstance(prediction, (list, tuple)):
+            prediction = prediction[0]
+        return [self.postprocess(prediction[i:i + 1], geometry, frame.shape)
+                for i, (frame, geometry) in enumerate(zip(frames, geometries))]
+
+
+def standard_detections(results):
+    """Ultralytics Results -> the same (N, 6) array LeanPredictor returns"""
+    arrays = [result.boxes.data[:, :6].cpu().numpy() for result in results if result.boxes is not None]
+    if not arrays:
+        return np.zeros((0, 6), dtype=np.float32)
+    return np.concatenate(arrays).astype(np.float32)
+
+
+def box_iou(a, b):
+    """Pairwise IoU of two (N, 4) and (M, 4) xyxy arrays"""
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:4], b[None, :, 2:4])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """Greedily match two (N, 6) detection arrays by class and IoU
+
+    Returns:
+        dict: matched pairs as (reference index, candidate index, iou),
+            unmatched reference and candidate indices, and the largest box
+            corner and confidence differences over the matched pairs
+    """
+    pairs = []
+    if len(reference) and len(candidate):
+        iou = box_iou(reference[:, :4], candidate[:, :4])
+        iou[reference[:, 5][:, None] != candidate[:, 5][None, :]] = 0
+        # Highest-IoU pairs first
+        for flat in np.argsort(-iou, axis=None):
+            i, j = np.unravel_index(flat, iou.shape)
+            if iou[i, j] < iou_threshold:
+                break
+            if any(i == p[0] or j == p[1] for p in pairs):
+                continue
+            pairs.append((int(i), int(j), float(iou[i, j])))
+    matched_ref = {p[0] for p in pairs}
+    matched_cand = {p[1] for p in pairs}
+    box_drift = max((float(np.abs(reference[i, :4] - candidate[j, :4]).max()) for i, j, _ in pairs), default=0.0)
+    conf_drift = max((float(abs(reference[i, 4] - candidate[j, 4])) for i, j, _ in pairs), default=0.0)
+    return {
+        'pairs': pairs,
+        'unmatched_reference': [i for i in range(len(reference)) if i not in matched_ref],
+        'unmatched_candidate': [j for j in range(len(candidate)) if j not in matched_cand],
+        'max_box_drift': box_drift,
+        'max_conf_drift': conf_drift,
+    }
+
+
+def detections_agree(reference, candidate, box_tolerance=2.0, conf_tolerance=0.02, iou_threshold=0.5,
+                     min_conf=DEFAULT_CONF):
+    """True if every detection matches within the pixel and confidence tolerances
+
+    A detection within conf_tolerance of the min_conf cut-off may be missing
+    from the other side; that is numerical noise, not a different result.
+    """
+    match = match_detections(reference, candidate, iou_threshold)
+    borderline = min_conf + conf_tolerance
+    unmatched = ([reference[i, 4] for i in match['unmatched_reference']] +
+                 [candidate[j, 4] for j in match['unmatched_candidate']])
+    return (all(conf <= borderline for conf in unmatched)
+            and match['max_box_drift'] <= box_tolerance and match['max_conf_drift'] <= conf_tolerance)
@@ -0,0 +1,245 @@
+"""
+Metrics Module for Pinaka-AI
+
+This module provides a small in-process metrics registry (counters, gauges
+and histograms) rendered in the Prometheus text exposition format, plus a
+per-request stage timer that feeds both the latency histograms and the
+HTTP Server-Timing header.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Latency buckets in seconds, tuned for per-frame work (1 ms .. 10 s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1,
+                   0.15, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    metric_type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, fn, **labels):
+        """Compute the gauge value by calling fn() at scrape time"""
+        self._functions[self._key(labels)] = fn
+
+    def _samples(self):
+        for key, fn in list(self._functions.items()):
+            try:
+                self.set(fn(), **dict(zip(self.labelnames, key)))
+            except Exception:
+                pass
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, n)) for key, (counts, total, n) in self._values.items()]
+        lines = []
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {n}")
+        return lines
+
+
+class RateMeter:
+    """Events per second over a sliding window"""
+
+    def __init__(self, window=10.0):
+        self.window = window
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def mark(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            self._events.append(now)
+            self._trim(now)
+
+    def rate(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            self._trim(now)
+            return len(self._events) / self.window
+
+    def _trim(self, now):
+        cutoff = now - self.window
+        while self._events and self._events[0] < cutoff:
+            self._events.popleft()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class ServerTiming:
+    """Collects named stage durations for one request
+
+    Every stage is also observed in the stage latency histogram, so the
+    Server-Timing header and /metrics always agree.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.entries = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.entries.append((name, seconds))
+        STAGE_LATENCY.observe(seconds, stage=name)
+
+    def header(self, include_total=True):
+        entries = list(self.entries)
+        if include_total:
+            entries.append(('total', time.perf_counter() - self.start))
+        return ', '.join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in entries)
+
+
+# Default registry and the metrics shared across the app
+registry = MetricsRegistry()
+
+STAGE_LATENCY = registry.register(Histogram(
+    'pinaka_stage_latency_seconds', 'Latency of each /detect_frame processing stage', ['stage']))
+INFERENCE_LATENCY = registry.register(Histogram(
+    'pinaka_inference_latency_seconds', 'Model forward pass latency', ['model']))
+REQUEST_LATENCY = registry.register(Histogram(
+    'pinaka_request_latency_seconds', 'HTTP request latency', ['endpoint', 'status']))
+FRAMES_PROCESSED = registry.register(Counter(
+    'pinaka_frames_processed_total', 'Frames that completed detection'))
+FRAMES_DROPPED = registry.register(Counter(
+    'pinaka_frames_dropped_total', 'Frames rejected or failed before completing detection', ['reason']))
+ALERTS_SENT = registry.register(Counter(
+    'pinaka_alerts_total', 'Detection alerts emitted', ['channel', 'label']))
+FRAMES_PER_SECOND = registry.register(Gauge(
+    'pinaka_frames_per_second', 'Frames processed per second over the last 10 seconds'))
+QUEUE_DEPTH = registry.register(Gauge(
+    'pinaka_queue_depth', 'Items waiting in internal work queues', ['queue']))
+MODEL_CACHE_REQUESTS = registry.register(Counter(
+    'pinaka_model_cache_requests_total', 'Per-site model cache lookups', ['result']))
+MODEL_CACHE_EVICTIONS = registry.register(Counter(
+    'pinaka_model_cache_evictions_total', 'Models evicted from the per-site model cache', ['reason']))
+MODEL_CACHE_BYTES = registry.register(Gauge(
+    'pinaka_model_cache_resident_bytes', 'Estimated memory held by cached per-site models'))
+FRAMES_DECODED = registry.register(Counter(
+    'pinaka_frames_decoded_total', 'Uploaded frames decoded, by JPEG DCT reduction factor', ['reduction']))
+
+frame_rate = RateMeter(window=10.0)
+FRAMES_PER_SECOND.set_function(frame_rate.rate)
@@ -0,0 +1,228 @@
+"""
+Model Cache Module for Pinaka-AI
+
+This module loads per-site ObjectDetector models on demand by model ID and
+keeps them in a memory-budgeted LRU cache. Models in use are reference
+counted and never evicted; idle models are evicted least-recently-used
+first when the budget is exceeded, or once they have been idle longer
+than the idle timeout. A background sweeper checks the timeout every half
+TTL, so idle models are freed even when no further requests arrive.
+"""
+
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from app.utils.object_detector import ObjectDetector
+from app.utils.executor import executor
+from app.utils.metrics import MODEL_CACHE_REQUESTS, MODEL_CACHE_EVICTIONS, MODEL_CACHE_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_model_bytes(detector, model_path):
+    """Estimate the resident size of a loaded model
+
+    Uses the parameter and buffer sizes of the torch module when available,
+    otherwise the size of the weights file.
+    """
+    try:
+        module = detector.model.model
+        tensors = list(module.parameters()) + list(module.buffers())
+        size = sum(t.numel() * t.element_size() for t in tensors)
+        if size:
+            return size
+    except Exception:
+        pass
+    try:
+        return os.path.getsize(model_path)
+    except OSError:
+        return 0
+
+
+class _Entry:
+    __slots__ = ('model_id', 'detector', 'path', 'size', 'refcount', 'hits', 'loaded_at', 'last_used')
+
+    def __init__(self, model_id, detector, path, size):
+        self.model_id = model_id
+        self.detector = detector
+        self.path = path
+        self.size = size
+        self.refcount = 0
+        self.hits = 0
+        self.loaded_at = self.last_used = time.time()
+
+
+class ModelCache:
+    def __init__(self, resolve_path, memory_budget_mb=1024, idle_ttl=600, socketio=None, warmup_size=640):
+        """Initialize an empty cache
+
+        Args:
+            resolve_path (callable): Maps a model ID to a weights path, or None if unknown
+            memory_budget_mb (float): Total estimated model memory to keep resident
+            idle_ttl (float): Evict models unused for this many seconds (0 disables)
+            socketio (SocketIO, optional): Passed to each ObjectDetector for alerts
+            warmup_size (int): Side length of the warm-up frame run after loading
+        """
+        self.resolve_path = resolve_path
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.idle_ttl = idle_ttl
+        self.socketio = socketio
+        self.warmup_size = warmup_size
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+        self._sweeper_pid = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_failures = 0
+        MODEL_CACHE_BYTES.set_function(self.resident_bytes)
+
+    def resident_bytes(self):
+        return sum(entry.size for entry in list(self._entries.values()))
+
+    @contextmanager
+    def acquire(self, model_id):
+        """Borrow the detector for a model ID, loading it on a miss
+
+        The model cannot be evicted while it is borrowed.
+
+        Raises:
+            KeyError: If the model ID cannot be resolved to a weights file
+            RuntimeError: If the weights fail to load
+        """
+        entry = self._checkout(model_id)
+        try:
+            yield entry.detector
+        finally:
+            with self._lock:
+                entry.refcount -= 1
+                entry.last_used = time.time()
+                self._evict_locked()
+
+    def _checkout(self, model_id):
+        while True:
+            with self._lock:
+                entry = self._entries.get(model_id)
+                if entry is not None:
+                    self._entries.move_to_end(model_id)
+                    entry.refcount += 1
+                    entry.hits += 1
+                    self.hits += 1
+                    MODEL_CACHE_REQUESTS.inc(result='hit')
+                    return entry
+                loading = self._loading.get(model_id)
+                if loading is None:
+                    # This caller loads; concurrent callers wait for it below
+                    loading = self._loading[model_id] = threading.Event()
+                    self.misses += 1
+                    MODEL_CACHE_REQUESTS.inc(result='miss')
+                    break
+            # Retry the lookup; if that load failed, this caller tries (and reports) its own
+            loading.wait()
+
+        try:
+            entry = self._load(model_id)
+            with self._lock:
+                entry.refcount += 1
+                self._entries[model_id] = entry
+                self._evict_locked()
+                self._start_sweeper_locked()
+            return entry
+        finally:
+            with self._lock:
+                self._loading.pop(model_id).set()
+
+    def _load(self, model_id):
+        path = self.resolve_path(model_id)
+        if not path or not os.path.exists(path):
+            self.load_failures += 1
+            raise KeyError(f"Unknown model: {model_id}")
+        start = time.perf_counter()
+        # Loading reads and optimizes the weights: keep it off the event loop
+        detector = executor.run(ObjectDetector, model_path=path, socketio=self.socketio, name=model_id)
+        if not detector.model_loaded:
+            self.load_failures += 1
+            raise RuntimeError(f"Could not load model {model_id} from {path}")
+        detector.warm_up(self.warmup_size)
+        size = estimate_model_bytes(detector, path)
+        logger.info(f"Loaded model {model_id} ({size / 1e6:.1f} MB) in {time.perf_counter() - start:.2f}s")
+        return _Entry(model_id, detector, path, size)
+
+    def _evict_locked(self):
+        """Drop idle models past their TTL, then LRU idle models until under budget"""
+        now = time.time()
+        if self.idle_ttl:
+            for model_id, entry in list(self._entries.items()):
+                if entry.refcount == 0 and now - entry.last_used > self.idle_ttl:
+                    self._drop_locked(model_id, 'idle')
+
+        total = sum(entry.size for entry in self._entries.values())
+        for model_id, entry in list(self._entries.items()):
+            if total <= self.memory_budget:
+                break
+            if entry.refcount == 0:
+                total -= entry.size
+                self._drop_locked(model_id, 'budget')
+        if total > self.memory_budget:
+            logger.warning(f"Model cache over budget ({total / 1e6:.1f} MB) - all resident models are in use")
+
+    def _drop_locked(self, model_id, reason):
+        self._entries.pop(model_id)
+        self.evictions += 1
+        MODEL_CACHE_EVICTIONS.inc(reason=reason)
+        logger.info(f"Evicted model {model_id} ({reason})")
+
+    def evict_idle(self):
+        """Apply the idle timeout now; runs on every release and from the sweeper"""
+        with self._lock:
+            self._evict_locked()
+
+    def _start_sweeper_locked(self):
+        """Start the idle sweeper once per process
+
+        Started on the first load rather than at import, so a worker forked
+        from a --preload master gets its own thread.
+        """
+        if not self.idle_ttl or self._sweeper_pid == os.getpid():
+            return
+        self._sweeper_pid = os.getpid()
+        threading.Thread(target=self._sweep_loop, name="model-cache-sweeper", daemon=True).start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.idle_ttl / 2)
+            try:
+                self.evict_idle()
+            except Exception:
+                logger.exception("Model cache sweep failed")
+
+    def stats(self):
+        with self._lock:
+            entries = [{
+                'model_id': entry.model_id,
+                'path': os.path.basename(entry.path),
+                'size_bytes': entry.size,
+                'refcount': entry.refcount,
+                'hits': entry.hits,
+                'loaded_at': entry.loaded_at,
+                'idle_seconds': round(time.time() - entry.last_used, 1),
+            } for entry in self._entries.values()]
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'load_failures': self.load_failures,
+                'loading': list(self._loading),
+                'resident_bytes': sum(entry['size_bytes'] for entry in entries),
+                'budget_bytes': self.memory_budget,
+                'idle_ttl': self.idle_ttl,
+                # Least recently used first
+                'models': entries,
+            }
@@ -0,0 +1,96 @@
+"""
+Model Cadence Module for Pinaka-AI
+
+This module decides, per camera session (client address and camera id),
+whether a model runs on a frame or its last results are reused. Each model
+has a cadence in the settings:
+
+- every_n: run on every Nth frame of the session (1 = every frame)
+- min_interval: and at most once per this many seconds (0 = no limit); at
+  most max_age, since results older than max_age are never reused
+
+The custom model (stone, gas_cylinder) runs on every frame by default, while
+COCO, whose classes change more slowly, runs on every third. Between runs
+the last results are served again with their age, so clients can tell
+fresh from reused detections. Results are never reused across a model
+swap, or once they are older than max_age (e.g. a camera that paused).
+"""
+
+import time
+import weakref
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CADENCE = {
+    'custom': {'every_n': 1, 'min_interval': 0.0},
+    'coco': {'every_n': 3, 'min_interval': 0.0},
+}
+
+
+class ModelCadence:
+    def __init__(self, max_sessions=256, max_age=5.0):
+        """Initialize the per-session result cache
+
+        Args:
+            max_sessions (int): Camera sessions tracked; the least recently seen is dropped
+            max_age (float): Seconds after which cached results are never reused
+        """
+        self.max_sessions = max_sessions
+        self.max_age = max_age
+        self._sessions = OrderedDict()  # session -> model name -> last run state
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.reused = 0
+
+    def reuse(self, session, model_name, detector, cadence, now=None):
+        """Count a frame and return the model's cached results if it need not run
+
+        Args:
+            session (str): Client identity ('<address>/<camera id>'), so one client
+                           cannot be served another's results
+            model_name (str): Model slot ('custom', 'coco')
+            detector: Detector that would run; results of another detector are not reused
+            cadence (dict): {'every_n', 'min_interval'} for the model
+
+        Returns:
+            tuple: (results, age in seconds), or None if the model should run on this frame
+        """
+        now = time.time() if now is None else now
+        every_n = max(1, int(cadence.get('every_n', 1)))
+        min_interval = float(cadence.get('min_interval', 0.0))
+        with self._lock:
+            state = self._sessions.get(session, {}).get(model_name)
+            if session in self._sessions:
+                self._sessions.move_to_end(session)
+            if state is None or state['detector']() is not detector:
+                return None
+            state['frames'] += 1
+            age = now - state['time']
+            if age >= self.max_age or (state['frames'] >= every_n and age >= min_interval):
+                return None
+            self.reused += 1
+            return state['results'], age
+
+    def store(self, session, model_name, detector, results, now=None):
+        """Remember a model's results from the frame it just ran on"""
+        now = time.time() if now is None else now
+        with self._lock:
+            models = self._sessions.get(session)
+            if models is None:
+                models = self._sessions[session] = {}
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            models[model_name] = {'results': results, 'time': now, 'frames': 0,
+                                  'detector': weakref.ref(detector)}
+            self.runs += 1
+
+    def stats(self):
+        return {
+            'sessions': len(self._sessions),
+            'runs': self.runs,
+            'reused': self.reused,
+            'max_age': self.max_age,
+        }
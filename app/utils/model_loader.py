@@ -0,0 +1,335 @@
+"""
+Model Loader Module for Pinaka-AI
+
+This module loads the YOLO detectors in a background thread so the web
+server can accept connections (and answer liveness checks) immediately.
+Each model gets a warm-up inference on a synthetic frame before the
+loader reports ready.
+
+When a ModelRegistry is attached, the same thread then watches the
+registry's active pointers and hot-swaps a model when a new version is
+activated: the new detector is loaded and warmed up beside the old one,
+swapped in between requests, and rolled back if it fails.
+
+Only models with at least one monitored class are loaded. apply_settings()
+loads or unloads models when the monitored objects change.
+
+With a WeightsCache attached, weights are loaded from the content-addressed
+cache, and missing weights with a configured URL are downloaded into it.
+"""
+
+import gc
+import os
+import threading
+import time
+import logging
+
+from app.utils.object_detector import ObjectDetector
+from app.utils.executor import executor
+
+logger = logging.getLogger(__name__)
+
+# Classes of the pretrained COCO model, known before the weights are loaded
+COCO_CLASSES = (
+    'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat',
+    'traffic light', 'fire hydrant', 'stop sign', 'parking meter', 'bench', 'bird', 'cat',
+    'dog', 'horse', 'sheep', 'cow', 'elephant', 'bear', 'zebra', 'giraffe', 'backpack',
+    'umbrella', 'handbag', 'tie', 'suitcase', 'frisbee', 'skis', 'snowboard', 'sports ball',
+    'kite', 'baseball bat', 'baseball glove', 'skateboard', 'surfboard', 'tennis racket',
+    'bottle', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl', 'banana', 'apple',
+    'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza', 'donut', 'cake', 'chair',
+    'couch', 'potted plant', 'bed', 'dining table', 'toilet', 'tv', 'laptop', 'mouse',
+    'remote', 'keyboard', 'cell phone', 'microwave', 'oven', 'toaster', 'sink',
+    'refrigerator', 'book', 'clock', 'vase', 'scissors', 'teddy bear', 'hair drier',
+    'toothbrush',
+)
+
+
+def initialize_model(model_path, name="model", max_retries=2, retry_delay=2, model_name=None, socketio=None):
+    """Initialize a model with retry logic
+
+    The weights are loaded on an executor thread: the loader and
+    apply_settings() threads are green under eventlet.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            print(f"Attempting to load {name} (attempt {attempt+1}/{max_retries+1}): {model_path}")
+            detector = executor.run(ObjectDetector, model_path=model_path, socketio=socketio, name=model_name)
+            if detector.model_loaded:
+                print(f"{name} loaded successfully")
+                return detector
+            else:
+                print(f"{name} initialization returned False for model_loaded")
+                if attempt < max_retries:
+                    print(f"Will retry in {retry_delay} seconds...")
+                    time.sleep(retry_delay)
+        except Exception as e:
+            print(f"Error loading {name}: {e}")
+            if attempt < max_retries:
+                print(f"Will retry in {retry_delay} seconds...")
+                time.sleep(retry_delay)
+
+    # If we get here, all attempts failed
+    print(f"All attempts to load {name} failed, using fallback")
+    return ObjectDetector(use_fallback=True, name=model_name)
+
+
+class ModelLoader:
+    # Lifecycle states reported by status()
+    PENDING = 'pending'
+    LOADING = 'loading'
+    WARMING_UP = 'warming_up'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    def __init__(self, model_paths, socketio=None, warmup_size=640, registry=None,
+                 versions=None, registry_poll_interval=5.0, model_classes=None,
+                 weights_cache=None, model_urls=None):
+        """Prepare (but do not start) background loading
+
+        Args:
+            model_paths (dict): Detector name -> weights path, loaded in order
+            socketio (SocketIO, optional): Passed to each ObjectDetector for alerts
+            warmup_size (int): Side length of the synthetic warm-up frame
+            registry (ModelRegistry, optional): Registry to watch for new active versions
+            versions (dict, optional): Detector name -> registry version of model_paths
+            registry_poll_interval (float): Seconds between registry checks
+            model_classes (dict, optional): Detector name -> class names, used to decide
+                which models the monitored objects need before they are loaded.
+                Models without an entry are always loaded.
+            weights_cache (WeightsCache, optional): Cache to load weights from
+            model_urls (dict, optional): Detector name -> {'url', 'sha256'} used to
+                download weights that are missing locally
+        """
+        self.model_paths = dict(model_paths)
+        self.socketio = socketio
+        self.warmup_size = warmup_size
+        self.registry = registry
+        self.versions = dict(versions or {})
+        self.registry_poll_interval = registry_poll_interval
+        self.swap_history = []
+        self.model_classes = {name: set(classes) for name, classes in (model_classes or {}).items()}
+        self.enabled = set(self.model_paths)
+        self.weights_cache = weights_cache
+        self.model_urls = dict(model_urls or {})
+        # Replaced as a whole on every swap, so readers always see a consistent set
+        self.detectors = {}
+        self.state = self.PENDING
+        self.error = None
+        self.started_at = None
+        self.ready_at = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        """Start loading in this process; safe to call repeatedly
+
+        Loading is tied to the process id, so calling this again after a
+        fork (e.g. gunicorn --preload) starts loading in the worker.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.detectors = {}
+            self._ready.clear()
+            self.state = self.LOADING
+            self.started_at = time.time()
+            threading.Thread(target=self._load_all, name="model-loader", daemon=True).start()
+
+    def _weights_path(self, name):
+        """Path to load a model from: the cached blob when a cache is attached"""
+        path = self.model_paths[name]
+        if self.weights_cache is None:
+            return path
+        source = self.model_urls.get(name)
+        try:
+            if os.path.exists(path):
+                return self.weights_cache.resolve(path)
+            if source and source.get('url'):
+                return self.weights_cache.fetch(source['url'], sha256=source.get('sha256'))
+        except Exception as e:
+            logger.error(f"Could not get {name} weights through the cache: {e}")
+        return path
+
+    def _create_detector(self, name):
+        path = self._weights_path(name)
+        if not os.path.exists(path):
+            print(f"WARNING: {name} model not found at {path}. Will use fallback mode.")
+            return ObjectDetector(use_fallback=True, name=name)
+        detector = initialize_model(path, f"{name} model", model_name=name, socketio=self.socketio)
+        if detector.model_loaded and hasattr(detector.model, 'names'):
+            # The loaded weights are the authority on what the model detects
+            self.model_classes[name] = set(detector.model.names.values())
+        return detector
+
+    def _load_all(self):
+        try:
+            loaded = {}
+            for name in self.model_paths:
+                if name in self.enabled:
+                    loaded[name] = self._create_detector(name)
+                else:
+                    print(f"Skipping {name} model: none of its classes are monitored")
+            with self._lock:
+                # Settings may have changed while loading: drop models no longer
+                # needed and keep any that apply_settings() already added
+                detectors = {name: d for name, d in loaded.items() if name in self.enabled}
+                detectors.update(self.detectors)
+                self.detectors = detectors
+
+            self.state = self.WARMING_UP
+            for name, detector in loaded.items():
+                if detector.model_loaded:
+                    start = time.perf_counter()
+                    detector.warm_up(self.warmup_size)
+                    logger.info(f"Warmed up {name} model in {time.perf_counter() - start:.2f}s")
+
+            self.state = self.READY
+            self.ready_at = time.time()
+            logger.info(f"Models ready after {self.ready_at - self.started_at:.1f}s")
+        except Exception as e:
+            logger.exception(f"Model loading failed: {e}")
+            self.error = str(e)
+            self.state = self.FAILED
+        finally:
+            # Unblock waiters either way; fallback detectors can still serve
+            self._ready.set()
+
+        if self.registry is not None:
+            self._watch_registry()
+
+    def _watch_registry(self):
+        """Poll the registry and hot-swap models whose active version changed"""
+        last_mtime = self.registry.mtime()
+        for name, version in self.versions.items():
+            if version and self.detectors.get(name) and self.detectors[name].model_loaded:
+                self.registry.mark_live(version)
+        while True:
+            time.sleep(self.registry_poll_interval)
+            mtime = self.registry.mtime()
+            if mtime == last_mtime:
+                continue
+            last_mtime = mtime
+            for name in self.model_paths:
+                version = self.registry.active_version(name)
+                if not version or version == self.versions.get(name):
+                    continue
+                if name in self.enabled:
+                    self._swap_to_version(name, version)
+                else:
+                    # Not loaded right now; the new version is used when it is next enabled
+                    with self._lock:
+                        self.model_paths[name] = self.registry.path_for(version)
+                        self.versions[name] = version
+            # Our own rollbacks/status updates touch the file too
+            last_mtime = self.registry.mtime()
+
+    def _swap_to_version(self, name, version):
+        logger.info(f"Registry activated {version} for {name}; loading it beside the current model")
+        try:
+            if not self.registry.verify(version):
+                raise RuntimeError("checksum mismatch or missing weights file")
+            self.swap(name, self.registry.path_for(version), version)
+            self.registry.mark_live(version)
+        except Exception as e:
+            logger.error(f"Hot-swap of {name} to {version} failed: {e}")
+            self.swap_history.append({'model': name, 'version': version, 'time': time.time(),
+                                      'result': 'rolled_back', 'error': str(e)})
+            self.registry.rollback(name, failed_version=version, reason=str(e))
+
+    def swap(self, name, model_path, version=None):
+        """Load and warm up a new detector, then atomically replace the current one
+
+        In-flight requests keep using the detector they already fetched; the
+        old model is released once they finish.
+        """
+        # Under eventlet this thread is green: load the weights on an executor thread
+        detector = executor.run(ObjectDetector, model_path=model_path, socketio=self.socketio, name=name)
+        if not detector.model_loaded:
+            raise RuntimeError(f"could not load {model_path}")
+        detector.warm_up(self.warmup_size)
+
+        with self._lock:
+            detectors = dict(self.detectors)
+            detectors[name] = detector
+            self.detectors = detectors
+            self.model_paths[name] = model_path
+            previous = self.versions.get(name)
+            self.versions[name] = version
+        self.swap_history.append({'model': name, 'version': version, 'previous': previous,
+                                  'time': time.time(), 'result': 'swapped'})
+        logger.info(f"Swapped {name} model to {version or model_path}")
+
+    def required_models(self, monitored_objects):
+        """Names of the models with at least one class in monitored_objects"""
+        monitored = set(monitored_objects)
+        return {name for name in self.model_paths
+                if name not in self.model_classes or self.model_classes[name] & monitored}
+
+    def apply_settings(self, monitored_objects):
+        """Load models newly needed by the monitored objects and unload the rest
+
+        Before start() this only decides which models the initial load includes.
+        """
+        with self._lock:
+            required = self.required_models(monitored_objects)
+            added = required - self.enabled
+            removed = self.enabled - required
+            self.enabled = required
+            if self._pid != os.getpid():
+                return
+            if removed:
+                detectors = {name: d for name, d in self.detectors.items() if name not in removed}
+                self.detectors = detectors
+        if removed:
+            # In-flight requests keep their snapshot; the weights are freed once they finish
+            gc.collect()
+            logger.info(f"Unloaded models no longer needed by the settings: {sorted(removed)}")
+        for name in added:
+            threading.Thread(target=self._enable_model, args=(name,),
+                             name=f"model-enable-{name}", daemon=True).start()
+
+    def _enable_model(self, name):
+        """Load and warm up one model, then add it to the detector set if still wanted"""
+        logger.info(f"Loading {name} model for newly monitored classes")
+        detector = self._create_detector(name)
+        if detector.model_loaded:
+            detector.warm_up(self.warmup_size)
+        with self._lock:
+            if name not in self.enabled or name in self.detectors:
+                return
+            detectors = dict(self.detectors)
+            detectors[name] = detector
+            self.detectors = detectors
+
+    def snapshot(self):
+        """Return the current name -> detector mapping for one request"""
+        return self.detectors
+
+    @property
+    def ready(self):
+        return self.state == self.READY
+
+    def wait_until_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def get(self, name):
+        """Return the named detector, or None while it is still loading"""
+        return self.detectors.get(name)
+
+    def status(self):
+        return {
+            'state': self.state,
+            'error': self.error,
+            'started_at': self.started_at,
+            'ready_at': self.ready_at,
+            'load_seconds': (self.ready_at - self.started_at) if self.ready_at else None,
+            'models': {name: detector.model_loaded for name, detector in list(self.detectors.items())},
+            'enabled': sorted(self.enabled),
+            'versions': dict(self.versions),
+            'swaps': self.swap_history[-10:],
+        }
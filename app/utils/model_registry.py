@@ -0,0 +1,227 @@
+"""
+Model Registry Module for Pinaka-AI
+
+This module keeps a versioned registry of model weights in the models
+directory. Each version is stored as its own read-only file with a
+SHA-256 checksum, and an 'active' pointer per model name selects the
+version the app should serve. The running app watches the registry and
+hot-swaps to a newly activated version (see ModelLoader).
+
+Layout:
+    models/registry.json          versions, active pointers and history
+    models/registry/<version>.pt  immutable weight files
+    models/.registry.lock         lock file for read-modify-write updates
+
+Every update holds an exclusive flock on the lock file (where fcntl is
+available), so web workers, inference workers and the deploy script never
+overwrite each other's changes.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: updates are only serialized within the process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    """Return the hex SHA-256 digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    def __init__(self, models_dir):
+        """Initialize the registry rooted at a models directory
+
+        Args:
+            models_dir (str): Directory holding registry.json and the registry/ folder
+        """
+        self.models_dir = models_dir
+        self.registry_file = os.path.join(models_dir, 'registry.json')
+        self.weights_dir = os.path.join(models_dir, 'registry')
+        self.lock_file = os.path.join(models_dir, '.registry.lock')
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        """Hold the registry for a read-modify-write, across threads and processes"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.models_dir, exist_ok=True)
+            with open(self.lock_file, 'a') as lock:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _empty(self):
+        return {'active': {}, 'history': {}, 'versions': {}}
+
+    def load(self):
+        """Read the registry from disk (an empty registry if it doesn't exist)"""
+        if not os.path.exists(self.registry_file):
+            return self._empty()
+        try:
+            with open(self.registry_file, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"Error reading model registry: {str(e)}")
+            return self._empty()
+        for key, value in self._empty().items():
+            data.setdefault(key, value)
+        return data
+
+    def _save(self, data):
+        """Write the registry atomically so readers never see a partial file"""
+        os.makedirs(self.models_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.models_dir, prefix='.registry-', suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, self.registry_file)
+
+    def mtime(self):
+        try:
+            return os.stat(self.registry_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def register(self, source_path, name='custom', classes=None, activate=True, metadata=None):
+        """Copy weights into the registry as a new immutable version
+
+        Args:
+            source_path (str): Weights file to register
+            name (str): Model name the version belongs to (e.g. 'custom')
+            classes (list, optional): Class names the model detects
+            activate (bool): Point the model's 'active' pointer at the new version
+            metadata (dict, optional): Extra information stored with the version
+
+        Returns:
+            str: The new version id
+        """
+        checksum = sha256_file(source_path)
+        version = f"{name}-{time.strftime('%Y%m%d%H%M%S')}-{checksum[:8]}"
+        os.makedirs(self.weights_dir, exist_ok=True)
+        filename = f"{version}{os.path.splitext(source_path)[1] or '.pt'}"
+        target = os.path.join(self.weights_dir, filename)
+        shutil.copy2(source_path, target)
+        os.chmod(target, 0o444)
+
+        with self._locked():
+            data = self.load()
+            data['versions'][version] = {
+                'name': name,
+                'file': os.path.join('registry', filename),
+                'sha256': checksum,
+                'size': os.path.getsize(target),
+                'classes': classes or [],
+                'source': os.path.basename(source_path),
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'status': 'registered',
+                **(metadata or {}),
+            }
+            self._save(data)
+        logger.info(f"Registered model version {version}")
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        """Make a version the active one for its model name"""
+        with self._locked():
+            data = self.load()
+            if version not in data['versions']:
+                raise KeyError(f"Unknown model version: {version}")
+            name = data['versions'][version]['name']
+            previous = data['active'].get(name)
+            if previous == version:
+                return
+            if previous:
+                data['history'].setdefault(name, []).append(previous)
+            data['active'][name] = version
+            self._save(data)
+        logger.info(f"Activated model version {version} (previous: {previous})")
+
+    def rollback(self, name='custom', failed_version=None, reason=None):
+        """Point a model back at its previously active version
+
+        With failed_version, the pointer only moves if that version is still
+        the active one: when several workers fail to load the same version,
+        only the first rollback takes effect.
+
+        Args:
+            name (str): Model name to roll back
+            failed_version (str, optional): Version to mark as failed
+            reason (str, optional): Why the version failed
+
+        Returns:
+            str: The version that is now active, or None if there was no history
+        """
+        with self._locked():
+            data = self.load()
+            if failed_version in data['versions']:
+                data['versions'][failed_version]['status'] = 'failed'
+                data['versions'][failed_version]['error'] = reason
+            if failed_version and data['active'].get(name) != failed_version:
+                # Already rolled back (or replaced) by another worker or the deploy script
+                self._save(data)
+                current = data['active'].get(name)
+                logger.warning(f"{failed_version} is no longer active for {name}; keeping {current}")
+                return current
+            history = data['history'].get(name, [])
+            restored = history.pop() if history else None
+            if restored:
+                data['active'][name] = restored
+            else:
+                data['active'].pop(name, None)
+            self._save(data)
+        logger.warning(f"Rolled back {name} from {failed_version} to {restored}")
+        return restored
+
+    def mark_live(self, version):
+        """Record that a version was loaded and is serving traffic"""
+        with self._locked():
+            data = self.load()
+            if version in data['versions']:
+                data['versions'][version]['status'] = 'live'
+                data['versions'][version]['live_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+                self._save(data)
+
+    def active_version(self, name='custom'):
+        return self.load()['active'].get(name)
+
+    def get_version(self, version):
+        return self.load()['versions'].get(version)
+
+    def path_for(self, version):
+        """Absolute path of a version's weights file"""
+        info = self.get_version(version)
+        if info is None:
+            raise KeyError(f"Unknown model version: {version}")
+        return os.path.join(self.models_dir, info['file'])
+
+    def verify(self, version):
+        """Check a version's weights against its recorded checksum"""
+        info = self.get_version(version)
+        if info is None:
+            return False
+        path = os.path.join(self.models_dir, info['file'])
+        return os.path.exists(path) and sha256_file(path) == info['sha256']
@@ -1,25 +1,55 @@
-import cv2
 import time
 import base64
 import os
-import sys
-import urllib.request
-import numpy as np
-import shutil
 import random
+import threading
+from app.utils.lazy_import import lazy_module
 from app.utils.sms_notifier import SMSNotifier
+from app.utils.metrics import INFERENCE_LATENCY, ALERTS_SENT
+from app.utils.profiling import torch_trace
+from app.utils.weights_cache import mmap_loading
+from app.utils.executor import executor
+from app.utils.cpu_plan import cpu_plan
+from app.utils.lean_inference import LeanPredictor, supports_lean, standard_detections, detections_agree
+
+# OpenCV and NumPy are imported on first use to keep web process start-up fast
+cv2 = lazy_module('cv2')
+np = lazy_module('numpy')
 
 # Check if we're in production mode
 IS_PRODUCTION = os.environ.get('RENDER', False)
 
+# Optional lean inference path (app/utils/lean_inference.py), checked against
+# the standard Ultralytics path on the first LEAN_VALIDATE_FRAMES real frames
+USE_LEAN_INFERENCE = os.environ.get('LEAN_INFERENCE', '0').lower() in ('1', 'true', 'yes')
+LEAN_VALIDATE_FRAMES = int(os.environ.get('LEAN_VALIDATE_FRAMES', 3))
+
+class FrameResult:
+    """Everything one call found on one frame
+
+    Returned per call rather than kept on the detector, because several
+    requests can be inside the same detector at once.
+    """
+
+    def __init__(self, inference=0.0):
+        self.objects = []  # (label, confidence)
+        self.detections = []  # (label, confidence, x1, y1, x2, y2)
+        self.alerts = []  # alerts raised on this frame, with the raw JPEG snapshot
+        self.timings = {'inference': inference, 'notify': 0.0}  # seconds per stage
+
 class ObjectDetector:
-    def __init__(self, model_path="yolov8n.pt", socketio=None, use_fallback=False):
+    def __init__(self, model_path="yolov8n.pt", socketio=None, use_fallback=False, name=None):
+        self.name = name or os.path.splitext(os.path.basename(model_path))[0]
         self.model_loaded = False
         self.socketio = socketio
         self.demo_mode = False  # Changed: don't default to demo mode even in production
         self.last_notification_time = {}  # For tracking notification cooldowns
         self.yolo_available = False
-        self.last_detections = []  # Store detailed detection info
+        # The Ultralytics predictor is not thread-safe; see inference_lock()
+        self._inference_lock = None
+        self._create_lock = threading.Lock()
+        self.lean = None  # LeanPredictor when the lean inference path is enabled
+        self.lean_checks_left = 0
         
         # Initialize SMS notifier
         self.sms_notifier = SMSNotifier()
@@ -65,11 +95,14 @@ class ObjectDetector:
             if not self.yolo_available:
                 print("YOLO is not available, cannot load model")
                 raise ImportError("YOLO is not available in the current environment")
-              # Load the model
+              # Load the model (a TorchScript export of it if the CPU plan asks for one)
+            model_path = cpu_plan.weights_for(model_path)
             print(f"Loading model from: {model_path}")
             try:
-                # First try standard loading method
-                self.model = YOLO(model_path)
+                # First try standard loading method; memory-map the weights where
+                # torch supports it so worker processes share the pages
+                with mmap_loading():
+                    self.model = YOLO(model_path)
                 self.model_loaded = True
                 print("Model loaded successfully using standard method")
             except Exception as e:
@@ -80,7 +113,8 @@ class ObjectDetector:
                     print("Detected 'invalid load key' error, trying alternative loading method...")
                     try:
                         # Try loading with explicit task parameter
-                        self.model = YOLO(model_path, task='detect')
+                        with mmap_loading():
+                            self.model = YOLO(model_path, task='detect')
                         self.model_loaded = True
                         print("Model loaded successfully using alternative method")
                     except Exception as alt_e:
@@ -92,6 +126,11 @@ class ObjectDetector:
                     self.model_loaded = False
                     self.demo_mode = True
             
+            # Thread pools, Conv+BN fusion, channels_last and optional compilation
+            if self.model_loaded:
+                cpu_plan.optimize(self.model, self.name)
+                self._enable_lean()
+            
             # Print available classes for this model
             if hasattr(self.model, 'names'):
                 print(f"Model loaded with classes: {list(self.model.names.values())}")
@@ -108,6 +147,48 @@ class ObjectDetector:
             # Update demo frame with error message
             self._create_demo_frame(f"Error: {str(e)[:50]}", False)
 
+    def warm_up(self, size=640):
+        """Run one inference on a synthetic frame so the first real request is fast"""
+        if not self.model_loaded:
+            return
+        frame = np.zeros((size, size, 3), dtype=np.uint8)
+        executor.run(self.model, frame, verbose=False)
+        if self.lean is not None:
+            executor.run(self.lean, frame)
+
+    def _enable_lean(self):
+        """Set up the lean inference path if LEAN_INFERENCE is on and the model supports it"""
+        path = 'standard'
+        if USE_LEAN_INFERENCE:
+            try:
+                if supports_lean(self.model):
+                    channels_last = cpu_plan.models.get(self.name, {}).get('channels_last', False)
+                    self.lean = LeanPredictor(self.model, channels_last=channels_last)
+                    self.lean_checks_left = LEAN_VALIDATE_FRAMES
+                    path = 'lean (validating)' if LEAN_VALIDATE_FRAMES else 'lean'
+                else:
+                    print(f"Lean inference not supported for {self.name}; using the standard path")
+            except Exception as e:
+                print(f"Could not set up lean inference for {self.name}: {e}")
+                self.lean = None
+        cpu_plan.models.setdefault(self.name, {})['inference_path'] = path
+
+    def _check_lean(self, frame, detections):
+        """Compare a lean-path result with the standard path; fall back on disagreement
+
+        Returns the standard path's detections, which are served while validating.
+        """
+        reference, _ = executor.run(self._infer, frame, False)
+        self.lean_checks_left -= 1
+        if not detections_agree(reference, detections):
+            print(f"Lean inference for {self.name} does not match the standard path; disabling it")
+            self.lean = None
+            self.lean_checks_left = 0
+            cpu_plan.models.setdefault(self.name, {})['inference_path'] = 'standard (lean mismatch)'
+        elif self.lean_checks_left <= 0:
+            cpu_plan.models.setdefault(self.name, {})['inference_path'] = 'lean'
+        return reference
+
     def _create_demo_frame(self, message="Demo Mode - Browser Camera", success=True):
         """Create a demo frame with simulated detections for deployment"""
         # Create a base frame (black background)
@@ -147,9 +228,12 @@ class ObjectDetector:
                        (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
     
     def _process_frame(self, frame, config):
-        """Process a single frame with detection"""
-        detected_objects = []
-        self.last_detections = []  # Reset detection info
+        """Process a single frame with detection
+
+        Returns:
+            tuple: (frame with monitored detections drawn, FrameResult)
+        """
+        result = FrameResult()
         current_time = time.time()
         
         # Use simulated detections in demo mode
@@ -165,7 +249,6 @@ class ObjectDetector:
                 self._create_demo_frame()
                 
             # Add simulated detections
-            objects = []
             for obj in config.monitored_objects:
                 if random.random() > 0.7:  # 30% chance to "detect" each monitored object
                     confidence = random.uniform(0.6, 0.95)
@@ -179,9 +262,8 @@ class ObjectDetector:
                     y2 = y1 + height
                     
                     # Store detection with coordinates
-                    detected_object = (obj, confidence, x1, y1, x2, y2)
-                    objects.append((obj, confidence))
-                    self.last_detections.append(detected_object)
+                    result.objects.append((obj, confidence))
+                    result.detections.append((obj, confidence, x1, y1, x2, y2))
                     
                     # Draw bounding box
                     cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
@@ -190,43 +272,118 @@ class ObjectDetector:
                     
                     # Randomly create a notification
                     if confidence > config.notification_threshold and random.random() > 0.9:
-                        self._send_notification(frame, obj, confidence, current_time, config, x1, y1, x2, y2)
+                        self._send_notification(frame, obj, confidence, current_time, config, result,
+                                                x1, y1, x2, y2)
             
-            return frame, objects
+            return frame, result
         
         # Regular model-based detection
         if self.model_loaded:
-            # Perform object detection with YOLO
-            results = self.model(frame)
+            # Perform object detection with YOLO, off the event loop
+            detections, result.timings['inference'] = self.detect(frame)
             
-            # Process detection results
-            for result in results:
-                for box in result.boxes:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])  # Bounding box coordinates
-                    confidence = box.conf[0].item()  # Confidence score
-                    class_id = int(box.cls[0])
-                    label = result.names[class_id]  # Class name
-                    
-                    # Store full detection information
-                    self.last_detections.append((label, confidence, x1, y1, x2, y2))
-                    
-                    # Always add the detection to the list, but only draw/notify if it meets the threshold
-                    detected_objects.append((label, confidence))
-                    
-                    # Check if object should be monitored
-                    if label in config.monitored_objects and confidence >= config.notification_threshold:
-                        # Draw bounding box
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                        cv2.putText(frame, f"{label} {confidence:.2f}", (x1, y1 - 10),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                          # Send notification if cooldown period has passed
-                        self._send_notification(frame, label, confidence, current_time, config, x1, y1, x2, y2)
+            # Process detection results: rows of x1, y1, x2, y2, confidence, class id
+            names = self.model.names
+            rows = [(names[int(row[5])], float(row[4]), *map(int, row[:4])) for row in detections]
+            self._handle_detections(rows, config, current_time, result, lambda: frame)
         else:        # Simple detection using motion detection as a fallback
-            self._add_simulated_detections(frame, config, detected_objects, current_time)
+            self._add_simulated_detections(frame, config, result, current_time)
                 
-        return frame, detected_objects
+        return frame, result
     
-    def _add_simulated_detections(self, frame, config, detected_objects, current_time):
+    def _handle_detections(self, rows, config, current_time, result, get_frame):
+        """Record detections, then draw and notify for the monitored ones
+
+        Args:
+            rows (list): (label, confidence, x1, y1, x2, y2) tuples
+            get_frame (callable): Returns the frame to draw on; only called for monitored detections
+        """
+        for label, confidence, x1, y1, x2, y2 in rows:
+            # Store full detection information
+            result.detections.append((label, confidence, x1, y1, x2, y2))
+            
+            # Always add the detection to the list, but only draw/notify if it meets the threshold
+            result.objects.append((label, confidence))
+            
+            # Check if object should be monitored
+            if label in config.monitored_objects and confidence >= config.notification_threshold:
+                frame = get_frame()
+                if frame is None:
+                    continue
+                # Draw bounding box
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                cv2.putText(frame, f"{label} {confidence:.2f}", (x1, y1 - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                # Send notification if cooldown period has passed
+                self._send_notification(frame, label, confidence, current_time, config, result,
+                                        x1, y1, x2, y2)
+
+    def inference_lock(self):
+        """Lock held around every forward pass of this detector's models
+
+        The Ultralytics predictor keeps per-call state, so concurrent requests
+        must not run the same model at once. Take the lock in the calling
+        thread, around executor.run(), never inside the executor thread. It is
+        created on first use so it is the green lock once eventlet has patched
+        threading.
+        """
+        if self._inference_lock is None:
+            with self._create_lock:
+                if self._inference_lock is None:
+                    self._inference_lock = threading.Lock()
+        return self._inference_lock
+
+    def detect(self, frame):
+        """Run the model on a frame without drawing or notifying (remote inference workers)
+
+        Returns:
+            tuple: ((N, 6) array of x1, y1, x2, y2, confidence, class id, seconds)
+        """
+        with self.inference_lock():
+            detections, seconds = executor.run(self._infer, frame)
+            if self.lean is not None and self.lean_checks_left > 0:
+                detections = self._check_lean(frame, detections)
+        INFERENCE_LATENCY.observe(seconds, model=self.name)
+        return detections, seconds
+
+    def process_remote_detections(self, detections, config, get_frame, inference_seconds=0.0):
+        """Record, draw and notify for detections made by a remote inference worker
+
+        Args:
+            detections (list): [x1, y1, x2, y2, confidence, label] rows from the worker
+            config (Config): Detection settings
+            get_frame (callable): Returns the frame the boxes refer to; only called
+                                  (and the upload only decoded) when an alert is due
+            inference_seconds (float): Worker-side inference time
+
+        Returns:
+            FrameResult: As from _process_frame
+        """
+        result = FrameResult(inference_seconds)
+        rows = [(label, float(conf), int(x1), int(y1), int(x2), int(y2))
+                for x1, y1, x2, y2, conf, label in detections]
+        self._handle_detections(rows, config, time.time(), result, get_frame)
+        return result
+
+    def _infer(self, frame, lean=True):
+        """Run the model on one frame and time it, excluding executor queueing
+
+        Runs on an executor thread, so it must not touch green locks or the event loop.
+
+        Returns:
+            tuple: ((N, 6) array of x1, y1, x2, y2, confidence, class id, seconds)
+        """
+        predictor = self.lean if lean else None
+        start = time.perf_counter()
+        with cpu_plan.inference_context():
+            # Traced here, on the thread that runs the forward pass, when a capture is armed
+            if predictor is not None:
+                detections = torch_trace.run(self.name, predictor, frame)
+            else:
+                detections = standard_detections(torch_trace.run(self.name, self.model, frame, verbose=False))
+        return detections, time.perf_counter() - start
+
+    def _add_simulated_detections(self, frame, config, result, current_time):
         """Add simulated detections when real model is not available"""        # Add a message to the frame
         cv2.putText(frame, "Using motion detection fallback", 
                    (20, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
@@ -265,8 +422,8 @@ class ObjectDetector:
             confidence = 0.7  # Fake confidence
             
             # Store full detection information
-            self.last_detections.append((label, confidence, x, y, x + w, y + h))
-            detected_objects.append((label, confidence))
+            result.detections.append((label, confidence, x, y, x + w, y + h))
+            result.objects.append((label, confidence))
             
             # Draw a rectangle around the contour
             cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
@@ -277,17 +434,27 @@ class ObjectDetector:
                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
                 
                 # Send notification if cooldown period has passed
-                self._send_notification(frame, label, confidence, current_time, config, x, y, x + w, y + h)
+                self._send_notification(frame, label, confidence, current_time, config, result,
+                                        x, y, x + w, y + h)
                 
         # Periodically update the first frame to adapt to lighting changes
         if time.time() % 10 < 0.1:  # Update roughly every 10 seconds
             self.first_frame = gray
-    def _send_notification(self, frame, label, confidence, current_time, config, x1=0, y1=0, x2=0, y2=0):
+    def _send_notification(self, frame, label, confidence, current_time, config, result,
+                           x1=0, y1=0, x2=0, y2=0):
         """Send a notification via SocketIO and SMS if configured"""
         # Check if socketio is available
         if not self.socketio:
             return
             
+        start = time.perf_counter()
+        try:
+            self._emit_notification(frame, label, confidence, current_time, config, result, x1, y1, x2, y2)
+        finally:
+            result.timings['notify'] += time.perf_counter() - start
+
+    def _emit_notification(self, frame, label, confidence, current_time, config, result, x1, y1, x2, y2):
+        """Encode the alert snapshot and emit it, subject to cooldowns"""
         # Check cooldown period (don't spam notifications)
         cooldown = 5  # seconds between notifications for same object
         if label in self.last_notification_time:
@@ -315,11 +482,8 @@ class ObjectDetector:
                 # Use the whole frame
                 cropped = frame
                 
-            # Resize for smaller image
-            cropped = cv2.resize(cropped, (320, 240))
-            
-            # Encode as JPEG
-            ret, buffer = cv2.imencode('.jpg', cropped, [cv2.IMWRITE_JPEG_QUALITY, 70])
+            # Resize and encode as JPEG off the event loop
+            ret, buffer = executor.run(self._encode_snapshot, cropped)
             if not ret:
                 return
                 
@@ -337,19 +501,41 @@ class ObjectDetector:
                 'timestamp': current_time,
                 'coordinates': {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)},
                 'image': jpg_as_text
+            })
+            ALERTS_SENT.inc(channel='socketio', label=label)
+            
+            # Keep the alert (with the raw JPEG) so the caller can persist it
+            result.alerts.append({
+                'object': label,
+                'confidence': float(confidence),
+                'timestamp': current_time,
+                'coordinates': {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)},
+                'jpeg': buffer.tobytes()
             })
               # Send SMS notification if enabled and object is in the SMS list
             if hasattr(config, 'sms_enabled') and config.sms_enabled:
                 if label in config.sms_objects:
                     # Check SMS-specific cooldown
                     if self.sms_notifier.should_send_notification(label, current_time, config.sms_cooldown):
-                        # Send SMS with detection details
-                        self.sms_notifier.send_detection_alert(
-                            object_name=label,
-                            confidence=confidence,
-                            coordinates=(x1, y1, x2, y2)
-                        )
-                        print(f"SMS notification sent for {label}")
+                        # Send SMS with detection details in the background; the
+                        # Twilio round trip must not hold up the frame
+                        executor.spawn(self._send_sms, label, confidence, (x1, y1, x2, y2))
                         
         except Exception as e:
-            print(f"Error sending notification: {e}")
\ No newline at end of file
+            print(f"Error sending notification: {e}")
+
+    @staticmethod
+    def _encode_snapshot(image):
+        """Resize an alert crop and encode it as JPEG"""
+        image = cv2.resize(image, (320, 240))
+        return cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 70])
+
+    def _send_sms(self, label, confidence, coordinates):
+        sent = self.sms_notifier.send_detection_alert(
+            object_name=label,
+            confidence=confidence,
+            coordinates=coordinates
+        )
+        if sent:
+            ALERTS_SENT.inc(channel='sms', label=label)
+            print(f"SMS notification sent for {label}")
\ No newline at end of file
@@ -0,0 +1,306 @@
+"""
+Profiling Module for Pinaka-AI
+
+This module provides on-demand profiling of the running server:
+
+- a stack sampler that periodically snapshots every thread's stack and
+  aggregates them into flamegraph-ready collapsed stacks,
+- a cProfile session that profiles a number of requests or seconds and
+  produces a pstats dump,
+- a torch profiler capture of the next N ObjectDetector forward passes,
+  exported as Chrome trace files.
+
+Only one sampling/cProfile session runs at a time.
+
+Under the eventlet worker threading is green, so the sampler runs on a real
+OS thread; it sees the hub thread (whichever greenlet is running at sample
+time) and the tpool inference threads. A cProfile session profiles the OS
+thread that started it for its whole duration, which under eventlet is the
+thread serving every request; enabling it per request instead would let
+interleaved greenlets switch it off mid-request. Under ASGI (asgi.py) the
+Starlette routes bypass the Flask request hooks and run on pool threads, so
+only the sampler is offered there.
+"""
+
+import cProfile
+import io
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+import logging
+from collections import Counter
+from contextlib import ExitStack
+
+from app.utils.executor import os_module
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_number(value, name, cast=float, minimum=0.0, allow_minimum=True):
+    """Parse a request argument as a finite number of at least (or above) minimum
+
+    Raises:
+        ValueError: With a message naming the argument
+    """
+    try:
+        number = cast(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"{name} must be a number") from None
+    if not math.isfinite(number) or number < minimum or (number == minimum and not allow_minimum):
+        bound = 'at least' if allow_minimum else 'greater than'
+        raise ValueError(f"{name} must be {bound} {minimum}")
+    return number
+
+
+class Profiler:
+    MODES = ('sample', 'cprofile')
+
+    def __init__(self):
+        # A real lock: the sampler's OS thread takes it too, and it is never held across a yield
+        self._lock = os_module('threading').Lock()
+        self.modes = self.MODES  # asgi.py narrows this to the sampler
+        self.mode = None
+        self.running = False
+        self.started_at = None
+        self.deadline = None
+        self.max_requests = None
+        self.requests_profiled = 0
+        self._stacks = Counter()
+        self._samples = 0
+        self._cprofile = None
+        self._result = None
+
+    def start(self, mode='sample', seconds=10.0, requests=None, interval=0.005):
+        """Start a profiling session
+
+        Args:
+            mode (str): 'sample' for the stack sampler, 'cprofile' for cProfile
+            seconds (float): Maximum duration of the session
+            requests (int, optional): cProfile only - stop after this many requests
+            interval (float): Sampler only - seconds between stack snapshots
+
+        Returns:
+            bool: False if a session is already running
+
+        Raises:
+            ValueError: For an unknown mode or an invalid argument; no session is started
+        """
+        if not isinstance(mode, str) or mode not in self.modes:
+            raise ValueError(f"Unknown profiling mode: {mode}" if mode not in self.MODES else
+                             f"Profiling mode {mode} is not available in this server")
+        # Everything is validated before any state changes
+        seconds = _parse_number(seconds, 'seconds') if seconds is not None else 0.0
+        requests = _parse_number(requests, 'requests', int, 1) if requests is not None else None
+        interval = _parse_number(interval, 'interval', minimum=0.0, allow_minimum=False)
+        if mode == 'sample' and not seconds:
+            seconds = 10.0
+
+        with self._lock:
+            if self.running:
+                return False
+            try:
+                self.mode = mode
+                self.running = True
+                self.started_at = time.time()
+                self.deadline = self.started_at + seconds if seconds else None
+                self.max_requests = requests
+                self.requests_profiled = 0
+                self._stacks = Counter()
+                self._samples = 0
+                self._result = None
+                if mode == 'cprofile':
+                    # One profile for the whole session, in the thread serving requests
+                    self._cprofile = cProfile.Profile()
+                    self._cprofile.enable()
+                else:
+                    os_module('threading').Thread(target=self._sample_loop, args=(interval,),
+                                                   name="stack-sampler", daemon=True).start()
+            except Exception:
+                if self._cprofile is not None:
+                    self._cprofile.disable()
+                    self._cprofile = None
+                self.running = False
+                raise
+        logger.info(f"Started {mode} profiling session")
+        return True
+
+    def _sample_loop(self, interval):
+        """Snapshot all thread stacks until the deadline (runs on a real OS thread)"""
+        own_id = os_module('threading').get_ident()
+        sleep = os_module('time').sleep
+        while time.time() < self.deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self._stacks[';'.join(reversed(stack))] += 1
+            self._samples += 1
+            sleep(interval)
+        self._finish()
+
+    def before_request(self):
+        """End a cProfile session that has passed its deadline"""
+        if self.running and self.mode == 'cprofile':
+            if self.deadline and time.time() >= self.deadline:
+                self._finish()
+
+    def after_request(self):
+        """Count a request and stop when the request budget is used"""
+        if self.running and self.mode == 'cprofile':
+            self.requests_profiled += 1
+            if (self.max_requests and self.requests_profiled >= self.max_requests) or \
+                    (self.deadline and time.time() >= self.deadline):
+                self._finish()
+
+    def stop(self):
+        """Stop the current session early"""
+        if self.running:
+            if self.mode == 'sample':
+                self.deadline = time.time()
+            else:
+                self._finish()
+
+    def _finish(self):
+        with self._lock:
+            if not self.running:
+                return
+            if self.mode == 'sample':
+                lines = [f"{stack} {count}" for stack, count in self._stacks.most_common()]
+                self._result = ('\n'.join(lines) + '\n').encode('utf-8')
+            else:
+                self._cprofile.disable()
+                with tempfile.NamedTemporaryFile(suffix='.pstats', delete=False) as f:
+                    path = f.name
+                self._cprofile.dump_stats(path)
+                with open(path, 'rb') as f:
+                    self._result = f.read()
+                os.remove(path)
+                self._cprofile = None
+            self.running = False
+        logger.info(f"Finished {self.mode} profiling session")
+
+    def result(self):
+        """Return (data, mimetype, filename) for the last finished session, or None"""
+        if self._result is None:
+            return None
+        if self.mode == 'sample':
+            return self._result, 'text/plain', 'profile.collapsed'
+        return self._result, 'application/octet-stream', 'profile.pstats'
+
+    def status(self):
+        if self.running and self.mode == 'cprofile' and self.deadline and time.time() >= self.deadline:
+            self._finish()
+        return {
+            'mode': self.mode,
+            'running': self.running,
+            'started_at': self.started_at,
+            'deadline': self.deadline,
+            'max_requests': self.max_requests,
+            'requests_profiled': self.requests_profiled,
+            'samples': self._samples,
+            'result_ready': self._result is not None,
+        }
+
+
+class TorchTraceCapture:
+    """Captures torch profiler traces of the next N model forward passes
+
+    The torch profiler only records the thread it is started on, so traces
+    are taken around the forward pass itself, on the executor thread that
+    runs it (run()). Only one trace is taken at a time; a forward pass that
+    starts while another is being traced runs untraced.
+    """
+
+    def __init__(self):
+        # A real lock: run() is called on executor threads, and it is never held across a yield
+        self._lock = os_module('threading').Lock()
+        self._active = False
+        self.remaining = 0
+        self.requested = 0
+        self.failed = 0
+        self.trace_dir = None
+        self.traces = []
+
+    def arm(self, frames=5):
+        """Profile the next `frames` inference calls, discarding older traces"""
+        with self._lock:
+            self.trace_dir = tempfile.mkdtemp(prefix='pinaka_torch_trace_')
+            self.traces = []
+            self.failed = 0
+            self.remaining = self.requested = int(frames)
+
+    def run(self, name, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs), tracing it if a capture is armed
+
+        Profiler errors are logged and never fail the call; exceptions from
+        fn propagate as usual.
+        """
+        with self._lock:
+            armed = self.remaining > 0 and not self._active
+            if armed:
+                index = self.requested - self.remaining
+                self.remaining -= 1
+                self._active = True
+        if not armed:
+            return fn(*args, **kwargs)
+
+        try:
+            profiling = ExitStack()
+            try:
+                from torch.profiler import profile, record_function, ProfilerActivity
+                prof = profiling.enter_context(profile(activities=[ProfilerActivity.CPU], record_shapes=True))
+                profiling.enter_context(record_function(f"{name}_inference"))
+            except Exception as e:
+                self._trace_failed(name, e, profiling)
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                try:
+                    profiling.close()
+                    path = os.path.join(self.trace_dir, f"{index:03d}_{name}.json")
+                    prof.export_chrome_trace(path)
+                    with self._lock:
+                        self.traces.append(path)
+                except Exception as e:
+                    self._trace_failed(name, e)
+        finally:
+            with self._lock:
+                self._active = False
+
+    def _trace_failed(self, name, error, profiling=None):
+        logger.error(f"Torch trace of {name} failed: {error}")
+        if profiling is not None:
+            try:
+                profiling.close()
+            except Exception:
+                pass
+        with self._lock:
+            self.failed += 1
+
+    def status(self):
+        return {'requested': self.requested, 'remaining': self.remaining, 'captured': len(self.traces),
+                'failed': self.failed}
+
+    def result(self):
+        """Return the captured traces as an in-memory zip archive, or None"""
+        if not self.traces or len(self.traces) + self.failed < self.requested:
+            return None
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for path in self.traces:
+                archive.write(path, os.path.basename(path))
+        return buffer.getvalue()
+
+
+# Shared instances used by the app and ObjectDetector
+profiler = Profiler()
+torch_trace = TorchTraceCapture()
@@ -0,0 +1,456 @@
+"""
+Remote Inference Module for Pinaka-AI
+
+This module lets web nodes hand detection to stateless inference workers on
+other machines, so detection capacity scales separately from the web tier.
+
+Protocol (over a broker with named FIFO queues and expiring worker records):
+
+- Every worker advertises itself with a heartbeat record every few seconds:
+  worker id, host, models, capacity (concurrent frames) and busy slots. A
+  worker whose record expires is no longer routed to.
+- A web node picks the least-loaded live worker that serves the requested
+  models, and pushes a request onto that worker's queue. A request is a JSON
+  header (correlation id, reply queue, models, deadline), then the uploaded
+  JPEG bytes.
+- The worker runs its ObjectDetector models and pushes a JSON reply,
+  carrying the same correlation id, onto the web node's reply queue. Boxes
+  are given in the uploaded image's coordinates. Requests that are already
+  past their deadline are skipped.
+- The web node matches replies to waiting requests by correlation id.
+- Queues expire QUEUE_TTL seconds after their last push, so the reply queue
+  of a web node that went away (and requests for a dead worker) don't pile
+  up in the broker. Malformed messages are logged, counted and skipped.
+
+Brokers: RedisBroker (redis://..., needs the `redis` package) and
+InProcessBroker (memory://), which is a stand-in for tests and development
+with workers and clients in the same process.
+"""
+
+import os
+import json
+import time
+import uuid
+import queue
+import struct
+import socket
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'pinaka'
+
+# Seconds a request or reply queue outlives its last push
+QUEUE_TTL = 60
+
+
+class RemoteInferenceError(Exception):
+    """No worker available, or no reply before the timeout"""
+
+
+def encode_request(header, image_bytes):
+    data = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    return struct.pack('<I', len(data)) + data + image_bytes
+
+
+def decode_request(message):
+    """Split a request into its header dict and image bytes
+
+    Raises:
+        ValueError: If the message is not a well-formed request
+    """
+    try:
+        size = struct.unpack('<I', message[:4])[0]
+        header = json.loads(message[4:4 + size])
+    except (struct.error, TypeError, ValueError) as e:  # JSON and UTF-8 errors are ValueErrors
+        raise ValueError(f"malformed inference request: {e}") from None
+    if not (isinstance(header, dict) and isinstance(header.get('id'), str)
+            and isinstance(header.get('reply_to'), str)):
+        raise ValueError("malformed inference request: header needs 'id' and 'reply_to'")
+    if not isinstance(header.get('deadline', 0), (int, float)):
+        raise ValueError("malformed inference request: deadline is not a number")
+    return header, message[4 + size:]
+
+
+class InProcessBroker:
+    """Broker stand-in for a single process (tests, development)"""
+
+    def __init__(self):
+        self._queues = {}
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    def _queue(self, name):
+        with self._lock:
+            return self._queues.setdefault(name, queue.Queue())
+
+    def push(self, name, message, ttl=None):
+        # Nothing outlives the process, so ttl is not needed here
+        self._queue(name).put(message)
+
+    def pop(self, name, timeout):
+        """Next message on a queue, or None after timeout seconds"""
+        try:
+            return self._queue(name).get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def heartbeat(self, worker_id, info, ttl):
+        with self._lock:
+            self._workers[worker_id] = (info, time.time() + ttl)
+
+    def remove_worker(self, worker_id):
+        with self._lock:
+            self._workers.pop(worker_id, None)
+
+    def workers(self):
+        """Live worker records by worker id"""
+        now = time.time()
+        with self._lock:
+            return {wid: info for wid, (info, expires) in self._workers.items() if expires > now}
+
+
+class RedisBroker:
+    """Broker on Redis lists (queues) and expiring keys (worker records)"""
+
+    def __init__(self, url):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+        self.workers_key = f'{KEY_PREFIX}:workers'
+
+    def push(self, name, message, ttl=None):
+        key = f'{KEY_PREFIX}:queue:{name}'
+        if not ttl:
+            self.redis.rpush(key, message)
+            return
+        pipe = self.redis.pipeline()
+        pipe.rpush(key, message)
+        pipe.expire(key, max(1, int(ttl)))
+        pipe.execute()
+
+    def pop(self, name, timeout):
+        item = self.redis.blpop([f'{KEY_PREFIX}:queue:{name}'], timeout=max(1, int(timeout)))
+        return item[1] if item else None
+
+    def heartbeat(self, worker_id, info, ttl):
+        pipe = self.redis.pipeline()
+        pipe.set(f'{KEY_PREFIX}:worker:{worker_id}', json.dumps(info), ex=max(1, int(ttl)))
+        # Scored by expiry so dead workers can be pruned without a key scan
+        pipe.zadd(self.workers_key, {worker_id: time.time() + ttl})
+        pipe.execute()
+
+    def remove_worker(self, worker_id):
+        pipe = self.redis.pipeline()
+        pipe.delete(f'{KEY_PREFIX}:worker:{worker_id}')
+        pipe.zrem(self.workers_key, worker_id)
+        pipe.execute()
+
+    def workers(self):
+        now = time.time()
+        self.redis.zremrangebyscore(self.workers_key, 0, now)
+        ids = [wid.decode() for wid in self.redis.zrangebyscore(self.workers_key, now, '+inf')]
+        if not ids:
+            return {}
+        records = self.redis.mget([f'{KEY_PREFIX}:worker:{wid}' for wid in ids])
+        return {wid: json.loads(record) for wid, record in zip(ids, records) if record}
+
+
+_in_process_broker = None
+
+
+def broker_from_url(url):
+    """Create the broker for INFERENCE_BROKER_URL (redis://... or memory://)"""
+    global _in_process_broker
+    if url.startswith('memory://'):
+        if _in_process_broker is None:
+            _in_process_broker = InProcessBroker()
+        return _in_process_broker
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBroker(url)
+    raise ValueError(f"Unsupported inference broker URL: {url}")
+
+
+class RemoteInferenceClient:
+    def __init__(self, broker, node_id=None, worker_refresh=1.0):
+        """Send frames to inference workers and wait for their replies
+
+        Args:
+            broker: RedisBroker or InProcessBroker
+            node_id (str, optional): Name of this web process's reply queue
+            worker_refresh (float): Seconds between reads of the worker records
+        """
+        self.broker = broker
+        self.node_id = node_id or f"web-{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.reply_queue = f'replies:{self.node_id}'
+        self.worker_refresh = worker_refresh
+        self._workers = {}
+        self._workers_read = 0.0
+        self._in_flight = {}  # worker id -> requests sent by this node and not answered yet
+        self._pending = {}  # correlation id -> [threading.Event, reply]
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.timeouts = 0
+        self.malformed = 0
+        self._listener = None
+
+    def _ensure_listener(self):
+        # Started on first use, so it runs in the serving process (after any fork)
+        if self._listener is None:
+            with self._lock:
+                if self._listener is None:
+                    self._listener = threading.Thread(target=self._listen, name="inference-replies", daemon=True)
+                    self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                message = self.broker.pop(self.reply_queue, timeout=1.0)
+            except Exception as e:
+                logger.error(f"Error reading inference replies: {e}")
+                time.sleep(1.0)
+                continue
+            if message is None:
+                continue
+            try:
+                reply = json.loads(message)
+                if not isinstance(reply, dict):
+                    raise ValueError("reply is not an object")
+            except ValueError as e:
+                self.malformed += 1
+                logger.error(f"Skipping malformed inference reply: {e}")
+                continue
+            with self._lock:
+                waiter = self._pending.pop(reply.get('id'), None)
+            if waiter is not None:
+                waiter[1] = reply
+                waiter[0].set()
+
+    def workers(self):
+        """Live workers (cached for worker_refresh seconds)"""
+        now = time.time()
+        if now - self._workers_read >= self.worker_refresh:
+            try:
+                self._workers = self.broker.workers()
+            except Exception as e:
+                logger.error(f"Error reading inference workers: {e}")
+            self._workers_read = now
+        return self._workers
+
+    @property
+    def ready(self):
+        return bool(self.workers())
+
+    def choose_worker(self, models):
+        """Least-loaded live worker serving the models (None if no worker serves any)
+
+        Workers serving all the models are preferred. Load is the larger of the
+        worker's reported busy slots and this node's requests still in flight
+        to it, relative to its advertised capacity.
+        """
+        workers = self.workers()
+        wanted = set(models)
+        candidates = [wid for wid, info in workers.items() if wanted & set(info.get('models', ()))]
+        if not candidates:
+            return None
+        with self._lock:
+            def rank(wid):
+                info = workers[wid]
+                busy = max(info.get('busy', 0), self._in_flight.get(wid, 0))
+                return len(wanted - set(info['models'])), busy / max(1, info.get('capacity', 1))
+            return min(candidates, key=rank)
+
+    def detect(self, image_bytes, models, timeout=5.0):
+        """Run detection on a remote worker
+
+        Args:
+            image_bytes (bytes): Uploaded JPEG/PNG
+            models (list): Detector names to run
+            timeout (float): Seconds to wait for the reply
+
+        Returns:
+            dict: Reply with 'detections' (model -> [[x1, y1, x2, y2, confidence, label], ...]),
+                  'timings' (model -> seconds) and 'worker'; or 'error' (and
+                  'invalid_image') if the worker could not process the frame
+
+        Raises:
+            RemoteInferenceError: If no worker serves the models or none replied in time
+        """
+        self._ensure_listener()
+        worker_id = self.choose_worker(models)
+        if worker_id is None:
+            raise RemoteInferenceError('No inference worker available')
+        correlation_id = uuid.uuid4().hex
+        waiter = [threading.Event(), None]
+        with self._lock:
+            self._pending[correlation_id] = waiter
+            self._in_flight[worker_id] = self._in_flight.get(worker_id, 0) + 1
+        header = {'id': correlation_id, 'reply_to': self.reply_queue, 'models': list(models),
+                  'sent': time.time(), 'deadline': time.time() + timeout}
+        try:
+            self.broker.push(f'work:{worker_id}', encode_request(header, image_bytes), ttl=QUEUE_TTL)
+            self.sent += 1
+            if not waiter[0].wait(timeout):
+                self.timeouts += 1
+                raise RemoteInferenceError(f'No reply from inference worker {worker_id} within {timeout}s')
+        finally:
+            with self._lock:
+                self._pending.pop(correlation_id, None)
+                self._in_flight[worker_id] -= 1
+        return waiter[1]
+
+    def stats(self):
+        return {
+            'node_id': self.node_id,
+            'workers': self.workers(),
+            'in_flight': dict(self._in_flight),
+            'sent': self.sent,
+            'timeouts': self.timeouts,
+            'malformed': self.malformed,
+        }
+
+
+class InferenceWorker:
+    def __init__(self, broker, get_detectors, worker_id=None, capacity=1, heartbeat_interval=2.0,
+                 decode_target_size=640):
+        """Serve detection requests from the broker
+
+        Args:
+            broker: RedisBroker or InProcessBroker
+            get_detectors (callable): Returns the current name -> ObjectDetector mapping
+            worker_id (str, optional): Name of this worker's request queue
+            capacity (int): Frames processed at once (one consumer thread each); frames
+                            for the same model still take turns on its inference lock
+            heartbeat_interval (float): Seconds between heartbeats; a worker is
+                                        dropped after three missed heartbeats
+            decode_target_size (int): Model input size for reduced JPEG decoding
+        """
+        self.broker = broker
+        self.get_detectors = get_detectors
+        self.worker_id = worker_id or f"worker-{socket.gethostname()}-{os.getpid()}"
+        self.capacity = capacity
+        self.heartbeat_interval = heartbeat_interval
+        self.decode_target_size = decode_target_size
+        self.busy = 0
+        self.processed = 0
+        self.expired = 0
+        self.failed = 0
+        self.malformed = 0
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    @property
+    def running(self):
+        return bool(self._threads) and not self._stop.is_set()
+
+    def start(self):
+        threads = [threading.Thread(target=self._heartbeat_loop, name="worker-heartbeat", daemon=True)]
+        threads += [threading.Thread(target=self._consume_loop, name=f"worker-consumer-{i}", daemon=True)
+                    for i in range(self.capacity)]
+        for thread in threads:
+            thread.start()
+        self._threads = threads
+        return self
+
+    def stop(self, drain_timeout=10.0):
+        """Stop advertising, then give requests already taken a chance to finish"""
+        self._stop.set()
+        try:
+            self.broker.remove_worker(self.worker_id)
+        except Exception as e:
+            logger.error(f"Error removing worker record: {e}")
+        deadline = time.time() + drain_timeout
+        while self.busy and time.time() < deadline:
+            time.sleep(0.1)
+
+    def info(self):
+        detectors = self.get_detectors()
+        return {
+            'worker_id': self.worker_id,
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'models': sorted(name for name, d in detectors.items() if d and d.model_loaded),
+            'capacity': self.capacity,
+            'busy': self.busy,
+            'processed': self.processed,
+            'malformed': self.malformed,
+            'started': self.started,
+        }
+
+    def _heartbeat_loop(self):
+        while not self._stop.is_set():
+            try:
+                info = self.info()
+                # Only advertise once models are loaded
+                if info['models']:
+                    self.broker.heartbeat(self.worker_id, info, ttl=self.heartbeat_interval * 3)
+            except Exception as e:
+                logger.error(f"Error sending worker heartbeat: {e}")
+            self._stop.wait(self.heartbeat_interval)
+
+    def _consume_loop(self):
+        while not self._stop.is_set():
+            try:
+                message = self.broker.pop(f'work:{self.worker_id}', timeout=1.0)
+            except Exception as e:
+                logger.error(f"Error reading inference requests: {e}")
+                time.sleep(1.0)
+                continue
+            if message is None:
+                continue
+            try:
+                header, image_bytes = decode_request(message)
+            except ValueError as e:
+                with self._lock:
+                    self.malformed += 1
+                logger.error(f"Skipping {e}")
+                continue
+            if time.time() > header.get('deadline', float('inf')):
+                # The web node has given up on this frame already
+                self.expired += 1
+                continue
+            with self._lock:
+                self.busy += 1
+            try:
+                reply = self.handle(header, image_bytes)
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                logger.exception(f"Inference request {header.get('id')} failed: {e}")
+                reply = {'id': header.get('id'), 'worker': self.worker_id, 'error': str(e)}
+            finally:
+                with self._lock:
+                    self.busy -= 1
+            try:
+                self.broker.push(header['reply_to'], json.dumps(reply, separators=(',', ':')).encode('utf-8'),
+                                 ttl=QUEUE_TTL)
+            except Exception as e:
+                logger.error(f"Error sending inference reply {header['id']}: {e}")
+
+    def handle(self, header, image_bytes):
+        """Decode the frame and run the requested models on it"""
+        from app.utils.frame_decode import decode_frame
+        frame, scale = decode_frame(image_bytes, self.decode_target_size)
+        if frame is None:
+            return {'id': header['id'], 'worker': self.worker_id, 'error': 'Invalid image data',
+                    'invalid_image': True}
+        detectors = self.get_detectors()
+        detections, timings = {}, {}
+        for name in header.get('models', []):
+            detector = detectors.get(name)
+            if not (detector and detector.model_loaded):
+                continue
+            # detect() holds the model's inference lock: consumers overlap on different
+            # models (or decoding), never inside one Ultralytics predictor
+            rows, timings[name] = detector.detect(frame)
+            names = detector.model.names
+            detections[name] = [[round(float(x1) * scale, 1), round(float(y1) * scale, 1),
+                                 round(float(x2) * scale, 1), round(float(y2) * scale, 1),
+                                 round(float(conf), 4), names[int(cls)]]
+                                for x1, y1, x2, y2, conf, cls in rows.tolist()]
+        with self._lock:
+            self.processed += 1
+        return {'id': header['id'], 'worker': self.worker_id, 'detections': detections,
+                'timings': timings, 'queued': time.time() - header.get('sent', time.time())}
@@ -0,0 +1,180 @@
+"""
+Response Format Module for Pinaka-AI
+
+This module encodes /detect_frame results in a client-negotiated format:
+
+- json      the original list of detection dicts (default)
+- columnar  JSON with one array per field and class indices instead of names
+- msgpack   the columnar layout encoded as MessagePack (needs `msgpack`)
+- packed    a binary frame of little-endian typed arrays
+
+The compact formats reference classes by index into a process-wide,
+append-only class table. Clients say how many entries they already hold
+(and the table id they were built against), and each response carries only
+the entries they are missing, so class names cross the wire once per
+session. Clients can also project fields to receive only what they draw.
+
+Packed layout (all little-endian):
+    b"PKD1" | meta_len:uint32 | meta JSON (padded to 4 bytes) |
+    count:uint32 | [box:int16[count*4]] [conf:uint16[count], x10000] [class:uint16[count]]
+Columns appear in that order when present in meta["fields"]. Missing boxes
+are sent as -1.
+"""
+
+import sys
+import json
+import uuid
+import struct
+import threading
+from array import array
+
+FORMATS = ('json', 'columnar', 'msgpack', 'packed')
+MIMETYPES = {
+    'json': 'application/json',
+    'columnar': 'application/vnd.pinaka.columnar+json',
+    'msgpack': 'application/msgpack',
+    'packed': 'application/x-pinaka-packed',
+}
+# Fields a client may project; 'size' (width/height) only exists in the json format
+FIELDS = ('class', 'box', 'conf', 'size')
+DEFAULT_FIELDS = ('class', 'box', 'conf')
+PACKED_MAGIC = b'PKD1'
+CONF_SCALE = 10000
+
+
+class ClassTable:
+    """Append-only table of (label, model) pairs shared by all sessions"""
+
+    def __init__(self):
+        # Changes on every process start, so clients notice a reset table
+        self.table_id = uuid.uuid4().hex[:8]
+        self._entries = []
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def index(self, label, model):
+        key = (label, model)
+        index = self._index.get(key)
+        if index is None:
+            with self._lock:
+                index = self._index.get(key)
+                if index is None:
+                    index = self._index[key] = len(self._entries)
+                    self._entries.append([label, model])
+        return index
+
+    def delta(self, known, table_id):
+        """Entries a client is missing, as (start index, entries)"""
+        try:
+            known = int(known or 0) if table_id == self.table_id else 0
+        except (TypeError, ValueError):
+            known = 0
+        known = max(0, min(known, len(self._entries)))
+        return known, self._entries[known:]
+
+
+class_table = ClassTable()
+
+
+def negotiate(accept=None, requested=None):
+    """Pick a response format from an explicit request or the Accept header"""
+    if requested in FORMATS:
+        return requested
+    for part in (accept or '').split(','):
+        mimetype = part.split(';')[0].strip().lower()
+        for fmt, candidate in MIMETYPES.items():
+            if mimetype == candidate:
+                return fmt
+    return 'json'
+
+
+def parse_fields(fields):
+    """Normalize a projection given as a list or comma-separated string"""
+    if not fields:
+        return DEFAULT_FIELDS
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    selected = tuple(f for f in FIELDS if f in {str(x).strip() for x in fields})
+    return selected or DEFAULT_FIELDS
+
+
+def _project_dicts(results, fields):
+    keep = {'model'}
+    if 'class' in fields:
+        keep.add('label')
+    if 'box' in fields:
+        keep.update(('x1', 'y1', 'x2', 'y2'))
+    if 'conf' in fields:
+        keep.add('confidence')
+    if 'size' in fields:
+        keep.update(('width', 'height'))
+    return [{k: v for k, v in r.items() if k in keep} for r in results]
+
+
+def _columns(results, fields):
+    columns = {}
+    if 'class' in fields:
+        columns['class'] = [class_table.index(r['label'], r.get('model')) for r in results]
+    if 'box' in fields:
+        boxes = []
+        for r in results:
+            boxes.extend((r.get('x1', -1), r.get('y1', -1), r.get('x2', -1), r.get('y2', -1)))
+        columns['box'] = boxes
+    if 'conf' in fields:
+        columns['conf'] = [int(round(r['confidence'] * CONF_SCALE)) for r in results]
+    return columns
+
+
+def _little_endian(values, typecode):
+    data = array(typecode, values)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tobytes()
+
+
+def encode(results, fmt='json', fields=None, known_classes=0, table_id=None, extra=None):
+    """Encode detection results
+
+    Args:
+        results (list): Detection dicts from detections_to_results
+        fmt (str): One of FORMATS
+        fields (list|str, optional): Projection; None keeps the format's default fields
+        known_classes (int): Class table entries the client already has
+        table_id (str, optional): Table id the client's entries belong to
+        extra (dict, optional): Additional top-level keys (json/columnar/msgpack)
+
+    Returns:
+        tuple: (body bytes or str, mimetype)
+    """
+    extra = extra or {}
+    if fmt == 'json':
+        detections = _project_dicts(results, parse_fields(fields)) if fields else results
+        return json.dumps({'detections': detections, **extra}), MIMETYPES['json']
+
+    fields = tuple(f for f in parse_fields(fields) if f != 'size')
+    columns = _columns(results, fields)
+    start, entries = class_table.delta(known_classes, table_id)
+    meta = {'count': len(results), 'fields': list(fields), 'conf_scale': CONF_SCALE,
+            'table_id': class_table.table_id, 'classes_start': start, 'classes': entries}
+
+    if fmt == 'packed':
+        meta_bytes = json.dumps({**meta, **extra}, separators=(',', ':')).encode('utf-8')
+        meta_bytes += b' ' * (-len(meta_bytes) % 4)
+        parts = [PACKED_MAGIC, struct.pack('<I', len(meta_bytes)), meta_bytes, struct.pack('<I', len(results))]
+        if 'box' in columns:
+            parts.append(_little_endian(columns['box'], 'h'))
+        if 'conf' in columns:
+            parts.append(_little_endian(columns['conf'], 'H'))
+        if 'class' in columns:
+            parts.append(_little_endian(columns['class'], 'H'))
+        return b''.join(parts), MIMETYPES['packed']
+
+    body = {**meta, **columns, **extra}
+    if fmt == 'msgpack':
+        try:
+            import msgpack
+        except ImportError:
+            # Not installed: answer with the same layout as JSON
+            return json.dumps(body, separators=(',', ':')), MIMETYPES['columnar']
+        return msgpack.packb(body, use_bin_type=True), MIMETYPES['msgpack']
+    return json.dumps(body, separators=(',', ':')), MIMETYPES['columnar']
@@ -10,8 +10,6 @@ import json
 import logging
 from pathlib import Path
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class SettingsStorage:
@@ -6,12 +6,9 @@ It uses the Twilio API for sending SMS messages.
 """
 
 import os
-from twilio.rest import Client
 from datetime import datetime
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class SMSNotifier:
@@ -32,6 +29,8 @@ class SMSNotifier:
         ])
         
         if self.is_configured:
+            # Imported here so unconfigured deployments never pay for twilio
+            from twilio.rest import Client
             self.client = Client(self.account_sid, self.auth_token)
             logger.info("SMS notifier initialized with Twilio credentials")
         else:
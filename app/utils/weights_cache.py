@@ -0,0 +1,226 @@
+"""
+Weights Cache Module for Pinaka-AI
+
+This module keeps model weights in a content-addressed cache keyed by
+SHA-256. A file is hashed once; an index keyed by path, size and mtime lets
+later boots reuse the verified blob without reading it again. Blobs are
+copied once per content (not per boot), stored read-only, and loaded
+memory-mapped when the installed torch supports it, which avoids reading
+the checkpoint into a separate buffer first. The loaded model does not stay
+mapped: Ultralytics converts the fp16 checkpoint to float and cpu_plan fuses
+Conv+BN, so each worker process holds its own copy of the weights.
+
+Remote weights are fetched with resumable, checksum-verified downloads.
+
+Layout:
+    <cache_dir>/sha256/<digest><ext>   read-only weight blobs
+    <cache_dir>/index.json             path -> (size, mtime, digest)
+    <cache_dir>/partial/               interrupted downloads
+"""
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import urllib.request
+import urllib.error
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ChecksumError(Exception):
+    """Raised when downloaded or cached weights don't match their SHA-256"""
+
+
+def google_drive_download_url(share_url):
+    """Turn a Google Drive share link into a direct download URL"""
+    match = re.search(r'/d/([\w-]+)', share_url)
+    if not match:
+        raise ValueError(f"Invalid Google Drive link: {share_url}")
+    return f'https://drive.google.com/uc?export=download&id={match.group(1)}'
+
+
+@contextmanager
+def mmap_loading():
+    """Make torch.load memory-map checkpoints while the block runs
+
+    This only saves the read into a load buffer; the model built from the
+    checkpoint owns converted copies of the tensors. Needs torch >= 2.5
+    (torch.utils.serialization.config); older versions load normally.
+    """
+    try:
+        from torch.utils.serialization import config as serialization_config
+        load_config = serialization_config.load
+        previous = load_config.mmap
+    except (ImportError, AttributeError):
+        yield False
+        return
+    load_config.mmap = True
+    try:
+        yield True
+    finally:
+        load_config.mmap = previous
+
+
+class WeightsCache:
+    def __init__(self, cache_dir=None):
+        """Initialize the cache
+
+        Args:
+            cache_dir (str, optional): Cache root; defaults to MODEL_CACHE_DIR or models/.cache
+        """
+        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.cache_dir = cache_dir or os.environ.get('MODEL_CACHE_DIR') or \
+            os.path.join(base_dir, 'models', '.cache')
+        self.blobs_dir = os.path.join(self.cache_dir, 'sha256')
+        self.partial_dir = os.path.join(self.cache_dir, 'partial')
+        self.index_file = os.path.join(self.cache_dir, 'index.json')
+        self._lock = threading.Lock()
+
+    def _load_index(self):
+        try:
+            with open(self.index_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.index-', suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f, indent=4)
+        os.replace(tmp_path, self.index_file)
+
+    @staticmethod
+    def hash_file(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def blob_path(self, sha256, ext='.pt'):
+        return os.path.join(self.blobs_dir, f"{sha256}{ext}")
+
+    def resolve(self, path, sha256=None):
+        """Return the verified cache blob for a local weights file
+
+        The file is hashed only when its size or mtime changed since it was
+        last seen. If sha256 is given, the file must match it.
+
+        Raises:
+            ChecksumError: If the file doesn't match the expected sha256
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        ext = os.path.splitext(path)[1] or '.pt'
+        with self._lock:
+            index = self._load_index()
+            entry = index.get(path)
+            if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns \
+                    and os.path.exists(self.blob_path(entry['sha256'], ext)):
+                if sha256 and entry['sha256'] != sha256:
+                    raise ChecksumError(f"{path} has sha256 {entry['sha256']}, expected {sha256}")
+                return self.blob_path(entry['sha256'], ext)
+
+        digest = self.hash_file(path)
+        if sha256 and digest != sha256:
+            raise ChecksumError(f"{path} has sha256 {digest}, expected {sha256}")
+        blob = self._store(path, digest, ext)
+
+        with self._lock:
+            index = self._load_index()
+            index[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}
+            self._save_index(index)
+        logger.info(f"Cached {os.path.basename(path)} as {os.path.basename(blob)}")
+        return blob
+
+    def _store(self, path, digest, ext):
+        """Copy a file into the blob store
+
+        A copy rather than a hard link: deploy scripts overwrite weights in
+        place, which would silently change a linked blob.
+        """
+        blob = self.blob_path(digest, ext)
+        if os.path.exists(blob):
+            return blob
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.blobs_dir, prefix='.incoming-')
+        os.close(fd)
+        shutil.copyfile(path, tmp_path)
+        if self.hash_file(tmp_path) != digest:
+            os.remove(tmp_path)
+            raise ChecksumError(f"{path} changed while it was being cached")
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, blob)
+        return blob
+
+    def fetch(self, url, sha256=None, ext='.pt', timeout=60):
+        """Download weights into the cache, resuming an interrupted download
+
+        Args:
+            url (str): HTTP(S) URL of the weights
+            sha256 (str, optional): Expected digest; the download is rejected if it differs.
+                Without it the blob is stored under the digest of what was downloaded.
+            ext (str): File extension for the blob
+            timeout (float): Socket timeout in seconds
+
+        Returns:
+            str: Path of the verified blob
+
+        Raises:
+            ChecksumError: If the completed download doesn't match sha256
+        """
+        if sha256 and os.path.exists(self.blob_path(sha256, ext)):
+            return self.blob_path(sha256, ext)
+
+        os.makedirs(self.partial_dir, exist_ok=True)
+        key = sha256 or hashlib.sha256(url.encode('utf-8')).hexdigest()
+        partial = os.path.join(self.partial_dir, f"{key}{ext}.part")
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+
+        request = urllib.request.Request(url)
+        if offset:
+            request.add_header('Range', f'bytes={offset}-')
+        logger.info(f"Downloading model weights from {url}" + (f" (resuming at {offset} bytes)" if offset else ""))
+        try:
+            response = urllib.request.urlopen(request, timeout=timeout)
+        except urllib.error.HTTPError as e:
+            if e.code != 416:
+                raise
+            # Range not satisfiable: the partial file is already complete
+            response = None
+
+        if response is not None:
+            with response:
+                # A 200 means the server ignored the range; start over
+                mode = 'ab' if offset and response.status == 206 else 'wb'
+                with open(partial, mode) as f:
+                    for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                        f.write(chunk)
+
+        digest = self.hash_file(partial)
+        if sha256 and digest != sha256:
+            os.remove(partial)
+            raise ChecksumError(f"Download from {url} has sha256 {digest}, expected {sha256}")
+        if not sha256:
+            logger.warning(f"No checksum configured for {url}; stored as {digest}")
+
+        blob = self.blob_path(digest, ext)
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.chmod(partial, 0o444)
+        os.replace(partial, blob)
+        logger.info(f"Downloaded and verified {os.path.basename(blob)}")
+        return blob
+
+    def verify(self, blob):
+        """Re-hash a blob and compare it with the digest in its name"""
+        digest = os.path.splitext(os.path.basename(blob))[0]
+        return os.path.exists(blob) and self.hash_file(blob) == digest
@@ -0,0 +1,184 @@
+# ASGI entry point: serves the app with Uvicorn instead of gunicorn + eventlet.
+#   uvicorn asgi:app --host 0.0.0.0 --port $PORT
+#
+# The hot paths (/detect_frame, health probes, SMS APIs and a streaming alert
+# feed) are native async routes; blocking detection work is awaited in a
+# thread pool. Socket.IO runs on python-socketio's AsyncServer. All other
+# routes (pages, settings, history, metrics, admin) are served by the same
+# Flask app mounted as WSGI.
+import importlib.util
+import os
+import time
+import json
+import asyncio
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Mark this as a production environment
+os.environ['RENDER'] = 'true'
+
+# Disable CUDA to save memory
+os.environ['CUDA_VISIBLE_DEVICES'] = ''
+
+# Disable Torch optimization for deployment
+os.environ['PYTORCH_NO_CUDA_MEMORY_CACHING'] = '1'
+
+# Set up other environment variables
+os.environ['ULTRALYTICS_NO_CACHE'] = '1'
+os.environ['YOLO_CONFIG_DIR'] = '/tmp/yolo_config'
+os.environ['XDG_CONFIG_HOME'] = '/tmp/.config'
+
+# Models are loaded at start-up (below), after detectors have been pointed at
+# the async Socket.IO server
+os.environ['MODEL_LOAD_ON_IMPORT'] = '0'
+
+for directory in ['/tmp/yolo_config', '/tmp/.config']:
+    os.makedirs(directory, exist_ok=True)
+
+import socketio
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from a2wsgi import WSGIMiddleware
+
+# Load app.py the same way wsgi.py does
+print("Loading application (ASGI)...")
+spec = importlib.util.spec_from_file_location("app_module",
+                                              os.path.join(os.path.dirname(__file__), "app.py"))
+app_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(app_module)
+
+from app.utils.async_bridge import AsyncSocketIOBridge
+from app.utils.metrics import ServerTiming, REQUEST_LATENCY
+from app.utils.profiling import profiler
+from app.utils.fair_scheduler import forwarded_address
+
+sio = socketio.AsyncServer(async_mode='asgi')
+bridge = AsyncSocketIOBridge(sio)
+app_module.model_loader.socketio = bridge
+app_module.model_cache.socketio = bridge
+app_module.clip_recorder.socketio = bridge
+app_module.batch_jobs.socketio = bridge
+# The native routes skip the Flask request hooks and run on pool threads, so a
+# cProfile session could not follow them; the stack sampler sees every thread
+profiler.modes = ('sample',)
+
+# Blocking detection work runs here; the event loop only does I/O. Inference
+# itself is still bounded by INFERENCE_CONCURRENCY (app/utils/executor.py).
+detection_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('ASGI_DETECTION_THREADS', 8)),
+                                    thread_name_prefix='detect')
+
+
+def _observe(endpoint, timing, status):
+    REQUEST_LATENCY.observe(time.perf_counter() - timing.start, endpoint=endpoint, status=status)
+
+
+async def detect_frame(request):
+    """Receive a frame, run detection in the thread pool and return the results"""
+    timing = ServerTiming()
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    loop = asyncio.get_running_loop()
+    # Same client address as ProxyFix gives the Flask routes (TRUSTED_PROXY_HOPS)
+    client_address = forwarded_address(request.client.host if request.client else None,
+                                       request.headers.get('x-forwarded-for'), app_module.TRUSTED_PROXY_HOPS)
+    body, status, headers = await loop.run_in_executor(detection_pool, app_module.run_detection, data, timing,
+                                                       client_address)
+    with timing.stage('serialize'):
+        payload, mimetype = app_module.encode_detection_response(body, status, data,
+                                                                 request.headers.get('accept'))
+        response = Response(payload, status_code=status, media_type=mimetype,
+                            headers={**headers, 'Vary': 'Accept'})
+    response.headers['Server-Timing'] = timing.header()
+    _observe('detect_frame', timing, status)
+    return response
+
+
+async def health_live(request):
+    """Liveness probe: the process is up and serving requests"""
+    return JSONResponse({"status": "alive", "server": "asgi", "time": time.strftime("%Y-%m-%d %H:%M:%S")})
+
+
+async def health_ready(request):
+    """Readiness probe: models are loaded and warmed up"""
+    return JSONResponse(app_module.model_loader.status(),
+                        status_code=200 if app_module.detection_ready() else 503)
+
+
+async def sms_status(request):
+    """Check SMS notification status"""
+    config = app_module.config
+    return JSONResponse({
+        'sms_enabled': config.sms_enabled,
+        'sms_objects': config.sms_objects,
+        'sms_cooldown': config.sms_cooldown
+    })
+
+
+async def toggle_sms(request):
+    """Toggle SMS notifications on/off"""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not data or 'enabled' not in data:
+        return JSONResponse({'success': False, 'error': 'Invalid request'}, status_code=400)
+    config = app_module.config
+    config.sms_enabled = bool(data['enabled'])
+    await asyncio.get_running_loop().run_in_executor(detection_pool, config.save_settings)
+    return JSONResponse({'success': True, 'sms_enabled': config.sms_enabled})
+
+
+async def alert_stream(request):
+    """Stream detection alerts as Server-Sent Events"""
+    async def events():
+        async for event, data in bridge.subscribe():
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return StreamingResponse(events(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache'})
+
+
+@sio.event
+async def connect(sid, environ):
+    print('Client connected')
+
+
+@sio.event
+async def disconnect(sid):
+    print('Client disconnected')
+
+
+@contextlib.asynccontextmanager
+async def lifespan(starlette_app):
+    bridge.bind(asyncio.get_running_loop())
+    app_module.start_model_loading()
+    yield
+    detection_pool.shutdown(wait=False)
+
+
+starlette_app = Starlette(
+    routes=[
+        Route('/detect_frame', detect_frame, methods=['POST']),
+        Route('/health/live', health_live),
+        Route('/health/ready', health_ready),
+        Route('/api/sms_status', sms_status),
+        Route('/api/toggle_sms', toggle_sms, methods=['POST']),
+        Route('/api/alerts/stream', alert_stream),
+        # Everything else is served by the Flask app
+        Mount('/', app=WSGIMiddleware(app_module.app)),
+    ],
+    lifespan=lifespan,
+)
+
+# Socket.IO handles /socket.io/ and passes every other request to Starlette
+app = socketio.ASGIApp(sio, other_asgi_app=starlette_app)
+application = app
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get("PORT", 10000)))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Import-Time Budget Check for the Pinaka-AI Web Process
+This script imports app.py the same way wsgi.py does, under
+`python -X importtime`, and reports where cold-start time goes. It exits
+non-zero when the import time or wall time exceeds the budget in
+import_budget.json, or when a heavy dependency that should be lazy
+(torch, ultralytics, cv2, twilio, ...) is imported at start-up.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_BUDGET = Path(__file__).resolve().parent / "import_budget.json"
+
+# Mirrors wsgi.py: load app.py as a module without starting model loading
+IMPORT_SNIPPET = (
+    "import importlib.util; "
+    "spec = importlib.util.spec_from_file_location('app_module', 'app.py'); "
+    "module = importlib.util.module_from_spec(spec); "
+    "spec.loader.exec_module(module)"
+)
+
+
+def parse_importtime(stderr):
+    """Parse `-X importtime` output into (depth, self_us, cumulative_us, name) tuples"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        raw_name = fields[2]
+        stripped = raw_name.lstrip()
+        depth = (len(raw_name) - len(stripped) - 1) // 2
+        entries.append((depth, int(fields[0]), int(fields[1]), stripped.strip()))
+    return entries
+
+
+def measure(python, runs):
+    """Run the import in fresh interpreters and return the fastest run"""
+    env = dict(os.environ, MODEL_LOAD_ON_IMPORT="0", PYTHONDONTWRITEBYTECODE="1")
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([python, "-X", "importtime", "-c", IMPORT_SNIPPET],
+                                cwd=ROOT_DIR, env=env, capture_output=True, text=True)
+        wall_ms = (time.perf_counter() - start) * 1000
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing app.py failed:\n{result.stderr[-2000:]}")
+        entries = parse_importtime(result.stderr)
+        import_ms = sum(cumulative for depth, _, cumulative, _ in entries if depth == 0) / 1000
+        if best is None or import_ms < best["import_ms"]:
+            best = {"import_ms": import_ms, "wall_ms": wall_ms, "entries": entries}
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the web process import-time budget")
+    parser.add_argument("--budget", default=str(DEFAULT_BUDGET), help="Budget JSON file")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreter runs (fastest is kept)")
+    parser.add_argument("--top", type=int, default=15, help="Number of heaviest imports to list")
+    parser.add_argument("--python", default=sys.executable, help="Interpreter to measure")
+    args = parser.parse_args()
+
+    budget = json.loads(Path(args.budget).read_text())
+    print("⏱️ Measuring web process import time...")
+    try:
+        result = measure(args.python, args.runs)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return False
+
+    entries = result["entries"]
+    top_level = sorted((e for e in entries if e[0] == 0), key=lambda e: e[2], reverse=True)
+    print("\nHeaviest top-level imports:")
+    for _, _, cumulative, name in top_level[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    print(f"\nImport time: {result['import_ms']:.1f} ms (budget {budget['max_import_ms']} ms)")
+    print(f"Wall time:   {result['wall_ms']:.1f} ms (budget {budget['max_wall_ms']} ms)")
+
+    failures = []
+    if result["import_ms"] > budget["max_import_ms"]:
+        failures.append(f"import time {result['import_ms']:.1f} ms exceeds {budget['max_import_ms']} ms")
+    if result["wall_ms"] > budget["max_wall_ms"]:
+        failures.append(f"wall time {result['wall_ms']:.1f} ms exceeds {budget['max_wall_ms']} ms")
+
+    imported = {name for _, _, _, name in entries}
+    for module in budget.get("forbidden", []):
+        if module in imported:
+            failures.append(f"'{module}' is imported at start-up; it should be imported lazily")
+
+    if failures:
+        print("\n❌ Import budget exceeded:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return False
+    print("\n✅ Import budget met")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+End-to-End Load Test for the Pinaka-AI Serving Path
+This script starts the web app with the real models (or targets a running
+server), replays the validation images as simulated cameras against
+/detect_frame and listens for Socket.IO alerts. It reports throughput,
+latency percentiles, drop rates and server memory, writes the results as
+JSON and compares them to a stored baseline.
+"""
+
+import os
+import sys
+import math
+import json
+import time
+import base64
+import signal
+import argparse
+import platform
+import threading
+import subprocess
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_IMAGE_DIR = ROOT_DIR / "custom_dataset" / "images" / "val"
+DEFAULT_RESULTS = Path(__file__).resolve().parent / "results" / "load_test.json"
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# Metrics compared against the baseline: (path in results, direction, threshold arg name)
+# direction 'lower' means smaller is better.
+REGRESSION_CHECKS = [
+    (("http", "latency_ms", "p50"), "lower", "latency_threshold"),
+    (("http", "latency_ms", "p95"), "lower", "latency_threshold"),
+    (("http", "latency_ms", "p99"), "lower", "latency_threshold"),
+    (("http", "throughput_fps"), "higher", "throughput_threshold"),
+    (("http", "drop_rate"), "lower", "drop_threshold"),
+    (("server", "rss_mb", "peak"), "lower", "memory_threshold"),
+]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize_latencies(latencies_s):
+    latencies_ms = [v * 1000 for v in latencies_s]
+    return {
+        "count": len(latencies_ms),
+        "mean": sum(latencies_ms) / len(latencies_ms) if latencies_ms else None,
+        "p50": percentile(latencies_ms, 50),
+        "p95": percentile(latencies_ms, 95),
+        "p99": percentile(latencies_ms, 99),
+        "max": max(latencies_ms) if latencies_ms else None,
+    }
+
+
+def load_images(image_dir, limit):
+    """Read validation JPEGs once and keep them base64-encoded in memory"""
+    paths = sorted(Path(image_dir).glob("*.jpg"))[:limit]
+    if not paths:
+        raise FileNotFoundError(f"No .jpg images found in {image_dir}")
+    return [base64.b64encode(p.read_bytes()).decode("ascii") for p in paths]
+
+
+class ServerProcess:
+    """Runs the app under gunicorn the same way production does"""
+
+    def __init__(self, command, port):
+        self.command = command.format(port=port)
+        self.port = port
+        self.process = None
+
+    def start(self):
+        print(f"🚀 Starting server: {self.command}")
+        self.process = subprocess.Popen(self.command, shell=True, cwd=ROOT_DIR,
+                                        start_new_session=True)
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            os.killpg(self.process.pid, signal.SIGTERM)
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                os.killpg(self.process.pid, signal.SIGKILL)
+
+
+def wait_for_server(session, base_url, timeout):
+    """Poll readiness until the server answers (with models loaded where supported)"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        for path in ("/health/ready", "/health"):
+            try:
+                response = session.get(base_url + path, timeout=2)
+                if response.status_code == 200:
+                    return True
+                if response.status_code != 404:
+                    break
+            except Exception:
+                break
+        time.sleep(1)
+    return False
+
+
+class MemorySampler(threading.Thread):
+    """Samples the RSS of the server process tree"""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        import psutil
+        try:
+            root = psutil.Process(self.pid)
+        except psutil.NoSuchProcess:
+            return
+        while not self._stop_event.is_set():
+            try:
+                processes = [root] + root.children(recursive=True)
+                rss = sum(p.memory_info().rss for p in processes if p.is_running())
+                self.samples.append(rss / (1024 * 1024))
+            except psutil.Error:
+                pass
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def summary(self):
+        if not self.samples:
+            return {"peak": None, "mean": None, "final": None}
+        return {
+            "peak": max(self.samples),
+            "mean": sum(self.samples) / len(self.samples),
+            "final": self.samples[-1],
+        }
+
+
+class SimulatedCamera(threading.Thread):
+    """Posts frames to /detect_frame at a fixed rate, like one browser tab
+
+    Frames are scheduled on a fixed clock. While a request is in flight the
+    camera keeps at most one frame outstanding; frames whose slot passes
+    in the meantime are counted as dropped.
+    """
+
+    def __init__(self, index, base_url, images, fps, duration, timeout):
+        super().__init__(daemon=True)
+        self.camera_id = f"loadtest-{index}"
+        self.base_url = base_url
+        self.images = images
+        self.offset = index
+        self.interval = 1.0 / fps
+        self.duration = duration
+        self.timeout = timeout
+        self.latencies = []
+        self.sent = 0
+        self.ok = 0
+        self.errors = 0
+        self.dropped = 0
+        self.status_counts = {}
+
+    def run(self):
+        import requests
+        session = requests.Session()
+        start = time.perf_counter()
+        next_slot = start
+        frame_index = self.offset
+        while True:
+            now = time.perf_counter()
+            if now - start >= self.duration:
+                break
+            if now < next_slot:
+                time.sleep(next_slot - now)
+            payload = {"image": self.images[frame_index % len(self.images)], "camera_id": self.camera_id}
+            frame_index += 1
+            sent_at = time.perf_counter()
+            self.sent += 1
+            try:
+                response = session.post(self.base_url + "/detect_frame", json=payload, timeout=self.timeout)
+                elapsed = time.perf_counter() - sent_at
+                self.status_counts[response.status_code] = self.status_counts.get(response.status_code, 0) + 1
+                if response.status_code == 200:
+                    self.ok += 1
+                    self.latencies.append(elapsed)
+                else:
+                    self.errors += 1
+            except Exception:
+                self.errors += 1
+            # Skip the slots that passed while this frame was in flight
+            next_slot += self.interval
+            done = time.perf_counter()
+            if done > next_slot:
+                missed = int((done - next_slot) / self.interval) + 1
+                self.dropped += missed
+                next_slot += missed * self.interval
+
+
+class AlertListener:
+    """Socket.IO client counting detection_alert events and their delivery delay"""
+
+    def __init__(self, base_url):
+        import socketio
+        self.client = socketio.Client(reconnection=False)
+        self.base_url = base_url
+        self.alerts = 0
+        self.delays = []
+        self.connect_time = None
+        self.client.on("detection_alert", self._on_alert)
+
+    def _on_alert(self, data):
+        self.alerts += 1
+        if isinstance(data, dict) and data.get("timestamp"):
+            self.delays.append(max(0.0, time.time() - float(data["timestamp"])))
+
+    def connect(self):
+        start = time.perf_counter()
+        self.client.connect(self.base_url, transports=["websocket", "polling"])
+        self.connect_time = time.perf_counter() - start
+
+    def disconnect(self):
+        self.client.disconnect()
+
+    def summary(self):
+        return {
+            "connect_ms": self.connect_time * 1000 if self.connect_time is not None else None,
+            "alerts_received": self.alerts,
+            "alert_delay_ms": summarize_latencies(self.delays),
+        }
+
+
+def run_load_test(args, base_url, server_pid):
+    images = load_images(args.image_dir, args.max_images)
+    print(f"🖼️ Loaded {len(images)} images from {args.image_dir}")
+
+    listener = None
+    if args.socketio:
+        try:
+            listener = AlertListener(base_url)
+            listener.connect()
+        except Exception as e:
+            print(f"⚠️ Socket.IO listener unavailable: {e}")
+            listener = None
+
+    sampler = MemorySampler(server_pid) if server_pid else None
+    if sampler:
+        sampler.start()
+
+    cameras = [SimulatedCamera(i, base_url, images, args.fps, args.duration, args.timeout)
+               for i in range(args.cameras)]
+    print(f"📹 Replaying {args.cameras} camera(s) at {args.fps} fps for {args.duration}s...")
+    wall_start = time.perf_counter()
+    for camera in cameras:
+        camera.start()
+    for camera in cameras:
+        camera.join()
+    wall_time = time.perf_counter() - wall_start
+
+    if sampler:
+        sampler.stop()
+    if listener:
+        time.sleep(1)
+        listener.disconnect()
+
+    latencies = [lat for camera in cameras for lat in camera.latencies]
+    sent = sum(c.sent for c in cameras)
+    ok = sum(c.ok for c in cameras)
+    dropped = sum(c.dropped for c in cameras)
+    errors = sum(c.errors for c in cameras)
+    status_counts = {}
+    for camera in cameras:
+        for status, count in camera.status_counts.items():
+            status_counts[str(status)] = status_counts.get(str(status), 0) + count
+    scheduled = sent + dropped
+
+    return {
+        "config": {
+            "cameras": args.cameras,
+            "fps": args.fps,
+            "duration_s": args.duration,
+            "images": len(images),
+            "server_command": None if args.url else args.server_command,
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "http": {
+            "wall_time_s": wall_time,
+            "frames_scheduled": scheduled,
+            "frames_sent": sent,
+            "frames_ok": ok,
+            "frames_dropped": dropped,
+            "errors": errors,
+            "status_counts": status_counts,
+            "throughput_fps": ok / wall_time if wall_time else 0.0,
+            "drop_rate": dropped / scheduled if scheduled else 0.0,
+            "error_rate": errors / sent if sent else 0.0,
+            "latency_ms": summarize_latencies(latencies),
+        },
+        "socketio": listener.summary() if listener else None,
+        "server": {"rss_mb": sampler.summary() if sampler else {"peak": None, "mean": None, "final": None}},
+    }
+
+
+def _lookup(results, path):
+    value = results
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare_to_baseline(results, baseline, thresholds):
+    """Return a list of (metric, baseline, current, change, regressed) rows"""
+    rows = []
+    for path, direction, threshold_name in REGRESSION_CHECKS:
+        base = _lookup(baseline, path)
+        current = _lookup(results, path)
+        if base is None or current is None:
+            continue
+        threshold = thresholds[threshold_name]
+        if direction == "lower":
+            # Rates near zero would make relative change meaningless
+            allowed = base * (1 + threshold) if base > 0.01 else base + threshold
+            regressed = current > allowed
+        else:
+            allowed = base * (1 - threshold)
+            regressed = current < allowed
+        change = (current - base) / base if base else 0.0
+        rows.append((".".join(path), base, current, change, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Pinaka-AI serving path")
+    parser.add_argument("--url", help="Target an already running server instead of starting one")
+    parser.add_argument("--server-command",
+                        default="gunicorn --worker-class eventlet -w 1 --timeout 120 --bind 127.0.0.1:{port} wsgi:app",
+                        help="Command used to start the server ({port} is substituted)")
+    parser.add_argument("--port", type=int, default=5055, help="Port for the started server")
+    parser.add_argument("--startup-timeout", type=float, default=300, help="Seconds to wait for readiness")
+    parser.add_argument("--cameras", type=int, default=2, help="Number of simulated cameras")
+    parser.add_argument("--fps", type=float, default=5.0, help="Frames per second per camera")
+    parser.add_argument("--duration", type=float, default=60.0, help="Test duration in seconds")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--image-dir", default=str(DEFAULT_IMAGE_DIR), help="Directory of JPEG frames to replay")
+    parser.add_argument("--max-images", type=int, default=200, help="Maximum number of images to load")
+    parser.add_argument("--no-socketio", dest="socketio", action="store_false",
+                        help="Do not connect a Socket.IO alert listener")
+    parser.add_argument("--output", default=str(DEFAULT_RESULTS), help="Where to write the JSON results")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--latency-threshold", type=float, default=0.15, help="Allowed relative latency increase")
+    parser.add_argument("--throughput-threshold", type=float, default=0.10, help="Allowed relative throughput drop")
+    parser.add_argument("--drop-threshold", type=float, default=0.05, help="Allowed drop-rate increase")
+    parser.add_argument("--memory-threshold", type=float, default=0.15, help="Allowed relative peak RSS increase")
+    args = parser.parse_args()
+
+    import requests
+
+    print("⏱️ Pinaka-AI end-to-end load test")
+    server = None
+    server_pid = None
+    base_url = args.url.rstrip("/") if args.url else f"http://127.0.0.1:{args.port}"
+    try:
+        if not args.url:
+            server = ServerProcess(args.server_command, args.port)
+            server.start()
+            server_pid = server.process.pid
+
+        print(f"⏳ Waiting for {base_url} to become ready...")
+        if not wait_for_server(requests.Session(), base_url, args.startup_timeout):
+            print(f"❌ Server did not become ready within {args.startup_timeout}s")
+            return False
+
+        results = run_load_test(args, base_url, server_pid)
+    finally:
+        if server:
+            server.stop()
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(results, indent=2))
+
+    http = results["http"]
+    latency = http["latency_ms"]
+    print("\nResults:")
+    print(f"Throughput: {http['throughput_fps']:.2f} frames/s ({http['frames_ok']} ok of {http['frames_scheduled']} scheduled)")
+    if latency["count"]:
+        print(f"Latency: p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms, p99 {latency['p99']:.1f} ms")
+    print(f"Drop rate: {http['drop_rate']:.1%}, error rate: {http['error_rate']:.1%}")
+    if results["server"]["rss_mb"]["peak"] is not None:
+        print(f"Server RSS: peak {results['server']['rss_mb']['peak']:.0f} MB")
+    if results["socketio"]:
+        print(f"Socket.IO alerts received: {results['socketio']['alerts_received']}")
+    print(f"Results written to {output_path}")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(results, indent=2))
+        print(f"✅ Baseline saved to {baseline_path}")
+        return True
+
+    if not baseline_path.exists():
+        print(f"ℹ️ No baseline at {baseline_path}; run with --save-baseline to create one")
+        return True
+
+    thresholds = {
+        "latency_threshold": args.latency_threshold,
+        "throughput_threshold": args.throughput_threshold,
+        "drop_threshold": args.drop_threshold,
+        "memory_threshold": args.memory_threshold,
+    }
+    rows = compare_to_baseline(results, json.loads(baseline_path.read_text()), thresholds)
+    print("\nComparison to baseline:")
+    regressions = 0
+    for metric, base, current, change, regressed in rows:
+        marker = "❌" if regressed else "✅"
+        print(f"{marker} {metric}: {base:.3f} -> {current:.3f} ({change:+.1%})")
+        regressions += regressed
+    if regressions:
+        print(f"\n❌ {regressions} metric(s) regressed beyond thresholds")
+        return False
+    print("\n✅ No regressions against baseline")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Detection Parity Check for Pinaka-AI Inference Paths
+This script runs a reference and a candidate inference configuration (model,
+backend, inference path, decode mode) over the validation images and checks
+that the candidate finds the same objects. Detections are matched by class and
+IoU. It reports per-class precision/recall against the labels for both
+configurations, the maximum box and confidence drift between matched
+detections and the latency difference, writes the results as JSON and exits 1
+when a tolerance is exceeded.
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.load_test import percentile  # noqa: E402
+
+DEFAULT_IMAGE_DIR = ROOT_DIR / "custom_dataset" / "images" / "val"
+DEFAULT_RESULTS = Path(__file__).resolve().parent / "results" / "parity_check.json"
+DEFAULT_MODEL = ROOT_DIR / "models" / "custom_yolo_model.pt"
+EXPORT_DIR = ROOT_DIR / "models" / "exports"
+
+# Backends: the eager model through the Ultralytics predictor or the lean path,
+# or an Ultralytics export format
+BACKENDS = ("pytorch", "lean", "torchscript", "onnx", "openvino")
+DECODE_MODES = ("full", "reduced")
+
+
+def parse_config(text, default_model):
+    """Parse 'backend=lean,imgsz=640,decode=reduced,optimize=1,model=path' into a config dict"""
+    config = {"model": str(default_model), "backend": "pytorch", "imgsz": 640,
+              "decode": "full", "optimize": False}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        key, _, value = part.partition("=")
+        if key not in config:
+            raise ValueError(f"Unknown configuration key '{key}' in '{text}'")
+        if key == "imgsz":
+            value = int(value)
+        elif key == "optimize":
+            value = value.lower() in ("1", "true", "yes")
+        config[key] = value
+    if config["backend"] not in BACKENDS:
+        raise ValueError(f"Unknown backend '{config['backend']}'; choose from {', '.join(BACKENDS)}")
+    if config["decode"] not in DECODE_MODES:
+        raise ValueError(f"Unknown decode mode '{config['decode']}'; choose from {', '.join(DECODE_MODES)}")
+    return config
+
+
+def describe(config):
+    return ",".join(f"{k}={v}" for k, v in config.items())
+
+
+def export_weights(model_path, backend, imgsz):
+    """Export once per (model, backend, imgsz), sharing the cache of 04_test_model.py --benchmark"""
+    import os
+    from ultralytics import YOLO
+    target_dir = EXPORT_DIR / f"{Path(model_path).stem}_{backend}_{imgsz}_b1"
+    existing = list(target_dir.glob("*")) if target_dir.exists() else []
+    if existing:
+        return str(existing[0])
+    print(f"   Exporting {Path(model_path).name} to {backend} (imgsz={imgsz})...")
+    exported = YOLO(str(model_path)).export(format=backend, imgsz=imgsz, batch=1, verbose=False)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    moved = target_dir / Path(exported).name
+    os.replace(exported, moved)
+    return str(moved)
+
+
+class Runner:
+    """Decodes an image and runs one configuration on it"""
+
+    def __init__(self, config, name):
+        from ultralytics import YOLO
+        from app.utils.cpu_plan import cpu_plan
+        from app.utils.lean_inference import LeanPredictor, supports_lean
+        self.config = config
+        backend = config["backend"]
+        weights = config["model"] if backend in ("pytorch", "lean") else export_weights(
+            config["model"], backend, config["imgsz"])
+        self.model = YOLO(weights, task="detect")
+        if config["optimize"]:
+            cpu_plan.optimize(self.model, name)
+        self.names = self.model.names
+        self.lean = None
+        if backend == "lean":
+            if not supports_lean(self.model):
+                raise ValueError(f"{weights} cannot run on the lean path")
+            channels_last = cpu_plan.models.get(name, {}).get("channels_last", False)
+            self.lean = LeanPredictor(self.model, imgsz=config["imgsz"], channels_last=channels_last)
+
+    def decode(self, data):
+        """Decode to a BGR frame; returns (frame, scale back to source coordinates)"""
+        import cv2
+        import numpy as np
+        if self.config["decode"] == "reduced":
+            from app.utils.frame_decode import decode_frame
+            return decode_frame(data, self.config["imgsz"])
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR), 1
+
+    def __call__(self, data):
+        """Detect objects in encoded image bytes
+
+        Returns:
+            tuple: ((N, 6) array in source image coordinates, seconds including decode)
+        """
+        from app.utils.cpu_plan import cpu_plan
+        from app.utils.lean_inference import standard_detections
+        start = time.perf_counter()
+        frame, scale = self.decode(data)
+        with cpu_plan.inference_context():
+            if self.lean is not None:
+                detections = self.lean(frame)
+            else:
+                detections = standard_detections(self.model(frame, imgsz=self.config["imgsz"], verbose=False))
+        elapsed = time.perf_counter() - start
+        detections[:, :4] *= scale
+        return detections, elapsed
+
+
+def image_shape(data):
+    """(height, width) of an encoded image, from the JPEG header when possible"""
+    from app.utils.frame_decode import jpeg_dimensions
+    dimensions = jpeg_dimensions(data)
+    if dimensions:
+        return dimensions[1], dimensions[0]
+    import cv2
+    import numpy as np
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR).shape[:2]
+
+
+def load_labels(image_path, label_dir, image_shape):
+    """YOLO-format labels for an image as an (N, 6) array (confidence 1), or None if unlabelled"""
+    import numpy as np
+    label_path = Path(label_dir) / f"{image_path.stem}.txt"
+    if not label_path.exists():
+        return None
+    height, width = image_shape[:2]
+    rows = []
+    for line in label_path.read_text().splitlines():
+        parts = line.split()
+        if len(parts) < 5:
+            continue
+        cls, cx, cy, w, h = int(parts[0]), *map(float, parts[1:5])
+        rows.append([(cx - w / 2) * width, (cy - h / 2) * height,
+                     (cx + w / 2) * width, (cy + h / 2) * height, 1.0, cls])
+    return np.array(rows, dtype=np.float32).reshape(-1, 6)
+
+
+class ClassCounts:
+    """True positives, false positives and false negatives per class"""
+
+    def __init__(self):
+        self.counts = {}
+
+    def add(self, truth, detections, iou_threshold):
+        from app.utils.lean_inference import match_detections
+        match = match_detections(truth, detections, iou_threshold)
+        for i, j, _ in match["pairs"]:
+            self._bump(int(detections[j, 5]), "tp")
+        for j in match["unmatched_candidate"]:
+            self._bump(int(detections[j, 5]), "fp")
+        for i in match["unmatched_reference"]:
+            self._bump(int(truth[i, 5]), "fn")
+
+    def _bump(self, cls, key):
+        self.counts.setdefault(cls, {"tp": 0, "fp": 0, "fn": 0})[key] += 1
+
+    def summary(self, names):
+        result = {}
+        for cls, c in sorted(self.counts.items()):
+            predicted, actual = c["tp"] + c["fp"], c["tp"] + c["fn"]
+            result[names.get(cls, str(cls))] = {
+                **c,
+                "precision": c["tp"] / predicted if predicted else None,
+                "recall": c["tp"] / actual if actual else None,
+            }
+        return result
+
+
+def run_parity(args, reference, candidate):
+    """Run both configurations over the images and collect the comparison"""
+    import numpy as np
+    from app.utils.lean_inference import match_detections
+
+    paths = sorted(Path(args.image_dir).glob("*.jpg"))[:args.max_images]
+    if not paths:
+        raise FileNotFoundError(f"No .jpg images found in {args.image_dir}")
+    images = [p.read_bytes() for p in paths]
+
+    # Warm-up, so one-off costs don't count as latency
+    for data in images[:args.warmup]:
+        reference(data)
+        candidate(data)
+
+    counts = {"reference": ClassCounts(), "candidate": ClassCounts()}
+    latencies = {"reference": [], "candidate": []}
+    box_drifts, conf_drifts = [], []
+    matched = unmatched_reference = unmatched_candidate = labelled = 0
+    worst = []
+    for index, (path, data) in enumerate(zip(paths, images)):
+        # Alternate which configuration runs first so neither gets the warmer caches
+        if index % 2:
+            cand_dets, cand_time = candidate(data)
+            ref_dets, ref_time = reference(data)
+        else:
+            ref_dets, ref_time = reference(data)
+            cand_dets, cand_time = candidate(data)
+        latencies["reference"].append(ref_time)
+        latencies["candidate"].append(cand_time)
+
+        match = match_detections(ref_dets, cand_dets, args.iou)
+        matched += len(match["pairs"])
+        unmatched_reference += len(match["unmatched_reference"])
+        unmatched_candidate += len(match["unmatched_candidate"])
+        for i, j, _ in match["pairs"]:
+            box_drifts.append(float(np.abs(ref_dets[i, :4] - cand_dets[j, :4]).max()))
+            conf_drifts.append(float(abs(ref_dets[i, 4] - cand_dets[j, 4])))
+        if match["unmatched_reference"] or match["unmatched_candidate"]:
+            worst.append({"image": path.name,
+                          "missing": len(match["unmatched_reference"]),
+                          "extra": len(match["unmatched_candidate"])})
+
+        truth = load_labels(path, args.label_dir, image_shape(data)) if args.label_dir else None
+        if truth is not None:
+            labelled += 1
+            counts["reference"].add(truth, ref_dets, args.iou)
+            counts["candidate"].add(truth, cand_dets, args.iou)
+
+    ref_classes = counts["reference"].summary(reference.names)
+    cand_classes = counts["candidate"].summary(reference.names)
+    per_class = {}
+    for label in sorted(set(ref_classes) | set(cand_classes)):
+        ref, cand = ref_classes.get(label, {}), cand_classes.get(label, {})
+        delta = {}
+        for metric in ("precision", "recall"):
+            if ref.get(metric) is not None and cand.get(metric) is not None:
+                delta[metric] = cand[metric] - ref[metric]
+        per_class[label] = {"reference": ref, "candidate": cand, "delta": delta}
+
+    total_reference = matched + unmatched_reference
+    ref_p50 = percentile(latencies["reference"], 50)
+    cand_p50 = percentile(latencies["candidate"], 50)
+    return {
+        "images": len(paths),
+        "labelled_images": labelled,
+        "iou_threshold": args.iou,
+        "detections": {
+            "reference": total_reference,
+            "candidate": matched + unmatched_candidate,
+            "matched": matched,
+            "missing": unmatched_reference,
+            "extra": unmatched_candidate,
+            "missing_rate": unmatched_reference / total_reference if total_reference else 0.0,
+            "extra_rate": unmatched_candidate / total_reference if total_reference else float(unmatched_candidate > 0),
+        },
+        "drift": {
+            "max_box_px": max(box_drifts, default=0.0),
+            "p95_box_px": percentile(box_drifts, 95) or 0.0,
+            "max_conf": max(conf_drifts, default=0.0),
+            "p95_conf": percentile(conf_drifts, 95) or 0.0,
+        },
+        "per_class": per_class,
+        "latency_ms": {
+            name: {"p50": percentile(values, 50) * 1000, "p95": percentile(values, 95) * 1000}
+            for name, values in latencies.items()
+        },
+        "speedup_p50": ref_p50 / cand_p50 if cand_p50 else None,
+        "mismatched_images": sorted(worst, key=lambda w: -(w["missing"] + w["extra"]))[:10],
+    }
+
+
+def check_tolerances(results, args):
+    """List of (description, passed) for every tolerance"""
+    detections, drift = results["detections"], results["drift"]
+    checks = [
+        (f"missing detections {detections['missing_rate']:.2%} <= {args.max_missing:.2%}",
+         detections["missing_rate"] <= args.max_missing),
+        (f"extra detections {detections['extra_rate']:.2%} <= {args.max_extra:.2%}",
+         detections["extra_rate"] <= args.max_extra),
+        (f"max box drift {drift['max_box_px']:.2f}px <= {args.max_box_drift:.2f}px",
+         drift["max_box_px"] <= args.max_box_drift),
+        (f"max confidence drift {drift['max_conf']:.4f} <= {args.max_conf_drift:.4f}",
+         drift["max_conf"] <= args.max_conf_drift),
+    ]
+    for label, entry in results["per_class"].items():
+        for metric in ("precision", "recall"):
+            change = entry["delta"].get(metric)
+            if change is not None:
+                checks.append((f"{label} {metric} change {change:+.3f} >= -{args.max_metric_drop:.3f}",
+                               change >= -args.max_metric_drop))
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that a candidate inference configuration matches a reference")
+    parser.add_argument("--reference", default="backend=pytorch",
+                        help="Reference configuration, e.g. 'backend=pytorch,imgsz=640,decode=full'")
+    parser.add_argument("--candidate", default="backend=lean",
+                        help=f"Candidate configuration; backends: {', '.join(BACKENDS)}; "
+                             f"decode: {', '.join(DECODE_MODES)}; optimize=1 applies the CPU plan")
+    parser.add_argument("--model", default=str(DEFAULT_MODEL), help="Model used when a configuration has no model=")
+    parser.add_argument("--image-dir", default=str(DEFAULT_IMAGE_DIR), help="Directory of validation JPEGs")
+    parser.add_argument("--label-dir", default=None,
+                        help="YOLO label directory (default: the images' sibling labels/ directory)")
+    parser.add_argument("--no-labels", action="store_true", help="Skip the precision/recall comparison")
+    parser.add_argument("--max-images", type=int, default=200, help="Maximum number of images")
+    parser.add_argument("--warmup", type=int, default=3, help="Warm-up images per configuration")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU needed to match two detections")
+    parser.add_argument("--max-missing", type=float, default=0.01, help="Allowed share of reference detections not found")
+    parser.add_argument("--max-extra", type=float, default=0.01, help="Allowed extra detections, as a share of the reference")
+    parser.add_argument("--max-box-drift", type=float, default=2.0, help="Allowed box corner drift in pixels")
+    parser.add_argument("--max-conf-drift", type=float, default=0.02, help="Allowed confidence drift")
+    parser.add_argument("--max-metric-drop", type=float, default=0.01, help="Allowed per-class precision/recall drop")
+    parser.add_argument("--output", default=str(DEFAULT_RESULTS), help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    if args.no_labels:
+        args.label_dir = None
+    elif args.label_dir is None:
+        args.label_dir = str(Path(args.image_dir).parent.parent / "labels" / Path(args.image_dir).name)
+        if not Path(args.label_dir).exists():
+            args.label_dir = None
+
+    reference_config = parse_config(args.reference, args.model)
+    candidate_config = parse_config(args.candidate, args.model)
+    print("🔍 Pinaka-AI detection parity check")
+    print(f"Reference: {describe(reference_config)}")
+    print(f"Candidate: {describe(candidate_config)}")
+    reference = Runner(reference_config, "reference")
+    candidate = Runner(candidate_config, "candidate")
+
+    results = run_parity(args, reference, candidate)
+    results["reference"] = reference_config
+    results["candidate"] = candidate_config
+    checks = check_tolerances(results, args)
+    results["checks"] = [{"check": text, "passed": passed} for text, passed in checks]
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(results, indent=2))
+
+    detections, drift, latency = results["detections"], results["drift"], results["latency_ms"]
+    print(f"\nImages: {results['images']} ({results['labelled_images']} labelled)")
+    print(f"Detections: {detections['reference']} reference, {detections['candidate']} candidate, "
+          f"{detections['matched']} matched, {detections['missing']} missing, {detections['extra']} extra")
+    print(f"Drift: box max {drift['max_box_px']:.2f}px (p95 {drift['p95_box_px']:.2f}), "
+          f"confidence max {drift['max_conf']:.4f} (p95 {drift['p95_conf']:.4f})")
+    for label, entry in results["per_class"].items():
+        ref, cand = entry["reference"], entry["candidate"]
+        print(f"  {label}: precision {ref.get('precision')} -> {cand.get('precision')}, "
+              f"recall {ref.get('recall')} -> {cand.get('recall')}")
+    print(f"Latency p50: {latency['reference']['p50']:.1f} ms -> {latency['candidate']['p50']:.1f} ms, "
+          f"p95: {latency['reference']['p95']:.1f} ms -> {latency['candidate']['p95']:.1f} ms"
+          + (f" ({results['speedup_p50']:.2f}x)" if results["speedup_p50"] else ""))
+    print(f"Results written to {output_path}")
+
+    print("\nTolerances:")
+    failures = 0
+    for text, passed in checks:
+        print(f"{'✅' if passed else '❌'} {text}")
+        failures += not passed
+    if failures:
+        print(f"\n❌ {failures} tolerance(s) exceeded")
+        return False
+    print("\n✅ Candidate matches the reference")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
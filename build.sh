@@ -19,7 +19,6 @@ echo "- YOLO_CONFIG_DIR: $YOLO_CONFIG_DIR"
 # Create necessary directories
 mkdir -p /tmp/yolo_config
 mkdir -p /tmp/.config
-mkdir -p /tmp/models
 echo "Created necessary directories"
 
 # Upgrade pip and install dependencies
@@ -38,7 +37,7 @@ else
     pip install -r requirements.txt
 fi
 
-# Run initialization script
+# Run initialization script (also primes the model weights cache)
 python init_env.py
 
 echo "Build completed successfully!"
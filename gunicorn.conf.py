@@ -0,0 +1,17 @@
+# Gunicorn configuration, picked up automatically from the working directory
+import os
+import sys
+
+# With --preload the app is imported in the master process. Don't start
+# loading models there: the loader thread would not survive the fork.
+os.environ.setdefault('MODEL_LOAD_ON_IMPORT', '0')
+
+
+def post_fork(server, worker):
+    """Start background model loading in each worker process"""
+    os.environ['MODEL_LOAD_ON_IMPORT'] = '1'
+    # Preloaded app: wsgi is already imported, so kick off loading now.
+    # Otherwise the worker imports wsgi next and loading starts on import.
+    wsgi = sys.modules.get('wsgi')
+    if wsgi is not None:
+        wsgi.app_module.start_model_loading()
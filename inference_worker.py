@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Inference Worker for Pinaka-AI
+
+Runs the detection models for web nodes started with INFERENCE_BROKER_URL
+(see app/utils/remote_inference.py). A worker holds no camera or session
+state, so workers can be added or removed at any time:
+
+    INFERENCE_BROKER_URL=redis://broker:6379/0 python inference_worker.py --capacity 2
+
+Models are resolved the same way as in app.py, and a newly activated registry
+version is hot-swapped in while the worker runs.
+"""
+
+import os
+import sys
+import time
+import signal
+import argparse
+import logging
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def resolve_model_paths(registry, models_dir):
+    """Detector name -> (weights path, registry version), as app.py picks them"""
+    custom_version = registry.active_version('custom')
+    if custom_version:
+        custom_path = registry.path_for(custom_version)
+    elif os.path.exists(os.path.join(models_dir, "custom_yolo_model.pt")):
+        custom_path = os.path.join(models_dir, "custom_yolo_model.pt")
+    else:
+        custom_path = os.path.join(models_dir, "custom_yolo_100epochs_best.pt")
+    return {'custom': (custom_path, custom_version),
+            'coco': (os.path.join(models_dir, "yolov8n.pt"), None)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Pinaka-AI detection requests from an inference broker")
+    parser.add_argument("--broker", default=os.environ.get('INFERENCE_BROKER_URL'),
+                        help="Broker URL, e.g. redis://localhost:6379/0 (default INFERENCE_BROKER_URL)")
+    parser.add_argument("--capacity", type=int, default=int(os.environ.get('WORKER_CAPACITY', 1)),
+                        help="Frames processed at once")
+    parser.add_argument("--worker-id", default=os.environ.get('WORKER_ID'),
+                        help="Worker name (default worker-<host>-<pid>)")
+    parser.add_argument("--heartbeat", type=float, default=2.0, help="Seconds between heartbeats")
+    args = parser.parse_args()
+    if not args.broker:
+        parser.error("--broker or INFERENCE_BROKER_URL is required")
+
+    # Inference threads match the advertised capacity (read when the executor is imported)
+    os.environ.setdefault('INFERENCE_CONCURRENCY', str(args.capacity))
+    os.environ.setdefault('YOLO_CONFIG_DIR', '/tmp/yolo_config')
+    os.environ['ULTRALYTICS_NO_CACHE'] = '1'
+    os.makedirs(os.environ['YOLO_CONFIG_DIR'], exist_ok=True)
+    logging.basicConfig(level=logging.INFO)
+
+    sys.path.insert(0, ROOT_DIR)
+    from app.utils.model_loader import ModelLoader
+    from app.utils.model_registry import ModelRegistry
+    from app.utils.weights_cache import WeightsCache
+    from app.utils.frame_decode import DECODE_TARGET_SIZE
+    from app.utils.remote_inference import InferenceWorker, broker_from_url
+
+    models_dir = os.path.join(ROOT_DIR, "models")
+    registry = ModelRegistry(models_dir)
+    paths = resolve_model_paths(registry, models_dir)
+    # Every model is loaded: the web nodes decide which ones a frame needs
+    model_loader = ModelLoader({name: path for name, (path, _) in paths.items()},
+                               registry=registry, versions={name: v for name, (_, v) in paths.items()},
+                               registry_poll_interval=float(os.environ.get('MODEL_REGISTRY_POLL_SECONDS', 5)),
+                               weights_cache=WeightsCache())
+    model_loader.start()
+
+    worker = InferenceWorker(broker_from_url(args.broker), model_loader.snapshot, worker_id=args.worker_id,
+                             capacity=args.capacity, heartbeat_interval=args.heartbeat,
+                             decode_target_size=DECODE_TARGET_SIZE)
+    worker.start()
+    print(f"Inference worker {worker.worker_id} started (capacity {args.capacity}); waiting for models...")
+    model_loader.wait_until_ready()
+    print(f"Models ready: {model_loader.status()['models']}")
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    try:
+        while not stopping:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    # Stop advertising first so web nodes route elsewhere
+    worker.stop()
+    print(f"Inference worker {worker.worker_id} stopped after {worker.processed} frames")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,12 @@
 """
 Initialization script to set up environment variables and directories
 for the Pinaka-AI application. This script is used by Render during deployment.
+
+Run directly (as build.sh does), it also primes the content-addressed model
+weights cache so the first boot doesn't have to hash the weights.
 """
 import os
 import sys
-import shutil
-import urllib.request
 
 def setup_environment():
     """Set up environment variables and directories for YOLO models"""
@@ -31,29 +32,6 @@ def setup_environment():
     if not os.path.exists(os.environ['YOLO_CONFIG_DIR']):
         os.makedirs(os.environ['YOLO_CONFIG_DIR'], exist_ok=True)
         print(f"Created directory: {os.environ['YOLO_CONFIG_DIR']}")
-      # Create a models directory in /tmp if it doesn't exist
-    tmp_models_dir = '/tmp/models'
-    if not os.path.exists(tmp_models_dir):
-        os.makedirs(tmp_models_dir, exist_ok=True)
-        print(f"Created directory: {tmp_models_dir}")
-    
-    # Check for models but don't download - we assume models are included in the deployment
-    model_files = ['yolov8n.pt', 'custom_yolo_100epochs_best.pt']
-    
-    for model_name in model_files:
-        local_path = os.path.join('models', model_name)
-        tmp_path = os.path.join(tmp_models_dir, model_name)
-        
-        # If model exists in the local models directory, copy it to tmp
-        if os.path.exists(local_path):
-            try:
-                shutil.copy2(local_path, tmp_path)
-                print(f"Copied {model_name} from {local_path} to {tmp_path}")
-            except Exception as e:
-                print(f"Error copying model {model_name}: {e}")
-        else:
-            print(f"WARNING: Model {model_name} not found in {local_path}")
-            print(f"The application will use fallback mode if the model is required")
     
     # Make sure the script directory is in the Python path
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -61,5 +39,23 @@ def setup_environment():
         sys.path.append(script_dir)
         print(f"Added {script_dir} to Python path")
 
+def prime_weights_cache():
+    """Hash and cache the model weights once, at build time"""
+    from app.utils.weights_cache import WeightsCache
+    
+    cache = WeightsCache()
+    model_files = ['yolov8n.pt', 'custom_yolo_model.pt', 'custom_yolo_100epochs_best.pt']
+    for model_name in model_files:
+        local_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', model_name)
+        if not os.path.exists(local_path):
+            print(f"WARNING: Model {model_name} not found in {local_path}")
+            continue
+        try:
+            blob = cache.resolve(local_path)
+            print(f"Cached {model_name} as {os.path.basename(blob)}")
+        except Exception as e:
+            print(f"Error caching model {model_name}: {e}")
+
 if __name__ == "__main__":
     setup_environment()
+    prime_weights_cache()
@@ -0,0 +1,40 @@
+"""
+Import-time budget test for the web process
+
+Runs the same measurement as benchmarks/import_budget.py: app.py is imported
+in a fresh interpreter and must stay within benchmarks/import_budget.json
+without pulling in any of the dependencies that have to stay lazy.
+"""
+
+import os
+import sys
+import json
+
+import pytest
+
+for module in ('flask', 'flask_socketio', 'flask_wtf', 'dotenv'):
+    pytest.importorskip(module)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.import_budget import DEFAULT_BUDGET, measure
+
+
+@pytest.fixture(scope='module')
+def budget():
+    return json.loads(DEFAULT_BUDGET.read_text())
+
+
+@pytest.fixture(scope='module')
+def result():
+    return measure(sys.executable, runs=3)
+
+
+def test_import_time_within_budget(budget, result):
+    assert result['import_ms'] <= budget['max_import_ms']
+    assert result['wall_ms'] <= budget['max_wall_ms']
+
+
+def test_lazy_dependencies_not_imported(budget, result):
+    imported = {name for _, _, _, name in result['entries']}
+    assert not imported & set(budget.get('forbidden', []))
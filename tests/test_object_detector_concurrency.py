@@ -0,0 +1,106 @@
+"""
+Concurrency tests for ObjectDetector
+
+Two requests processing frames on one detector at the same time must each
+get back their own detections and alerts, and the model must never run two
+forward passes at once.
+"""
+
+import os
+import sys
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.object_detector import ObjectDetector
+
+
+class FakeTensor:
+    """Just enough of a torch tensor for standard_detections()"""
+
+    def __init__(self, array):
+        self.array = array
+
+    def __getitem__(self, index):
+        return FakeTensor(self.array[index])
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class FakeModel:
+    """Finds one object whose class and position depend on the frame's fill value"""
+
+    names = {0: 'stone', 1: 'gas_cylinder'}
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, frame, verbose=False):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            value = int(frame[0, 0, 0])
+            time.sleep(0.05)  # Long enough for the other request to arrive
+            box = np.array([[value * 10, value * 10, value * 10 + 50, value * 10 + 50, 0.9, value - 1]],
+                           dtype=np.float32)
+            return [SimpleNamespace(boxes=SimpleNamespace(data=FakeTensor(box)))]
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event, payload):
+        self.emitted.append((event, payload))
+
+
+def make_detector():
+    detector = ObjectDetector(use_fallback=True, name='custom', socketio=FakeSocketIO())
+    detector.model = FakeModel()
+    detector.model_loaded = True
+    return detector
+
+
+def test_concurrent_frames_get_their_own_results():
+    detector = make_detector()
+    config = SimpleNamespace(monitored_objects=['stone', 'gas_cylinder'], notification_threshold=0.5,
+                             sms_enabled=False)
+    results = {}
+    start = threading.Barrier(2)
+
+    def process(value):
+        frame = np.full((240, 320, 3), value, dtype=np.uint8)
+        start.wait()
+        results[value] = detector._process_frame(frame, config)[1]
+
+    threads = [threading.Thread(target=process, args=(value,)) for value in (1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert detector.model.max_active == 1
+    for value, label in ((1, 'stone'), (2, 'gas_cylinder')):
+        result = results[value]
+        assert result.objects == [(label, pytest.approx(0.9))]
+        assert [d[0] for d in result.detections] == [label]
+        assert result.detections[0][2:] == (value * 10, value * 10, value * 10 + 50, value * 10 + 50)
+        assert [alert['object'] for alert in result.alerts] == [label]
+        assert result.timings['inference'] > 0
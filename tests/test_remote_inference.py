@@ -0,0 +1,131 @@
+"""
+Tests for the remote inference protocol over InProcessBroker
+
+The workers here answer from a stand-in handle() so the protocol can be
+exercised without model weights.
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.remote_inference import (InProcessBroker, InferenceWorker, RemoteInferenceClient,
+                                        RemoteInferenceError, encode_request)
+
+
+class StubWorker(InferenceWorker):
+    """Worker that replies with the image size instead of running models"""
+
+    def __init__(self, broker, worker_id, models=('custom', 'coco'), delay=0.0, **kwargs):
+        super().__init__(broker, lambda: {}, worker_id=worker_id, heartbeat_interval=0.05, **kwargs)
+        self.models = list(models)
+        self.delay = delay
+        self.handled = []
+
+    def info(self):
+        return {**super().info(), 'models': self.models}
+
+    def handle(self, header, image_bytes):
+        time.sleep(self.delay)
+        self.handled.append(header['id'])
+        self.processed += 1
+        return {'id': header['id'], 'worker': self.worker_id,
+                'detections': {name: [[0, 0, 1, 1, 0.9, f'{len(image_bytes)}b']] for name in header['models']},
+                'timings': {name: 0.01 for name in header['models']}}
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def broker():
+    return InProcessBroker()
+
+
+def test_request_reply_round_trip(broker):
+    worker = StubWorker(broker, 'worker-a').start()
+    try:
+        client = RemoteInferenceClient(broker, worker_refresh=0)
+        assert wait_for(lambda: client.ready)
+        reply = client.detect(b'jpeg-bytes', ['custom'], timeout=2.0)
+        assert reply['worker'] == 'worker-a'
+        assert reply['detections'] == {'custom': [[0, 0, 1, 1, 0.9, '10b']]}
+        assert client.stats()['in_flight'] == {'worker-a': 0}
+    finally:
+        worker.stop(drain_timeout=0)
+
+
+def test_timeout_and_expired_requests_are_skipped(broker):
+    worker = StubWorker(broker, 'worker-a')
+    # Advertise without consuming, so the request waits past its deadline
+    broker.heartbeat('worker-a', worker.info(), ttl=10)
+    client = RemoteInferenceClient(broker, worker_refresh=0)
+    with pytest.raises(RemoteInferenceError):
+        client.detect(b'jpeg-bytes', ['custom'], timeout=0.1)
+    assert client.timeouts == 1
+
+    worker.start()
+    try:
+        assert wait_for(lambda: worker.expired == 1)
+        assert worker.handled == []
+    finally:
+        worker.stop(drain_timeout=0)
+
+
+def test_malformed_messages_do_not_stop_the_worker(broker):
+    worker = StubWorker(broker, 'worker-a').start()
+    try:
+        broker.push('work:worker-a', b'\x05\x00')
+        broker.push('work:worker-a', encode_request({'id': 'no-reply-queue'}, b''))
+        assert wait_for(lambda: worker.malformed == 2)
+        client = RemoteInferenceClient(broker, worker_refresh=0)
+        broker.push(client.reply_queue, b'not json')
+        assert client.detect(b'x', ['coco'], timeout=2.0)['worker'] == 'worker-a'
+        assert client.malformed == 1
+    finally:
+        worker.stop(drain_timeout=0)
+
+
+def test_choose_worker_prefers_full_model_coverage_then_least_load(broker):
+    broker.heartbeat('coco-only', {'models': ['coco'], 'capacity': 1, 'busy': 0}, ttl=10)
+    broker.heartbeat('busy', {'models': ['custom', 'coco'], 'capacity': 2, 'busy': 2}, ttl=10)
+    broker.heartbeat('idle', {'models': ['custom', 'coco'], 'capacity': 2, 'busy': 1}, ttl=10)
+    broker.heartbeat('gone', {'models': ['custom', 'coco'], 'capacity': 8, 'busy': 0}, ttl=-1)
+    client = RemoteInferenceClient(broker, worker_refresh=0)
+
+    assert client.choose_worker(['custom', 'coco']) == 'idle'
+    assert client.choose_worker(['coco']) == 'coco-only'
+    assert client.choose_worker(['other']) is None
+
+    # Requests this node has in flight count even before the worker reports them
+    client._in_flight['idle'] = 2
+    assert client.choose_worker(['custom', 'coco']) == 'busy'
+
+
+def test_requests_spread_over_live_workers(broker):
+    workers = [StubWorker(broker, name, delay=0.05).start() for name in ('worker-a', 'worker-b')]
+    try:
+        client = RemoteInferenceClient(broker, worker_refresh=0)
+        assert wait_for(lambda: len(client.workers()) == 2)
+        replies = []
+        threads = [threading.Thread(target=lambda: replies.append(client.detect(b'x', ['custom'], 2.0)))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(reply['worker'] for reply in replies) == ['worker-a', 'worker-b']
+    finally:
+        for worker in workers:
+            worker.stop(drain_timeout=0)
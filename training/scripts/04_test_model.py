@@ -4,14 +4,194 @@ Model Testing Script for YOLO Custom Training
 This script tests the trained YOLO model on validation data or webcam.
 """
 
+import gc
 import os
 import sys
 import cv2
+import csv
+import math
+import time
+import platform
 import yaml
 import torch
 import argparse
+import threading
 from pathlib import Path
 
+# Backends the matrix benchmark knows how to export to (Ultralytics export formats)
+BENCHMARK_BACKENDS = {
+    "pytorch": None,
+    "torchscript": "torchscript",
+    "onnx": "onnx",
+    "openvino": "openvino",
+}
+
+# Backends whose forward pass runs on torch's intra-op pool. ONNX Runtime and
+# OpenVINO size their own pools, which Ultralytics doesn't expose, so they are
+# benchmarked once with their default threading.
+TORCH_THREADED_BACKENDS = {"pytorch", "torchscript"}
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+def current_rss():
+    """Resident set size of this process in bytes"""
+    import psutil
+    return psutil.Process().memory_info().rss
+
+class PeakMemorySampler(threading.Thread):
+    """Tracks the peak RSS of this process while a benchmark runs"""
+    
+    def __init__(self, baseline=0, interval=0.02):
+        super().__init__(daemon=True)
+        import psutil
+        self.process = psutil.Process()
+        self.interval = interval
+        self.baseline = baseline
+        self.peak = self.process.memory_info().rss
+        self.done = threading.Event()
+    
+    def run(self):
+        while not self.done.is_set():
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            self.done.wait(self.interval)
+    
+    def stop(self):
+        """Stop sampling and return the peak RSS above the baseline, in MB"""
+        self.done.set()
+        self.join()
+        return (self.peak - self.baseline) / (1024 * 1024)
+
+def load_benchmark_images(val_img_dir, limit):
+    """Load a rotating set of validation images into memory"""
+    paths = sorted(val_img_dir.glob("*.jpg"))[:limit]
+    images = [cv2.imread(str(p)) for p in paths]
+    return [img for img in images if img is not None]
+
+def load_benchmark_model(model_path, backend, imgsz, batch, export_dir):
+    """Load (exporting first if needed) a model for one backend; returns (model, load_seconds)"""
+    from ultralytics import YOLO
+    export_format = BENCHMARK_BACKENDS[backend]
+    weights = str(model_path)
+    if export_format:
+        # Export once per (model, backend, imgsz, batch); exports are reused across runs
+        target_dir = export_dir / f"{Path(model_path).stem}_{backend}_{imgsz}_b{batch}"
+        existing = list(target_dir.glob("*")) if target_dir.exists() else []
+        if existing:
+            weights = str(existing[0])
+        else:
+            print(f"   Exporting {Path(model_path).name} to {backend} (imgsz={imgsz}, batch={batch})...")
+            exported = YOLO(str(model_path)).export(format=export_format, imgsz=imgsz, batch=batch, verbose=False)
+            target_dir.mkdir(parents=True, exist_ok=True)
+            moved = target_dir / Path(exported).name
+            os.replace(exported, moved)
+            weights = str(moved)
+    
+    start = time.perf_counter()
+    model = YOLO(weights, task="detect")
+    load_time = time.perf_counter() - start
+    return model, load_time
+
+def run_benchmark_matrix(model_paths, images, backends, imgsizes, batches, thread_counts,
+                         iterations, warmup, export_dir):
+    """Benchmark every combination and return one result row per configuration
+
+    Thread counts only apply to the torch backends; the other backends get
+    one row with threads="default". peak_rss_mb is the peak RSS while
+    predicting, above the RSS measured just before the model was loaded.
+    """
+    rows = []
+    default_threads = torch.get_num_threads()
+    try:
+        for model_name, model_path in model_paths.items():
+            for backend in backends:
+                for imgsz in imgsizes:
+                    for batch in batches:
+                        # Release the previous model first so its memory isn't counted here
+                        gc.collect()
+                        baseline_rss = current_rss()
+                        try:
+                            model, load_time = load_benchmark_model(model_path, backend, imgsz, batch, export_dir)
+                        except Exception as e:
+                            print(f"⚠️ Skipping {model_name}/{backend}/{imgsz}/b{batch}: {e}")
+                            continue
+                        
+                        backend_threads = thread_counts if backend in TORCH_THREADED_BACKENDS else [None]
+                        for threads in backend_threads:
+                            if backend in TORCH_THREADED_BACKENDS:
+                                threads = threads or default_threads
+                                torch.set_num_threads(threads)
+                            else:
+                                threads = "default"
+                            label = f"{model_name} {backend} imgsz={imgsz} batch={batch} threads={threads}"
+                            print(f"   {label}")
+                            
+                            # Rotate through the image set so caching can't flatter the numbers
+                            def next_batch(i):
+                                start_idx = (i * batch) % len(images)
+                                return [images[(start_idx + j) % len(images)] for j in range(batch)]
+                            
+                            for i in range(warmup):
+                                model.predict(source=next_batch(i), imgsz=imgsz, verbose=False)
+                            
+                            sampler = PeakMemorySampler(baseline=baseline_rss)
+                            sampler.start()
+                            times = []
+                            for i in range(iterations):
+                                frames = next_batch(warmup + i)
+                                start_time = time.perf_counter()
+                                model.predict(source=frames, imgsz=imgsz, verbose=False)
+                                times.append(time.perf_counter() - start_time)
+                            peak_mb = sampler.stop()
+                            
+                            per_image_ms = [t * 1000 / batch for t in times]
+                            rows.append({
+                                "model": model_name,
+                                "backend": backend,
+                                "imgsz": imgsz,
+                                "batch": batch,
+                                "threads": threads,
+                                "load_time_s": round(load_time, 3),
+                                "mean_ms_per_image": round(sum(per_image_ms) / len(per_image_ms), 2),
+                                "p50_ms_per_image": round(percentile(per_image_ms, 50), 2),
+                                "p95_ms_per_image": round(percentile(per_image_ms, 95), 2),
+                                "p99_ms_per_image": round(percentile(per_image_ms, 99), 2),
+                                "throughput_fps": round(batch * len(times) / sum(times), 2),
+                                "peak_rss_mb": round(peak_mb, 1),
+                            })
+                        del model
+    finally:
+        torch.set_num_threads(default_threads)
+    return rows
+
+def write_benchmark_reports(rows, output_dir):
+    """Write the benchmark rows as CSV and Markdown reports"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    csv_path = output_dir / "benchmark_matrix.csv"
+    md_path = output_dir / "benchmark_matrix.md"
+    columns = list(rows[0].keys())
+    
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    
+    with open(md_path, "w") as f:
+        f.write("# Inference Benchmark Matrix\n\n")
+        f.write(f"Host: {platform.node()}, {os.cpu_count()} CPUs, torch {torch.__version__}\n\n")
+        f.write("| " + " | ".join(columns) + " |\n")
+        f.write("|" + "|".join("---" for _ in columns) + "|\n")
+        for row in sorted(rows, key=lambda r: r["p95_ms_per_image"]):
+            f.write("| " + " | ".join(str(row[c]) for c in columns) + " |\n")
+    
+    return csv_path, md_path
+
+def parse_list(value, cast=str):
+    return [cast(v) for v in value.split(",") if v.strip()]
+
 def main():
     # Parse arguments
     parser = argparse.ArgumentParser(description="Test YOLO model")
@@ -19,10 +199,22 @@ def main():
     parser.add_argument("--samples", action="store_true", help="Generate sample detection images")
     parser.add_argument("--benchmark", action="store_true", help="Run benchmarking tests")
     parser.add_argument("--webcam", action="store_true", help="Test on webcam")
+    
+    # Benchmark matrix options (comma-separated lists)
+    parser.add_argument("--imgsz", default="640", help="Benchmark image sizes, e.g. 320,480,640")
+    parser.add_argument("--batch", default="1", help="Benchmark batch sizes, e.g. 1,4")
+    parser.add_argument("--backends", default="pytorch",
+                        help=f"Benchmark backends from: {','.join(BENCHMARK_BACKENDS)}")
+    parser.add_argument("--threads", default="0", help="Torch thread counts for the pytorch/torchscript backends, 0 = torch default")
+    parser.add_argument("--models", default="custom",
+                        help="Models to benchmark: custom, coco, or paths to .pt files")
+    parser.add_argument("--iterations", type=int, default=50, help="Timed iterations per configuration")
+    parser.add_argument("--warmup", type=int, default=5, help="Warm-up iterations per configuration")
+    parser.add_argument("--max-images", type=int, default=64, help="Size of the rotating image set")
     args = parser.parse_args()
     
     # Default to validation if no args specified
-    if not any(vars(args).values()):
+    if not any([args.validation, args.samples, args.benchmark, args.webcam]):
         args.validation = True
     
     print("🧪 Testing YOLO model...")
@@ -103,38 +295,44 @@ def main():
         
         # Run benchmarking if requested
         if args.benchmark:
-            print("\n⏱️ Running benchmark tests...")
+            print("\n⏱️ Running benchmark matrix...")
             
-            # Load a sample image for benchmarking
             val_img_dir = root_dir / "custom_dataset" / "images" / "val"
-            if not val_img_dir.exists() or not list(val_img_dir.glob("*.jpg")):
+            images = load_benchmark_images(val_img_dir, args.max_images) if val_img_dir.exists() else []
+            if not images:
                 print(f"❌ No validation images found in {val_img_dir}")
             else:
-                # Use the first image for benchmarking
-                sample_img = next(val_img_dir.glob("*.jpg"))
-                
-                # Load the image
-                img = cv2.imread(str(sample_img))
-                
-                # Warm up
-                for _ in range(5):
-                    _ = model.predict(source=img, verbose=False)
+                model_paths = {}
+                for name in parse_list(args.models):
+                    if name == "custom":
+                        model_paths["custom"] = model_path
+                    elif name == "coco":
+                        model_paths["coco"] = models_dir / "yolov8n.pt"
+                    else:
+                        model_paths[Path(name).stem] = Path(name)
                 
-                # Benchmark
-                import time
-                times = []
-                for _ in range(20):
-                    start_time = time.time()
-                    _ = model.predict(source=img, verbose=False)
-                    end_time = time.time()
-                    times.append(end_time - start_time)
+                backends = parse_list(args.backends)
+                unknown = [b for b in backends if b not in BENCHMARK_BACKENDS]
+                if unknown:
+                    print(f"❌ Unknown backends: {', '.join(unknown)}")
+                    return False
                 
-                # Calculate statistics
-                avg_time = sum(times) / len(times)
-                fps = 1 / avg_time
+                rows = run_benchmark_matrix(
+                    model_paths, images, backends,
+                    imgsizes=parse_list(args.imgsz, int),
+                    batches=parse_list(args.batch, int),
+                    thread_counts=parse_list(args.threads, int),
+                    iterations=args.iterations,
+                    warmup=args.warmup,
+                    export_dir=models_dir / "exports"
+                )
                 
-                print(f"Average inference time: {avg_time:.4f} seconds")
-                print(f"Frames per second: {fps:.2f} FPS")
+                if rows:
+                    csv_path, md_path = write_benchmark_reports(rows, root_dir / "training" / "results_plots")
+                    best = min(rows, key=lambda r: r["p95_ms_per_image"])
+                    print(f"Fastest p95: {best['model']} {best['backend']} imgsz={best['imgsz']} "
+                          f"batch={best['batch']} threads={best['threads']}: {best['p95_ms_per_image']} ms/image")
+                    print(f"✅ Benchmark reports saved to {csv_path} and {md_path}")
         
         # Test on webcam if requested
         if args.webcam:
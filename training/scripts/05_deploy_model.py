@@ -2,6 +2,10 @@
 """
 Model Deployment Script for YOLO Custom Training
 This script deploys the trained YOLO model to the application.
+
+The model is registered as a new version in the model registry
+(models/registry.json) and activated; a running app picks it up and
+hot-swaps to it without a restart.
 """
 
 import os
@@ -10,6 +14,10 @@ import shutil
 import yaml
 from pathlib import Path
 
+# Make the app package importable for the model registry
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from app.utils.model_registry import ModelRegistry
+
 def main():
     print("📦 Deploying YOLO model...")
     
@@ -67,6 +75,13 @@ def main():
     model_info_path = models_dir / "model_info.yaml"
     with open(model_info_path, "w") as f:
         yaml.dump(model_info, f, default_flow_style=False)
+
+    # Register and activate the new version; the running app hot-swaps to it
+    registry = ModelRegistry(str(models_dir))
+    version = registry.register(str(source_model_path), name="custom",
+                                classes=model_info["classes"],
+                                metadata={"resolution": model_info["resolution"]})
+    print(f"Registered and activated model version: {version}")
     
     print("\n✅ Model deployment completed successfully")
     print(f"Model deployed to: {deployment_model_path}")
@@ -25,7 +25,7 @@ port = int(os.environ.get("PORT", 10000))
 print(f"Using port: {port}")
 
 # Create necessary directories
-for directory in ['/tmp/yolo_config', '/tmp/.config', '/tmp/models']:
+for directory in ['/tmp/yolo_config', '/tmp/.config']:
     os.makedirs(directory, exist_ok=True)
 
 # Print environment for debugging